@@ -0,0 +1,372 @@
+# catalog.py
+
+# Persistent index of all raw/pht/tcm/psp/par files, so that runs and file lists
+# can be looked up without touching the (slow) data filesystem.
+
+import os
+import re
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from legend200_data_loader.config import GLOBAL_PARAM
+from legend200_data_loader.logger import setup_logger
+from legend200_data_loader.utils import to_unix_time
+
+# tier -> (GLOBAL_PARAM['DIRS'] key of its subdirectory, file extension, file_dict key)
+TIERS = {
+    'raw': ('RAW_SUBDIR', '.lh5', 'raw_files'),
+    'pht': ('PHT_SUBDIR', '.lh5', 'pht_files'),
+    'tcm': ('TCM_SUBDIR', '.lh5', 'tcm_files'),
+    'psp': ('PSP_SUBDIR', '.lh5', 'psp_files'),
+    'par': ('PAR_SUBDIR', '.json', 'par_file'),
+}
+
+CATALOG_FILE = 'file_catalog.sqlite'
+
+# Directory listings are I/O bound, so many of them can be in flight at once
+MAX_SCAN_WORKERS = 16
+
+TIMESTAMP_PATTERN = re.compile(r'\d{8}T\d{6}Z')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    period TEXT NOT NULL,
+    run TEXT NOT NULL,
+    tier TEXT NOT NULL,
+    path TEXT PRIMARY KEY,
+    size INTEGER,
+    mtime REAL,
+    timestamp TEXT,
+    start_time REAL
+);
+CREATE INDEX IF NOT EXISTS files_run ON files (period, run, tier);
+CREATE TABLE IF NOT EXISTS dirs (
+    period TEXT NOT NULL,
+    run TEXT NOT NULL,
+    tier TEXT NOT NULL,
+    path TEXT PRIMARY KEY,
+    mtime REAL
+);
+CREATE INDEX IF NOT EXISTS dirs_period ON dirs (period, tier);
+CREATE TABLE IF NOT EXISTS schemas (
+    path TEXT PRIMARY KEY,
+    mtime REAL,
+    fingerprint TEXT
+);
+CREATE TABLE IF NOT EXISTS layouts (
+    fingerprint TEXT PRIMARY KEY,
+    layout TEXT
+);
+"""
+
+
+def parse_file_timestamp(filename):
+    """
+    Extract the 'YYYYMMDDTHHMMSSZ' start timestamp from a file name.
+
+    Returns:
+    tuple: (timestamp string, unix time), or (None, None) if the name has no timestamp.
+    """
+    match = TIMESTAMP_PATTERN.search(os.path.basename(filename))
+    if not match:
+        return None, None
+    return match.group(), to_unix_time(match.group())
+
+
+def list_dir(path, extension=None):
+    """
+    List a directory with os.scandir.
+
+    Parameters:
+    path (str): Directory to list.
+    extension (str): Return the files with this extension, or the subdirectories if None.
+
+    Returns:
+    list: Sorted full paths, or None if the directory does not exist.
+    """
+    try:
+        with os.scandir(path) as entries:
+            if extension is None:
+                return sorted(entry.path for entry in entries if entry.is_dir())
+            return sorted(entry.path for entry in entries if entry.name.endswith(extension) and entry.is_file())
+    except FileNotFoundError:
+        return None
+
+
+def list_dirs_parallel(dir_extensions, max_workers=MAX_SCAN_WORKERS):
+    """
+    List many directories concurrently with a bounded thread pool.
+
+    Parameters:
+    dir_extensions (dict): Directory path -> extension (see list_dir).
+    max_workers (int): Maximum number of concurrent listings.
+
+    Returns:
+    dict: Directory path -> list_dir result.
+    """
+    paths = list(dir_extensions)
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        listings = pool.map(lambda path: list_dir(path, dir_extensions[path]), paths)
+        return dict(zip(paths, listings))
+
+
+class FileCatalog:
+    def __init__(self, db_path=None, data_dir=None, data_type=None, periods=None, max_workers=MAX_SCAN_WORKERS):
+        self.logger = setup_logger()
+        self.max_workers = max_workers
+        self.data_dir = data_dir or GLOBAL_PARAM['DIRS']['LEGEND_DATA_DIR']
+        self.type = data_type or GLOBAL_PARAM['DIRS']['TYPE']
+        self.periods = periods or GLOBAL_PARAM['DIRS']['PERIODS']
+        self.db_path = db_path or os.path.join(GLOBAL_PARAM['DIRS']['output_dir'], CATALOG_FILE)
+
+        if self.db_path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+        self.db = sqlite3.connect(self.db_path)
+        self.db.executescript(SCHEMA)
+
+    def close(self):
+        self.db.close()
+
+    def tier_dir(self, tier, period, run=''):
+        """Return the directory of a tier for a given period (and run)."""
+        subdir = GLOBAL_PARAM['DIRS'][TIERS[tier][0]]
+        return os.path.join(self.data_dir, subdir, self.type, period.strip('/'), run)
+
+    def is_empty(self):
+        return self.db.execute("SELECT COUNT(*) FROM dirs").fetchone()[0] == 0
+
+    def _scan_run(self, tier, period, run, run_path):
+        """List the files of one run directory and return their catalog rows."""
+        extension = TIERS[tier][1]
+        rows = []
+        try:
+            with os.scandir(run_path) as entries:
+                for entry in entries:
+                    if not entry.name.endswith(extension) or not entry.is_file():
+                        continue
+                    stat = entry.stat()
+                    timestamp, start_time = parse_file_timestamp(entry.name)
+                    rows.append((period, run, tier, entry.path, stat.st_size, stat.st_mtime, timestamp, start_time))
+        except FileNotFoundError:
+            self.logger.error(f"Run path not found: {run_path}")
+        return rows
+
+    def scan(self, periods=None):
+        """
+        Scan all tiers of the given periods (default: all configured periods)
+        from scratch and replace their entries in the catalog.
+        """
+        periods = [period.strip('/') for period in (periods or self.periods)]
+        with self.db:
+            for period in periods:
+                self.db.execute("DELETE FROM files WHERE period = ?", (period,))
+                self.db.execute("DELETE FROM dirs WHERE period = ?", (period,))
+        n_files = len(self.refresh(periods)['added'])
+        self.logger.info(f"Catalogued {n_files} files.")
+        return n_files
+
+    def refresh(self, periods=None):
+        """
+        Incrementally update the catalog. Only period and run directories whose
+        mtime changed since the last scan are listed again.
+
+        Returns:
+        dict: {'added': [paths], 'removed': [paths]} of files that appeared or vanished.
+        """
+        periods = [period.strip('/') for period in (periods or self.periods)]
+        added, removed = [], []
+        with self.db:
+            for tier in TIERS:
+                for period in periods:
+                    diff = self._refresh_period(tier, period)
+                    added.extend(diff['added'])
+                    removed.extend(diff['removed'])
+        return {'added': added, 'removed': removed}
+
+    def _refresh_period(self, tier, period):
+        """Bring the catalog entries of one tier directory of a period up to date."""
+        stored = dict(self.db.execute(
+            "SELECT run, mtime FROM dirs WHERE period = ? AND tier = ?", (period, tier)))
+        period_path = self.tier_dir(tier, period)
+        added, removed = [], []
+
+        try:
+            period_mtime = os.stat(period_path).st_mtime
+            if stored.get('') != period_mtime:
+                runs = sorted(entry.name for entry in os.scandir(period_path) if entry.is_dir())
+            else:
+                runs = sorted(run for run in stored if run)
+        except FileNotFoundError:
+            self.logger.error(f"Period path not found: {period_path}")
+            period_mtime, runs = None, []
+
+        dir_rows = [] if period_mtime is None else [(period, '', tier, period_path, period_mtime)]
+        changed = []
+        for run in runs:
+            run_path = os.path.join(period_path, run)
+            try:
+                run_mtime = os.stat(run_path).st_mtime
+            except FileNotFoundError:
+                continue
+            dir_rows.append((period, run, tier, run_path, run_mtime))
+            if stored.get(run) != run_mtime:
+                changed.append((run, run_path))
+
+        # List the changed run directories concurrently, write to the database serially
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            scans = pool.map(lambda run: self._scan_run(tier, period, *run), changed)
+            for (run, _), file_rows in zip(changed, scans):
+                diff = self._replace_run_files(tier, period, run, file_rows)
+                added.extend(diff['added'])
+                removed.extend(diff['removed'])
+
+        # Runs that disappeared from the period directory
+        for run in set(stored) - set(row[1] for row in dir_rows) - {''}:
+            removed.extend(self._replace_run_files(tier, period, run, [])['removed'])
+
+        self.db.execute("DELETE FROM dirs WHERE period = ? AND tier = ?", (period, tier))
+        self.db.executemany("INSERT OR REPLACE INTO dirs VALUES (?, ?, ?, ?, ?)", dir_rows)
+        return {'added': added, 'removed': removed}
+
+    def _replace_run_files(self, tier, period, run, file_rows):
+        """Replace the file entries of one run directory and return the diff."""
+        old_paths = set(path for (path,) in self.db.execute(
+            "SELECT path FROM files WHERE period = ? AND run = ? AND tier = ?", (period, run, tier)))
+        new_paths = set(row[3] for row in file_rows)
+        self.db.execute("DELETE FROM files WHERE period = ? AND run = ? AND tier = ?", (period, run, tier))
+        self.db.executemany("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?, ?, ?)", file_rows)
+        return {'added': sorted(new_paths - old_paths), 'removed': sorted(old_paths - new_paths)}
+
+    def get_runs(self, period, tier='raw'):
+        """Return the sorted run names of a period."""
+        rows = self.db.execute(
+            "SELECT run FROM dirs WHERE period = ? AND tier = ? AND run != '' ORDER BY run",
+            (period.strip('/'), tier))
+        return [run for (run,) in rows]
+
+    def get_files(self, period, run, tier):
+        """Return the sorted paths of all files of a tier for a given period and run."""
+        rows = self.db.execute(
+            "SELECT path FROM files WHERE period = ? AND run = ? AND tier = ? ORDER BY path",
+            (period.strip('/'), run.strip('/'), tier))
+        return [path for (path,) in rows]
+
+    def get_file_info(self, period=None, run=None, tier=None):
+        """
+        Return the catalog rows (as dicts) matching the given period, run and tier.
+        """
+        conditions, values = [], []
+        for column, value in [('period', period), ('run', run), ('tier', tier)]:
+            if value is not None:
+                conditions.append(f"{column} = ?")
+                values.append(value.strip('/'))
+        where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+        cursor = self.db.execute(f"SELECT * FROM files{where} ORDER BY period, run, tier, path", values)
+        columns = [description[0] for description in cursor.description]
+        return [dict(zip(columns, row)) for row in cursor]
+
+    def get_fingerprints(self, paths):
+        """
+        Return the stored schema fingerprints of the given files.
+
+        Returns:
+        dict: path -> (mtime, fingerprint) for the files that have one.
+        """
+        fingerprints = {}
+        paths = list(paths)
+        # Stay below the SQLite limit on query parameters
+        for start in range(0, len(paths), 900):
+            batch = paths[start:start + 900]
+            rows = self.db.execute(
+                f"SELECT path, mtime, fingerprint FROM schemas WHERE path IN ({','.join('?' * len(batch))})", batch)
+            fingerprints.update((path, (mtime, fingerprint)) for path, mtime, fingerprint in rows)
+        return fingerprints
+
+    def store_fingerprints(self, rows, layouts):
+        """
+        Store schema fingerprints.
+
+        Parameters:
+        rows (list): (path, mtime, fingerprint) tuples.
+        layouts (dict): fingerprint -> layout text.
+        """
+        with self.db:
+            self.db.executemany("INSERT OR REPLACE INTO schemas VALUES (?, ?, ?)", rows)
+            self.db.executemany("INSERT OR IGNORE INTO layouts VALUES (?, ?)", layouts.items())
+
+    def get_layout(self, fingerprint):
+        """Return the layout text of a fingerprint (None if unknown)."""
+        row = self.db.execute("SELECT layout FROM layouts WHERE fingerprint = ?", (fingerprint,)).fetchone()
+        return row[0] if row else None
+
+
+class RunIndex:
+    """
+    Sorted index of file start times, mapping arbitrary timestamps back to
+    their (period, run) and to the file of the run they fall into.
+    """
+    def __init__(self, file_starts):
+        """
+        Parameters:
+        file_starts (dict): (period, run) -> non-empty list of (unix start time, path) of the
+            run's files. Periods and runs are given without trailing slashes, e.g. ('p03', 'r000').
+        """
+        import numpy as np
+
+        self.runs = sorted(file_starts, key=lambda key: min(file_starts[key]))
+        starts, run_index, file_index, paths = [], [], [], []
+        for i, key in enumerate(self.runs):
+            for j, (start, path) in enumerate(sorted(file_starts[key])):
+                starts.append(start)
+                run_index.append(i)
+                file_index.append(j)
+                paths.append(path)
+
+        order = np.argsort(starts, kind='stable')
+        self.file_starts = np.asarray(starts, dtype=np.float64)[order]
+        self.file_run_index = np.asarray(run_index, dtype=np.int64)[order]
+        self.file_index = np.asarray(file_index, dtype=np.int64)[order]
+        self.paths = np.asarray(paths, dtype=object)[order]
+        self.run_starts = {key: min(file_starts[key])[0] for key in self.runs}
+
+    def __len__(self):
+        return len(self.file_starts)
+
+    def run_start(self, period, run):
+        """Return the unix start time of the first file of a run (None if unknown)."""
+        return self.run_starts.get((period.strip('/'), run.strip('/')))
+
+    def lookup(self, timestamps):
+        """
+        Find the run and file each timestamp falls into. A timestamp belongs to the
+        last file starting at or before it; timestamps before the first file get -1.
+
+        Parameters:
+        timestamps (array-like): Unix timestamps, e.g. event timestamps.
+
+        Returns:
+        dict: 'run_index' (into self.runs), 'file_index' (into the run's sorted file list),
+              'period' and 'run' (object arrays, None where not found).
+        """
+        import numpy as np
+
+        timestamps = np.asarray(timestamps, dtype=np.float64)
+        position = np.searchsorted(self.file_starts, timestamps, side='right') - 1
+        found = position >= 0
+        if len(self):
+            # Clip before gathering, the -1 positions are masked afterwards
+            safe = np.clip(position, 0, None)
+            run_index = np.where(found, self.file_run_index[safe], -1)
+            file_index = np.where(found, self.file_index[safe], -1)
+        else:
+            run_index = np.full(timestamps.shape, -1, dtype=np.int64)
+            file_index = np.full(timestamps.shape, -1, dtype=np.int64)
+
+        periods = np.array([period for period, _ in self.runs] + [None], dtype=object)
+        runs = np.array([run for _, run in self.runs] + [None], dtype=object)
+        return {
+            'run_index': run_index,
+            'file_index': file_index,
+            # Index -1 selects the appended None
+            'period': periods[run_index],
+            'run': runs[run_index],
+        }
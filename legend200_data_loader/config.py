@@ -23,6 +23,10 @@ GLOBAL_PARAM = {
     'detector_type': 'ICPC',
     'valid_detector_types': ['ICPC', 'BEGe', 'PPC'],
     'inactive_detectors': [],  # Example: ['V01403A', 'V07298B', 'V01404A'],
+    'aux_channels': {  # Channel map names of the auxiliary channels in the tcm
+        'pulser': 'PULS01',
+        'baseline': 'BSLN01'
+    },
     'exclude_period_run': ['p08_r005'],
     'MERGE': {
         'periods_to_merge': ['p03/', 'p06/', 'p07/', 'p08/', 'p09/'],
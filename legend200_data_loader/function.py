@@ -1,53 +1,113 @@
-def filter_metadata(legend_metadata: dict) -> dict:
+import numpy as np
+
+# Rawid list keys per detector type, as returned in detectors['rawid_lists']
+RAWID_LIST_TYPES = {
+    'icpc': 'ICPC',
+    'ppc': 'PPC',
+    'bege': 'BEGe',
+}
+
+def build_detector_table(channel_map):
+    """
+    Build a columnar table of all geds detectors in a channel map.
+
+    Parameters:
+    channel_map    --    channel map (dict-like) as returned by LegendMetadata.channelmap()
+
+    Returns:
+    table    --    DataFrame with one row per detector and the columns name, rawid, type,
+                   manufacturer, processable, usability, lq, string, position, radius, height
+    """
+    import pandas as pd
+
+    columns = {key: [] for key in ['name', 'rawid', 'type', 'manufacturer', 'processable',
+                                   'usability', 'lq', 'string', 'position', 'radius', 'height']}
+
+    for key, item in channel_map.items():
+        # Skip non-geds detector systems
+        if not item.get('system') == 'geds':
+            continue
+        analysis = item.get('analysis', {})
+        location = item.get('location', {})
+        geometry = item.get('geometry', {})
+
+        columns['name'].append(key)
+        columns['rawid'].append(item['daq']['rawid'])
+        columns['type'].append(item.get('type', ''))
+        columns['manufacturer'].append(item.get('production', {}).get('manufacturer', ''))
+        columns['processable'].append(bool(analysis.get('processable', False)))
+        columns['usability'].append(analysis.get('usability', 'unknown'))
+        columns['lq'].append(analysis.get('psd', {}).get('status', {}).get('lq', 'unknown'))
+        columns['string'].append(location.get('string', -1))
+        columns['position'].append(location.get('position', -1))
+        columns['radius'].append(geometry.get('radius_in_mm', 0))
+        columns['height'].append(geometry.get('height_in_mm', 0))
+
+    return pd.DataFrame({
+        'name': np.array(columns['name'], dtype=object),
+        'rawid': np.array(columns['rawid'], dtype=np.int64),
+        'type': np.array(columns['type'], dtype=object),
+        'manufacturer': np.array(columns['manufacturer'], dtype=object),
+        'processable': np.array(columns['processable'], dtype=bool),
+        'usability': np.array(columns['usability'], dtype=object),
+        'lq': np.array(columns['lq'], dtype=object),
+        'string': np.array(columns['string'], dtype=np.int64),
+        'position': np.array(columns['position'], dtype=np.int64),
+        'radius': np.array(columns['radius'], dtype=np.float64),
+        'height': np.array(columns['height'], dtype=np.float64),
+    })
+
+def select_detectors(table, detector_type=None, usability=None, processable=None):
+    """
+    Select detectors from a detector table with vectorized boolean masks.
+
+    Parameters:
+    table    --    detector table from build_detector_table
+    detector_type    --    detector type or list of types, e.g. 'ICPC' (case insensitive)
+    usability    --    usability or list of usabilities, e.g. ['on', 'ac']
+    processable    --    if not None, keep only detectors with this processable flag
+
+    Returns:
+    selected    --    the selected rows of the table
+    """
+    mask = np.ones(len(table), dtype=bool)
+    if detector_type is not None:
+        types = [detector_type] if isinstance(detector_type, str) else detector_type
+        mask &= table['type'].str.lower().isin([t.lower() for t in types]).to_numpy()
+    if usability is not None:
+        usabilities = [usability] if isinstance(usability, str) else usability
+        mask &= table['usability'].isin(usabilities).to_numpy()
+    if processable is not None:
+        mask &= table['processable'].to_numpy() == processable
+    return table[mask]
+
+def filter_metadata(legend_metadata) -> dict:
     """
-    Load Legend Metadata and select only valid_detector_types. 
+    Load Legend Metadata and select only valid_detector_types.
     Also creates a list with all expected rawids of all detector types.
 
     Parameters:
-    legend_metadata    --    instance LegendMetadata which contains LEGEND metadata
+    legend_metadata    --    instance LegendMetadata which contains LEGEND metadata, or a
+                             MetadataLoader (which reuses its cached detector table)
 
     Returns:
     detectors    --    dictionary containing name and id of the expected detectors
     """
+    from legend200_data_loader.metadata import MetadataLoader  # avoid circular import
 
-    detectors = {}
-    icpc_detectors = []
-    ppc_detectors = []
-    bege_detectors = []
+    if isinstance(legend_metadata, MetadataLoader):
+        table = legend_metadata.detector_table()
+    else:
+        table = build_detector_table(legend_metadata.channelmap())
 
-    # Loop over legend metadata dictionary
-    for key, item in legend_metadata.channelmap().items():
+    # Add important fields
+    fields = table[['rawid', 'type', 'manufacturer', 'processable', 'lq']]
+    detectors = fields.set_index(table['name']).to_dict(orient='index')
 
-        # Skip non-geds detector systems
-        if not item['system'] == 'geds':
-            continue
-        detector_dict = {}
-
-        # Add important fields
-        detector_dict['rawid'] = item['daq']['rawid']
-        detector_dict['type'] = item['type']
-        detector_dict['manufacturer'] = item['production']['manufacturer']
-        detector_dict['processable'] = item['analysis']['processable']
-        detector_dict['lq'] = item['analysis']['psd']['status']['lq']
-        detectors[key] = detector_dict
-
-        # Create lists with rawids
-        if item['type'] == 'icpc':
-            icpc_detectors.append(item['daq']['rawid'])
-        elif item['type'] == 'ppc':
-            ppc_detectors.append(item['daq']['rawid'])
-        elif item['type'] == 'bege':
-            bege_detectors.append(item['daq']['rawid'])
-        elif item['type'] == 'coax':
-            pass # skip for now
-        else:
-            pass # dont need this
-
-        # Fill lists into dictionary
-        detectors['rawid_lists'] = {
-            'ICPC': icpc_detectors,
-            'PPC': ppc_detectors,
-            'BEGe': bege_detectors,
-            }
+    # Create lists with rawids (coax and other types are skipped for now)
+    detectors['rawid_lists'] = {
+        key: select_detectors(table, detector_type=det_type)['rawid'].tolist()
+        for det_type, key in RAWID_LIST_TYPES.items()
+    }
 
     return detectors
@@ -0,0 +1,210 @@
+# histograms.py
+
+# Energy spectra per detector and run, filled from the streamed pht chunks with a
+# fixed binning. Partial histograms are plain count arrays and are merged by adding
+# them, so runs are filled in parallel and summed. The spectra are persisted in an
+# HDF5 cube counts[detector, run, bin] per energy field, which grows as new
+# detectors and runs are added.
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+from legend200_data_loader.config import GLOBAL_PARAM
+from legend200_data_loader.logger import setup_logger
+from legend200_data_loader.reader import iter_chunks, table_path, DEFAULT_CHUNK_SIZE
+
+logger = setup_logger()
+
+HIST_FILE = 'energy_histograms.h5'
+
+ENERGY_FIELDS = ['cuspEmax_ctc_cal', 'zacEmax_cal']
+
+# Fixed binning in keV: (lower edge, upper edge, bin width)
+DEFAULT_BINNING = (0.0, 4000.0, 0.5)
+
+
+def bin_edges(binning=DEFAULT_BINNING):
+    import numpy as np
+
+    low, high, width = binning
+    return low + width * np.arange(int(round((high - low) / width)) + 1)
+
+
+def fill_histogram(values, binning=DEFAULT_BINNING, counts=None):
+    """
+    Histogram values into the fixed binning; values outside [low, high) are dropped.
+
+    Parameters:
+    values (numpy.ndarray): Energies.
+    binning (tuple): (low, high, width).
+    counts (numpy.ndarray): Optional partial histogram to add the values to.
+
+    Returns:
+    numpy.ndarray: int64 counts per bin.
+    """
+    import numpy as np
+
+    low, high, width = binning
+    n_bins = int(round((high - low) / width))
+    values = values[np.isfinite(values)]
+    bins = np.floor((values - low) / width).astype(np.int64)
+    filled = np.bincount(bins[(bins >= 0) & (bins < n_bins)], minlength=n_bins)
+    return filled if counts is None else counts + filled
+
+
+def _histogram_shard(shard, fields, binning, chunk_size):
+    """
+    Worker: fill the spectra of one detector in one run from its pht chunks. Every
+    file is read with the fields its table has, so a file without the channel or
+    a field only leaves those hits out.
+    """
+    import h5py
+
+    rawid = shard['rawid']
+    counts = {field: None for field in fields}
+    for path in shard['pht_files']:
+        with h5py.File(path, 'r') as f:
+            table = f.get(table_path(rawid, 'pht'))
+            present = [field for field in fields if table is not None and field in table]
+        if table is not None and len(present) < len(fields):
+            logger.warning(f"Fields {sorted(set(fields) - set(present))} of {table_path(rawid, 'pht')} not in {path}")
+        if not present:
+            continue
+        for chunk in iter_chunks([path], rawid, 'pht', present, chunk_size):
+            for field in present:
+                counts[field] = fill_histogram(chunk[field], binning, counts[field])
+    return {field: values for field, values in counts.items() if values is not None}
+
+
+class HistogramCube:
+    """
+    HDF5 cube of spectra: one dataset counts[detector, run, bin] per energy field,
+    with the detector and run labels in the 'detectors' and 'runs' datasets.
+    """
+    def __init__(self, path=None, binning=DEFAULT_BINNING):
+        self.logger = setup_logger()
+        self.path = path or os.path.join(GLOBAL_PARAM['DIRS']['output_dir'], HIST_FILE)
+        self.binning = tuple(binning)
+
+    def _open(self, mode='r'):
+        import h5py
+
+        f = h5py.File(self.path, mode)
+        if mode != 'r' and 'binning' not in f.attrs:
+            f.attrs['binning'] = self.binning
+            string = h5py.string_dtype()
+            f.create_dataset('detectors', shape=(0,), maxshape=(None,), dtype=string)
+            f.create_dataset('runs', shape=(0,), maxshape=(None,), dtype=string)
+        elif tuple(f.attrs['binning']) != self.binning:
+            binning = tuple(f.attrs['binning'])
+            f.close()
+            raise ValueError(f"{self.path} has binning {binning}, not {self.binning}")
+        return f
+
+    @staticmethod
+    def _labels(f, name):
+        return [label.decode() if isinstance(label, bytes) else label for label in f[name][:]]
+
+    @staticmethod
+    def _index(f, name, label):
+        """Return the index of a detector or run label, appending it if it is new."""
+        labels = HistogramCube._labels(f, name)
+        if label in labels:
+            return labels.index(label)
+        dataset = f[name]
+        dataset.resize(len(labels) + 1, axis=0)
+        dataset[len(labels)] = label
+        return len(labels)
+
+    def contents(self):
+        """Return the set of (detector, run) pairs with filled spectra."""
+        if not os.path.exists(self.path):
+            return set()
+        with self._open() as f:
+            detectors, runs = self._labels(f, 'detectors'), self._labels(f, 'runs')
+            filled = set()
+            for field in f:
+                if field in ('detectors', 'runs'):
+                    continue
+                for i, j in zip(*f[field]['filled'][:].nonzero()):
+                    filled.add((detectors[i], runs[j]))
+            return filled
+
+    def add(self, detector, run, spectra):
+        """
+        Add spectra {field: counts} of a detector and run to the cube. Counts are
+        summed with what is stored, so partial histograms can be added separately.
+        """
+        import numpy as np
+
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with self._open('a') as f:
+            i = self._index(f, 'detectors', detector)
+            j = self._index(f, 'runs', run)
+            shape = (len(f['detectors']), len(f['runs']))
+            for field, counts in spectra.items():
+                if field not in f:
+                    group = f.create_group(field)
+                    group.create_dataset('counts', shape=shape + (len(counts),), maxshape=(None, None, len(counts)),
+                                         dtype=np.int64, chunks=(1, 1, len(counts)), compression='gzip')
+                    group.create_dataset('filled', shape=shape, maxshape=(None, None), dtype=bool)
+                group = f[field]
+                for name in ('counts', 'filled'):
+                    if group[name].shape[:2] != shape:
+                        group[name].resize(shape + group[name].shape[2:])
+                group['counts'][i, j] = group['counts'][i, j] + counts
+                group['filled'][i, j] = True
+
+    def spectrum(self, detector, field=ENERGY_FIELDS[0], runs=None):
+        """
+        Return (counts, bin_edges) of a detector summed over the given runs (default: all).
+        """
+        import numpy as np
+
+        with self._open() as f:
+            i = self._labels(f, 'detectors').index(detector)
+            all_runs = self._labels(f, 'runs')
+            columns = [all_runs.index(run) for run in runs] if runs is not None else slice(None)
+            counts = np.atleast_2d(f[field]['counts'][i, columns]).sum(axis=0)
+        return counts, bin_edges(self.binning)
+
+
+def fill_cube(loader=None, metadata=None, periods=None, detectors=None, fields=ENERGY_FIELDS, cube_path=None,
+              binning=DEFAULT_BINNING, max_workers=None, refill=False, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Fill the histogram cube for all detector runs of the periods (same selection as
+    MERGE). Detector runs already in the cube are skipped unless refill is set.
+
+    Returns:
+    HistogramCube: The updated cube.
+    """
+    from legend200_data_loader.merge import plan_merge, period_run_key
+
+    if loader is None:
+        from legend200_data_loader.loader import LegendDataLoader
+        loader = LegendDataLoader()
+    if metadata is None:
+        from legend200_data_loader.metadata import MetadataLoader
+        metadata = MetadataLoader()
+
+    cube = HistogramCube(cube_path, binning)
+    done = set() if refill else cube.contents()
+    shards = [shard for shard in plan_merge(loader, metadata, periods, detectors)
+              if (shard['detector'], period_run_key(shard['period'], shard['run'])) not in done]
+    if refill and os.path.exists(cube.path):
+        os.remove(cube.path)
+    logger.info(f"Filling spectra of {len(shards)} detector runs into {cube.path}")
+
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        futures = {pool.submit(_histogram_shard, shard, list(fields), tuple(binning), chunk_size): shard
+                   for shard in shards}
+        # The cube is only written from this process
+        for future, shard in futures.items():
+            run_key = period_run_key(shard['period'], shard['run'])
+            try:
+                spectra = future.result()
+            except Exception as e:
+                logger.error(f"Failed to fill spectra of {shard['detector']} in {run_key}: {e}")
+                continue
+            if spectra:
+                cube.add(shard['detector'], run_key, spectra)
+    return cube
@@ -1,9 +1,113 @@
-from lgdo.lh5 import load_datasets, load_nda
 import os
+from concurrent.futures import ProcessPoolExecutor
+
+# Columns of the structural summary, one row per dataset
+SUMMARY_COLUMNS = [
+    'file', 'name', 'shape', 'dtype', 'chunks', 'compression', 'compression_opts',
+    'stored_bytes', 'logical_bytes', 'datatype', 'group_datatype', 'units',
+]
+
+
+def _attr(obj, name):
+    value = obj.attrs.get(name)
+    return value.decode() if isinstance(value, bytes) else value
+
+
+def describe_file(path):
+    """
+    Describe the structure of an LH5 file from its HDF5 metadata, without reading any data.
+
+    Parameters:
+    - path: Path to the .lh5 file.
+
+    Returns:
+    - list: One dict per dataset with the keys in SUMMARY_COLUMNS.
+    """
+    import h5py
+
+    rows = []
+
+    def visit(name, obj):
+        if not isinstance(obj, h5py.Dataset):
+            return
+        rows.append({
+            'file': path,
+            'name': name,
+            'shape': obj.shape,
+            'dtype': str(obj.dtype),
+            'chunks': obj.chunks,
+            'compression': obj.compression,
+            'compression_opts': obj.compression_opts,
+            'stored_bytes': obj.id.get_storage_size(),
+            'logical_bytes': obj.size * obj.dtype.itemsize,
+            'datatype': _attr(obj, 'datatype'),
+            'group_datatype': _attr(obj.parent, 'datatype'),
+            'units': _attr(obj, 'units'),
+        })
+
+    with h5py.File(path, 'r') as f:
+        f.visititems(visit)
+    return rows
+
+
+def inspect_files(files, max_workers=None):
+    """
+    Describe many LH5 files in a process pool.
+
+    Parameters:
+    - files: List of .lh5 file paths.
+    - max_workers: Size of the process pool.
+
+    Returns:
+    - pandas.DataFrame: One row per dataset and file (see SUMMARY_COLUMNS); files
+      that cannot be opened are reported with an empty name and the error as dtype.
+    """
+    import pandas as pd
+
+    rows = []
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        for path, future in [(path, pool.submit(describe_file, path)) for path in files]:
+            try:
+                rows.extend(future.result())
+            except Exception as e:
+                rows.append({**dict.fromkeys(SUMMARY_COLUMNS, None), 'file': path, 'name': '', 'dtype': f"error: {e}"})
+    return pd.DataFrame(rows, columns=SUMMARY_COLUMNS)
+
+
+def inspect_run(loader, period, run, tier='raw_files', max_workers=None):
+    """
+    Return the structural summary of all files of one tier of a run.
+
+    Parameters:
+    - loader: LegendDataLoader.
+    - period, run: The run, e.g. 'p03/', 'r000'.
+    - tier: The file_dict key of the tier (default is 'raw_files').
+    """
+    return inspect_files(loader.load_files(period, run).get(tier, []), max_workers)
+
+
+def inspect_period(loader, period, tier='raw_files', max_workers=None):
+    """
+    Return the structural summary of all files of one tier of a period, with
+    'period' and 'run' columns.
+    """
+    import pandas as pd
+
+    files, runs = [], []
+    for (_, run), file_dict in loader.load_files_many([(period, run) for run in loader.get_runs(period)]).items():
+        files.extend(file_dict.get(tier, []))
+        runs.extend([run] * len(file_dict.get(tier, [])))
+    summary = inspect_files(files, max_workers)
+    run_of_file = pd.Series(runs, index=files, dtype=object)
+    summary.insert(0, 'run', summary['file'].map(run_of_file))
+    summary.insert(0, 'period', period)
+    return summary
+
 
 def inspect_raw_data_file(file_dict, tier='raw_files'):
     """
     Inspects the contents of a raw .lh5 data file.
+    Only the HDF5 metadata is read (see describe_file), so this is fast even for waveforms.
 
     Parameters:
     - file_dict: Dictionary of files from the data loader.
@@ -16,29 +120,22 @@ def inspect_raw_data_file(file_dict, tier='raw_files'):
     if tier in file_dict and file_dict[tier]:
         raw_file_path = file_dict[tier][0]  # Get the first file from the specified tier
         print(f"Inspecting raw file: {os.path.basename(raw_file_path)}")
-        
+
         try:
-            # Use load_datasets to find available datasets in the file
-            datasets = load_datasets(raw_file_path)
+            rows = describe_file(raw_file_path)
             print("Datasets available in the file:")
-            for ds_name in datasets:
-                print(f" - {ds_name}")
-
-            # Choose the first dataset for demonstration purposes
-            par_list = list(datasets.keys())
-
-            # Load data using the par_list
-            data, n_rows = load_nda(raw_file_path, par_list=par_list)
-            
-            # Display the first dataset details
-            first_key = par_list[0]
-            dataset = data[first_key]
-            print(f"\nDetails of the first dataset ({first_key}):")
-            print(f"Type: {type(dataset)}")
-            print(f"Shape: {dataset.shape}")
-            if hasattr(dataset, 'metadata'):
-                print(f"Metadata: {dataset.metadata}")
-                
+            for row in rows:
+                print(f" - {row['name']}")
+
+            if rows:
+                # Display the first dataset details
+                row = rows[0]
+                print(f"\nDetails of the first dataset ({row['name']}):")
+                print(f"Type: {row['datatype'] or row['dtype']}")
+                print(f"Shape: {row['shape']}")
+                print(f"Chunks: {row['chunks']}, compression: {row['compression']}")
+                print(f"Size: {row['stored_bytes']} bytes stored, {row['logical_bytes']} bytes logical")
+
         except Exception as e:
             print(f"Error inspecting raw data file: {e}")
     else:
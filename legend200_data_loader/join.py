@@ -0,0 +1,202 @@
+# join.py
+
+# Attach event-level information from the tcm (time coincidence map) tier to the
+# per-channel hits of the pht tier. The tcm lists for every event the channels
+# (table_key) and the rows in their tables (row_in_table) that belong to it; all
+# joins are done with NumPy index gathers, one file at a time.
+
+from legend200_data_loader.logger import setup_logger
+from legend200_data_loader.utils import channel_rawid
+from legend200_data_loader.catalog import parse_file_timestamp
+from legend200_data_loader.reader import read_table
+
+logger = setup_logger()
+
+TCM_GROUP = 'hardware_tcm_1'
+
+# Dataset names of the tcm columns in current and older production versions
+TCM_FIELDS = {
+    'table_key': ['table_key', 'array_id'],
+    'row_in_table': ['row_in_table', 'array_idx'],
+}
+
+
+def read_tcm(path):
+    """
+    Read the tcm of a file as flat arrays.
+
+    Returns:
+    dict: 'table_key' and 'row_in_table' (one entry per channel hit, grouped by event)
+          and 'cumulative_length' (end offset of each event in the flat arrays).
+    """
+    import h5py
+
+    tcm = {}
+    with h5py.File(path, 'r') as f:
+        group = f[TCM_GROUP]
+        for field, names in TCM_FIELDS.items():
+            name = next((name for name in names if name in group), None)
+            if name is None:
+                raise KeyError(f"No {field} in {path}:{TCM_GROUP}")
+            if isinstance(group[name], h5py.Dataset):
+                # Older layout: flat arrays with a shared cumulative_length
+                tcm[field] = group[name][:]
+                tcm['cumulative_length'] = group['cumulative_length'][:]
+            else:
+                tcm[field] = group[name]['flattened_data'][:]
+                tcm['cumulative_length'] = group[name]['cumulative_length'][:]
+    return tcm
+
+
+def event_channels(tcm, events):
+    """
+    Gather the channels of the given events.
+
+    Returns:
+    tuple: (offsets, channels) where the channels of events[i] are
+           channels[offsets[i]:offsets[i + 1]].
+    """
+    import numpy as np
+
+    cumulative_length = tcm['cumulative_length']
+    stops = cumulative_length[events]
+    starts = np.where(events > 0, cumulative_length[events - 1], 0)
+    counts = stops - starts
+    offsets = np.concatenate([[0], np.cumsum(counts)])
+    # Flat index of every gathered entry: start of its event + position within the event
+    flat = np.repeat(starts - offsets[:-1], counts) + np.arange(offsets[-1])
+    return offsets, tcm['table_key'][flat]
+
+
+def tcm_events(tcm, pulser_channel=None, geds_channels=None):
+    """
+    Compute the event-level information of a tcm that is shared by all its channels.
+    The tcm entries are grouped by channel once instead of being masked per channel.
+
+    Parameters:
+    tcm (dict): Output of read_tcm.
+    pulser_channel (int or str): Rawid of the pulser channel, to flag pulser events.
+    geds_channels (array-like): Rawids counted for the multiplicity (default: all channels).
+
+    Returns:
+    dict: 'entry_event' (event of every tcm entry), 'multiplicity' and, with a pulser
+          channel, 'is_pulser' per event, and the per-channel grouping of the entries.
+    """
+    import numpy as np
+
+    table_key = tcm['table_key']
+    cumulative_length = tcm['cumulative_length']
+    n_events = len(cumulative_length)
+    # Event of every flat tcm entry
+    entry_event = np.repeat(np.arange(n_events), np.diff(cumulative_length, prepend=0))
+
+    if geds_channels is None:
+        counted = entry_event
+    else:
+        counted = entry_event[np.isin(table_key, [channel_rawid(channel) for channel in geds_channels])]
+    events = {
+        'entry_event': entry_event,
+        'multiplicity': np.bincount(counted, minlength=n_events),
+    }
+    if pulser_channel is not None:
+        is_pulser = np.zeros(n_events, dtype=bool)
+        is_pulser[entry_event[table_key == channel_rawid(pulser_channel)]] = True
+        events['is_pulser'] = is_pulser
+
+    order = np.argsort(table_key, kind='stable')
+    channels, starts = np.unique(table_key[order], return_index=True)
+    events.update({'order': order, 'channels': channels, 'starts': starts,
+                   'stops': np.append(starts[1:], len(order))})
+    return events
+
+
+def _channel_entries(events, channel):
+    """Return the indices of a channel's entries in the flat tcm arrays."""
+    import numpy as np
+
+    position = np.searchsorted(events['channels'], channel)
+    if position == len(events['channels']) or events['channels'][position] != channel:
+        return np.zeros(0, dtype=np.int64)
+    return events['order'][events['starts'][position]:events['stops'][position]]
+
+
+def join_tcm(tcm, channel, n_hits, pulser_channel=None, geds_channels=None, with_channels=False, events=None):
+    """
+    Join event-level tcm information to the hits of one channel in one file.
+
+    Parameters:
+    tcm (dict): Output of read_tcm.
+    channel (int or str): Rawid or 'ch<rawid>' key of the channel.
+    n_hits (int): Number of rows in the channel's table.
+    pulser_channel (int): Rawid of the pulser channel, to flag pulser events.
+    geds_channels (array-like): Rawids counted for the multiplicity (default: all channels).
+    with_channels (bool): Also return the channels of every hit's event.
+    events (dict): Output of tcm_events for this tcm, to reuse across channels (it
+        then takes the place of pulser_channel and geds_channels).
+
+    Returns:
+    dict: Per hit 'event_index' (-1 if the hit is not in the tcm), 'multiplicity'
+          and, if requested, 'is_pulser' and 'coincident_offsets'/'coincident_channels'.
+    """
+    import numpy as np
+
+    if events is None:
+        events = tcm_events(tcm, pulser_channel, geds_channels)
+
+    entries = _channel_entries(events, channel_rawid(channel))
+    event_index = np.full(n_hits, -1, dtype=np.int64)
+    event_index[tcm['row_in_table'][entries]] = events['entry_event'][entries]
+    found = event_index >= 0
+    hit_events = np.where(found, event_index, 0)
+
+    joined = {
+        'event_index': event_index,
+        'multiplicity': np.where(found, events['multiplicity'][hit_events], 0),
+    }
+    if 'is_pulser' in events:
+        joined['is_pulser'] = found & events['is_pulser'][hit_events]
+
+    if with_channels:
+        offsets, channels = event_channels(tcm, event_index[found])
+        counts = np.zeros(n_hits, dtype=np.int64)
+        counts[found] = np.diff(offsets)
+        joined['coincident_offsets'] = np.concatenate([[0], np.cumsum(counts)])
+        joined['coincident_channels'] = channels
+    return joined
+
+
+def pair_files(pht_files, tcm_files, tier='tcm'):
+    """Pair pht and tcm (or other tier) files of a run by the start timestamp in their
+    names. Files of either list without a counterpart are left out with a warning."""
+    tcm_by_timestamp = {parse_file_timestamp(path)[0]: path for path in tcm_files}
+    pairs = []
+    for path in pht_files:
+        timestamp, _ = parse_file_timestamp(path)
+        if timestamp not in tcm_by_timestamp:
+            logger.warning(f"No {tier} file for {path}")
+            continue
+        pairs.append((path, tcm_by_timestamp.pop(timestamp)))
+    for path in tcm_by_timestamp.values():
+        logger.warning(f"No pht file for {path}")
+    return pairs
+
+
+def iter_joined(pht_files, tcm_files, channels, fields=None, pulser_channel=None, geds_channels=None,
+                with_channels=False):
+    """
+    Stream the pht hits of the given channels file by file, with the tcm
+    information of join_tcm attached as extra columns.
+
+    Yields:
+    tuple: (channel, file_index, columns) with the pht fields and joined tcm arrays.
+    """
+    for file_index, (pht_path, tcm_path) in enumerate(pair_files(pht_files, tcm_files)):
+        tcm = read_tcm(tcm_path)
+        events = tcm_events(tcm, pulser_channel, geds_channels)
+        for channel in channels:
+            columns = read_table(pht_path, channel, 'pht', fields)
+            if columns is None:
+                continue
+            n_hits = len(next(iter(columns.values()))) if columns else 0
+            columns.update(join_tcm(tcm, channel, n_hits, with_channels=with_channels, events=events))
+            yield channel, file_index, columns
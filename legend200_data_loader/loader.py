@@ -4,21 +4,29 @@
 
 # Created by M. Babicz 
 
+# Heavy dependencies (h5py, legendmeta, lgdo) are imported where they are used,
+# so that file listing workers start fast.
+
 import os
-import h5py
-from legendmeta import LegendMetadata
-from lgdo import lh5
 from legend200_data_loader.config import GLOBAL_PARAM
 from legend200_data_loader.logger import setup_logger
+from legend200_data_loader.par import PAR_CACHE
+from legend200_data_loader.reader import iter_chunks, DEFAULT_CHUNK_SIZE
+from legend200_data_loader.join import iter_joined, pair_files
+from legend200_data_loader.masks import MaskCache
+from legend200_data_loader.prefetch import RunPrefetcher, DEFAULT_DEPTH, MAX_PREFETCH_BYTES
+from legend200_data_loader.waveforms import RunWaveforms, DEFAULT_WAVEFORM_FIELD
+from legend200_data_loader.catalog import (
+    FileCatalog, RunIndex, TIERS, MAX_SCAN_WORKERS, list_dirs_parallel, parse_file_timestamp
+)
 
 import glob
-import json
 
 import traceback
 
 
 class LegendDataLoader:
-    def __init__(self):
+    def __init__(self, use_catalog=False, catalog_path=None):
         self.logger = setup_logger() #o keep track of events and errors
         self.type = GLOBAL_PARAM['DIRS']['TYPE']
         self.data_dir = GLOBAL_PARAM['DIRS']['LEGEND_DATA_DIR']
@@ -29,8 +37,40 @@ class LegendDataLoader:
         self.par_subdir = GLOBAL_PARAM['DIRS']['PAR_SUBDIR']
         self.periods = GLOBAL_PARAM['DIRS']['PERIODS']
 
+        # Persistent file index; without it runs and files are listed from the filesystem
+        self.catalog = None
+        # Timestamp -> (period, run, file) index, see build_run_index
+        self.run_index = None
+        if use_catalog:
+            self.open_catalog(catalog_path)
+
+    def open_catalog(self, catalog_path=None, rescan=False):
+        """
+        Open the file catalog. An empty catalog (or rescan=True) triggers a full scan
+        of all periods, otherwise only directories whose mtime changed are re-listed.
+        """
+        self.catalog = FileCatalog(catalog_path, self.data_dir, self.type, self.periods)
+        if rescan or self.catalog.is_empty():
+            self.catalog.scan()
+        else:
+            self.refresh_catalog()
+        return self.catalog
+
+    def refresh_catalog(self):
+        """
+        Incrementally refresh the file catalog and return the
+        {'added': [...], 'removed': [...]} diff of file paths.
+        """
+        diff = self.catalog.refresh()
+        if diff['added'] or diff['removed']:
+            self.logger.info(f"File catalog refreshed: {len(diff['added'])} files added, {len(diff['removed'])} removed.")
+        return diff
+
     def get_runs(self, period):
         """Retrieve run directories for a given period."""
+        if self.catalog is not None:
+            return self.catalog.get_runs(period)
+
         period_path = os.path.join(self.data_dir, self.raw_subdir, self.type, period)
         try:
             return sorted(os.listdir(period_path))
@@ -43,18 +83,148 @@ class LegendDataLoader:
         Collects and returns a dictionary (file_dict) that contains the paths 
         to each type of file.
         """
-        file_dict = {}
         run_path = os.path.join(period, run)
-        file_types = {
-            'raw_files': os.path.join(self.raw_subdir, self.type, run_path, '*.lh5'),
-            'pht_files': os.path.join(self.pht_subdir, self.type, run_path, '*.lh5'),
-            'tcm_files': os.path.join(self.tcm_subdir, self.type, run_path, '*.lh5'),
-            'psp_files': os.path.join(self.psp_subdir, self.type, run_path, '*.lh5'),
-            'par_file': os.path.join(self.par_subdir, self.type, run_path, '*.json')
-        }
-
-        for key, pattern in file_types.items():
-            files = glob.glob(os.path.join(self.data_dir, pattern))
+        files_by_tier = {}
+
+        for tier, (_, extension, _) in TIERS.items():
+            if self.catalog is not None:
+                files_by_tier[tier] = self.catalog.get_files(period, run, tier)
+            else:
+                pattern = os.path.join(getattr(self, f"{tier}_subdir"), self.type, run_path, '*' + extension)
+                files_by_tier[tier] = glob.glob(os.path.join(self.data_dir, pattern))
+
+        return self._build_file_dict(run_path, files_by_tier)
+
+    def load_files_many(self, period_runs=None, max_workers=MAX_SCAN_WORKERS):
+        """Load the file_dict of many (period, run) pairs in one call.
+        Without a catalog all run directories of all tiers are listed concurrently
+        with a bounded thread pool. By default all runs of all periods are loaded.
+        Returns a dictionary {(period, run): file_dict}.
+        """
+        if self.catalog is not None:
+            if period_runs is None:
+                period_runs = [(period, run) for period in self.periods for run in self.get_runs(period)]
+            return {(period, run): self.load_files(period, run) for period, run in period_runs}
+
+        if period_runs is None:
+            period_paths = {os.path.join(self.data_dir, self.raw_subdir, self.type, period): None
+                            for period in self.periods}
+            listings = list_dirs_parallel(period_paths, max_workers)
+            period_runs = []
+            for period, period_path in zip(self.periods, period_paths):
+                if listings[period_path] is None:
+                    self.logger.error(f"Period path not found: {period_path}")
+                    continue
+                period_runs.extend((period, os.path.basename(path)) for path in listings[period_path])
+
+        run_dirs = {}
+        for period, run in period_runs:
+            for tier, (_, extension, _) in TIERS.items():
+                run_dir = os.path.join(self.data_dir, getattr(self, f"{tier}_subdir"), self.type, period, run)
+                run_dirs[run_dir] = extension
+        listings = list_dirs_parallel(run_dirs, max_workers)
+
+        file_dicts = {}
+        for period, run in period_runs:
+            files_by_tier = {
+                tier: listings[os.path.join(self.data_dir, getattr(self, f"{tier}_subdir"), self.type, period, run)] or []
+                for tier in TIERS
+            }
+            file_dicts[(period, run)] = self._build_file_dict(os.path.join(period, run), files_by_tier)
+        return file_dicts
+
+    def build_run_index(self, period_runs=None, tier='raw'):
+        """Build the sorted run-boundary index (catalog.RunIndex) from the start
+        timestamps in the file names of a tier, for the given (period, run) pairs
+        (default: all runs of all periods).
+        """
+        wanted = None
+        if period_runs is not None:
+            wanted = set((period.strip('/'), run.strip('/')) for period, run in period_runs)
+
+        file_starts = {}
+        if self.catalog is not None:
+            for row in self.catalog.get_file_info(tier=tier):
+                key = (row['period'], row['run'])
+                if row['start_time'] is not None and (wanted is None or key in wanted):
+                    file_starts.setdefault(key, []).append((row['start_time'], row['path']))
+        else:
+            file_key = TIERS[tier][2]
+            for (period, run), file_dict in self.load_files_many(period_runs).items():
+                for path in file_dict.get(file_key, []):
+                    _, start_time = parse_file_timestamp(path)
+                    if start_time is not None:
+                        file_starts.setdefault((period.strip('/'), run.strip('/')), []).append((start_time, path))
+
+        self.run_index = RunIndex(file_starts)
+        return self.run_index
+
+    def iter_runs(self, period_runs=None, channels=None, fields=None, tier='pht', depth=DEFAULT_DEPTH,
+                  max_bytes=MAX_PREFETCH_BYTES):
+        """Iterate over runs (default: all runs of all periods) while the next runs are
+        read ahead in a background thread, see prefetch.RunPrefetcher.
+        Yields (period, run, file_dict, tables); the returned iterator reports the time
+        spent waiting for data in its stall_time and stalls attributes.
+        """
+        if period_runs is None:
+            period_runs = [(period, run) for period in self.periods for run in self.get_runs(period)]
+        return RunPrefetcher(self, period_runs, channels, fields, tier, depth, max_bytes)
+
+    def iter_tier(self, period, run, tier, channels, fields=None, chunk_size=DEFAULT_CHUNK_SIZE, with_index=False):
+        """Stream the given channels of a tier ('raw', 'pht' or 'psp') over all files of
+        a run in chunks of chunk_size rows, reading only the requested fields
+        (default: the MERGE desired_fields present in the files).
+        Yields (channel, chunk) pairs, where chunk maps field names to NumPy arrays.
+        """
+        files = self.load_files(period, run).get(TIERS[tier][2], [])
+        if isinstance(channels, (int, str)):
+            channels = [channels]
+        for channel in channels:
+            for chunk in iter_chunks(files, channel, tier, fields, chunk_size, with_index):
+                yield channel, chunk
+
+    def iter_joined(self, period, run, channels, fields=None, pulser_channel=None, geds_channels=None,
+                    with_channels=False):
+        """Stream the pht hits of the given channels file by file with the tcm information
+        attached: 'event_index', 'multiplicity' and, with a pulser rawid (e.g.
+        MetadataLoader.get_channel_id(GLOBAL_PARAM['aux_channels']['pulser'])), 'is_pulser'.
+        Yields (channel, file_index, columns), see join.join_tcm.
+        """
+        file_dict = self.load_files(period, run)
+        if isinstance(channels, (int, str)):
+            channels = [channels]
+        yield from iter_joined(file_dict.get('pht_files', []), file_dict.get('tcm_files', []), channels, fields,
+                               pulser_channel, geds_channels, with_channels)
+
+    def load_event_masks(self, period, run, channel, aux_rawids, start=0, stop=None, cache_dir=None):
+        """Return the cached pulser/baseline masks (see masks.MaskCache) of a channel's
+        rows [start, stop) for every pht file of a run (paired with its tcm file),
+        building missing cache entries. The masks have the length of the channel's pht table.
+        aux_rawids maps mask names to rawids, e.g. {'pulser': 1027201, 'baseline': 1027200}.
+        """
+        cache = MaskCache(aux_rawids, cache_dir)
+        file_dict = self.load_files(period, run)
+        masks = []
+        for pht_path, tcm_path in pair_files(file_dict.get('pht_files', []), file_dict.get('tcm_files', [])):
+            try:
+                masks.append(cache.get(tcm_path, channel, start, stop, pht_path))
+            except Exception as e:
+                self.logger.error(f"Failed to load event masks from {tcm_path}: {e}")
+                masks.append(None)
+        return masks
+
+    def open_waveforms(self, period, run, channel, field=DEFAULT_WAVEFORM_FIELD):
+        """Open random access to the raw waveforms of a channel over all raw files of a
+        run (see waveforms.RunWaveforms): waveforms[i] reads only waveform i, memory-mapped
+        when the dataset is contiguous and uncompressed.
+        """
+        return RunWaveforms(self.load_files(period, run).get('raw_files', []), channel, field)
+
+    def _build_file_dict(self, run_path, files_by_tier):
+        """Assemble a file_dict from the files found for each tier of a run."""
+        file_dict = {}
+        for tier, files in files_by_tier.items():
+            key = TIERS[tier][2]
             if key == 'par_file':  # Only expect one JSON file
                 if len(files) != 1:
                     self.logger.error(f"Invalid number of PAR files for {run_path}. Expected 1, found {len(files)}.")
@@ -69,13 +239,27 @@ class LegendDataLoader:
         return file_dict
 
     def load_par_file(self, par_file_path):
-        """Load a PAR JSON file."""
+        """Load a PAR JSON file. Files are parsed once per process (see par.ParCache)
+        and shared between callers, so the returned dictionary must not be modified.
+        """
+        try:
+            return PAR_CACHE.get(par_file_path)
+        except Exception as e:
+            self.logger.error(f"Failed to load PAR file: {par_file_path}. Error: {e}")
+            return None
+
+    def load_par_channel(self, par_file_path, channel, key='pars'):
+        """Load the PAR entry of a single channel (rawid or 'ch<rawid>'), by default
+        only its 'pars' (the calibration operations). Pass key=None for the whole entry.
+        """
         try:
-            with open(par_file_path, 'r') as par_file:
-                return json.load(par_file)
+            entry = PAR_CACHE.get_channel(par_file_path, channel, key)
         except Exception as e:
             self.logger.error(f"Failed to load PAR file: {par_file_path}. Error: {e}")
             return None
+        if entry is None:
+            self.logger.error(f"Channel {channel} not found in PAR file: {par_file_path}")
+        return entry
 
 
 #class LegendDataLoader:
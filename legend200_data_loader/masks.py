@@ -0,0 +1,200 @@
+# masks.py
+
+# Per-run cache of the pulser and baseline event masks. The masks are computed once
+# per tcm file for all channels and stored as packed bits in one HDF5 file per tcm
+# file under output_dir/masks, keyed by the tcm path and mtime. Detector-level
+# readers then fetch a row slice of one channel's mask instead of re-reading the tcm.
+
+import os
+import hashlib
+from legend200_data_loader.config import GLOBAL_PARAM
+from legend200_data_loader.logger import setup_logger
+from legend200_data_loader.utils import channel_key
+from legend200_data_loader.reader import TIER_GROUPS
+from legend200_data_loader.join import read_tcm, pair_files
+
+MASK_SUBDIR = 'masks'
+
+
+def table_lengths(path, tier='pht'):
+    """
+    Return the number of rows of every channel table of a tier file, from the
+    dataset shapes only.
+
+    Returns:
+    dict: rawid -> number of rows.
+    """
+    import h5py
+
+    lengths = {}
+    with h5py.File(path, 'r') as f:
+        for key, group in f.items():
+            table = group.get(TIER_GROUPS[tier]) if key.startswith('ch') and isinstance(group, h5py.Group) else None
+            if table is None:
+                continue
+            # Datasets directly in the table are row aligned
+            dataset = next((item for item in table.values() if isinstance(item, h5py.Dataset) and item.shape), None)
+            if dataset is not None:
+                lengths[int(key[2:])] = dataset.shape[0]
+    return lengths
+
+
+def compute_masks(tcm, aux_rawids, n_hits=None):
+    """
+    Flag the hits of every channel that belong to an event of an auxiliary channel.
+
+    Parameters:
+    tcm (dict): Output of join.read_tcm.
+    aux_rawids (dict): Mask name -> rawid of the auxiliary channel, e.g. {'pulser': 1027201}.
+    n_hits (dict): Optional rawid -> number of rows of the channel's table (see table_lengths).
+        Masks are sized to the table, so that rows the tcm does not reference are
+        included (as False); channels of the table missing from the tcm get all-False masks.
+        Without it the masks end at the last row referenced by the tcm.
+
+    Returns:
+    dict: rawid -> {mask name: boolean array indexed by row_in_table}.
+    """
+    import numpy as np
+
+    table_key = tcm['table_key']
+    row_in_table = tcm['row_in_table']
+    cumulative_length = tcm['cumulative_length']
+    n_events = len(cumulative_length)
+    entry_event = np.repeat(np.arange(n_events), np.diff(cumulative_length, prepend=0))
+
+    entry_flags = {}
+    for name, rawid in aux_rawids.items():
+        event_flag = np.zeros(n_events, dtype=bool)
+        event_flag[entry_event[table_key == rawid]] = True
+        entry_flags[name] = event_flag[entry_event]
+
+    # Group the tcm entries by channel once instead of masking per channel
+    order = np.argsort(table_key, kind='stable')
+    channels, starts = np.unique(table_key[order], return_index=True)
+    stops = np.append(starts[1:], len(order))
+
+    n_hits = n_hits or {}
+    masks = {}
+    for channel, start, stop in zip(channels, starts, stops):
+        entries = order[start:stop]
+        rows = row_in_table[entries]
+        length = max(int(n_hits.get(int(channel), 0)), int(rows.max()) + 1)
+        channel_masks = {}
+        for name, flags in entry_flags.items():
+            mask = np.zeros(length, dtype=bool)
+            mask[rows] = flags[entries]
+            channel_masks[name] = mask
+        masks[int(channel)] = channel_masks
+    for channel, length in n_hits.items():
+        if int(channel) not in masks:
+            masks[int(channel)] = {name: np.zeros(int(length), dtype=bool) for name in aux_rawids}
+    return masks
+
+
+class MaskCache:
+    """
+    Cache of pulser/baseline hit masks per tcm file. An entry is rebuilt when the
+    tcm file's mtime, the pht file the masks are sized to or the auxiliary channel
+    rawids change.
+    """
+    def __init__(self, aux_rawids, cache_dir=None):
+        """
+        Parameters:
+        aux_rawids (dict): Mask name -> rawid, e.g. the rawids of
+            GLOBAL_PARAM['aux_channels'] resolved with MetadataLoader.get_channel_ids.
+        cache_dir (str): Cache directory (default: output_dir/masks).
+        """
+        self.logger = setup_logger()
+        self.aux_rawids = {name: int(rawid) for name, rawid in aux_rawids.items()}
+        self.cache_dir = cache_dir or os.path.join(GLOBAL_PARAM['DIRS']['output_dir'], MASK_SUBDIR)
+
+    def path(self, tcm_path):
+        """Return the cache file of a tcm file."""
+        digest = hashlib.sha1(os.path.abspath(tcm_path).encode()).hexdigest()[:16]
+        name = os.path.splitext(os.path.basename(tcm_path))[0]
+        return os.path.join(self.cache_dir, f"{name}_{digest}.h5")
+
+    @staticmethod
+    def _source(path):
+        """Return the (path, mtime) attrs of a source file ('', 0 if there is none)."""
+        return (os.path.abspath(path), os.stat(path).st_mtime) if path else ('', 0.0)
+
+    def _is_current(self, cache_path, tcm_path, pht_path=None):
+        import h5py
+
+        if not os.path.exists(cache_path):
+            return False
+        try:
+            with h5py.File(cache_path, 'r') as f:
+                return ((f.attrs['tcm_path'], f.attrs['tcm_mtime']) == self._source(tcm_path)
+                        and (f.attrs.get('pht_path'), f.attrs.get('pht_mtime')) == self._source(pht_path)
+                        and all(f.attrs.get(f"{name}_rawid") == rawid for name, rawid in self.aux_rawids.items()))
+        except Exception as e:
+            self.logger.warning(f"Unreadable mask cache {cache_path}: {e}")
+            return False
+
+    def build(self, tcm_path, pht_path=None):
+        """
+        Compute and store the masks of a tcm file unless they are cached. With the
+        matching pht file, the masks are sized to its channel tables (see compute_masks).
+        Returns the cache path.
+        """
+        import h5py
+        import numpy as np
+
+        cache_path = self.path(tcm_path)
+        if self._is_current(cache_path, tcm_path, pht_path):
+            return cache_path
+
+        tcm_source, pht_source = self._source(tcm_path), self._source(pht_path)
+        n_hits = table_lengths(pht_path) if pht_path else None
+        masks = compute_masks(read_tcm(tcm_path), self.aux_rawids, n_hits)
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+        with h5py.File(tmp_path, 'w') as f:
+            f.attrs['tcm_path'], f.attrs['tcm_mtime'] = tcm_source
+            f.attrs['pht_path'], f.attrs['pht_mtime'] = pht_source
+            for name, rawid in self.aux_rawids.items():
+                f.attrs[f"{name}_rawid"] = rawid
+            for channel, channel_masks in masks.items():
+                group = f.create_group(channel_key(channel))
+                group.attrs['n_hits'] = len(next(iter(channel_masks.values()), []))
+                for name, mask in channel_masks.items():
+                    group.create_dataset(name, data=np.packbits(mask))
+        os.replace(tmp_path, cache_path)
+        self.logger.info(f"Cached event masks of {tcm_path} in {cache_path}")
+        return cache_path
+
+    def build_run(self, tcm_files, pht_files=None):
+        """Build the mask cache of all tcm files of a run and return the cache paths.
+        With the run's pht files, each tcm file is paired with its pht file by timestamp."""
+        if pht_files is None:
+            return [self.build(path) for path in tcm_files]
+        return [self.build(tcm_path, pht_path) for pht_path, tcm_path in pair_files(pht_files, tcm_files)]
+
+    def get(self, tcm_path, channel, start=0, stop=None, pht_path=None):
+        """
+        Return the masks of the rows [start, stop) of a channel, building the cache
+        entry if needed (sized to the channel table of pht_path if given). Only the
+        packed bytes covering the slice are read.
+
+        Returns:
+        dict: Mask name -> boolean array, or None if the channel is not in the tcm.
+        """
+        import h5py
+        import numpy as np
+
+        with h5py.File(self.build(tcm_path, pht_path), 'r') as f:
+            key = channel_key(channel)
+            if key not in f:
+                self.logger.warning(f"Channel {key} not found in the tcm {tcm_path}")
+                return None
+            group = f[key]
+            n_hits = int(group.attrs.get('n_hits', 0))
+            stop = n_hits if stop is None else min(stop, n_hits)
+            start = min(start, stop)
+            first_byte, last_byte = start // 8, (stop + 7) // 8
+            return {
+                name: np.unpackbits(group[name][first_byte:last_byte])[start - 8 * first_byte:stop - 8 * first_byte].astype(bool)
+                for name in self.aux_rawids
+            }
@@ -0,0 +1,267 @@
+# merge.py
+
+# Implementation of the MERGE stage configured in GLOBAL_PARAM['MERGE']: the desired
+# pht (and optionally raw) fields of every detector are collected over all runs of
+# the periods to merge and written to one HDF5 file per detector in output_dir.
+#
+# The work is sharded by (detector, run) over a process pool. Every shard streams
+# its rows in chunks sized to the worker memory budget into a part file; the parts
+# of a detector are then concatenated chunk by chunk into the final file.
+
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+from legend200_data_loader.config import GLOBAL_PARAM
+from legend200_data_loader.logger import setup_logger
+from legend200_data_loader.catalog import parse_file_timestamp
+from legend200_data_loader.join import pair_files
+from legend200_data_loader.reader import iter_chunks, resolve_fields, rows_for_memory, table_path
+
+logger = setup_logger()
+
+MERGE_SUBDIR = 'merged'
+
+# Bytes of field data a worker holds in memory at once
+MAX_WORKER_MEMORY = 1024**3
+
+
+def period_run_key(period, run):
+    """Return the 'p08_r005' style key used in GLOBAL_PARAM['exclude_period_run']."""
+    return f"{period.strip('/')}_{run.strip('/')}"
+
+
+def plan_merge(loader, metadata, periods=None, detectors=None, output_dir=None):
+    """
+    List the (detector, run) shards of the merge.
+
+    Parameters:
+    loader: LegendDataLoader used to list the runs and files.
+    metadata: MetadataLoader used to select the detectors valid in each run.
+    periods (list): Periods to merge (default: MERGE.periods_to_merge).
+    detectors (list): Optional detector names to restrict the merge to.
+    output_dir (str): Merge output directory, used to skip existing outputs
+        unless MERGE.replace_files is set.
+
+    Returns:
+    list: Shard dicts with the keys detector, rawid, period, run, pht_files, raw_files
+          and par_file (None if the run has no PAR file).
+    """
+    periods = periods or GLOBAL_PARAM['MERGE']['periods_to_merge']
+    excluded = set(GLOBAL_PARAM['exclude_period_run'])
+    inactive = set(GLOBAL_PARAM['inactive_detectors'])
+
+    period_runs = [(period, run) for period in periods for run in loader.get_runs(period)
+                   if period_run_key(period, run) not in excluded]
+
+    shards = []
+    for (period, run), file_dict in loader.load_files_many(period_runs).items():
+        if 'pht_files' not in file_dict:
+            continue
+        timestamp, _ = parse_file_timestamp(file_dict['pht_files'][0])
+        table = metadata.select_detectors(GLOBAL_PARAM['valid_detector_types'], timestamp=timestamp)
+        for name, rawid in zip(table['name'], table['rawid']):
+            if name in inactive or (detectors is not None and name not in detectors):
+                continue
+            if (output_dir and not GLOBAL_PARAM['MERGE']['replace_files']
+                    and os.path.exists(os.path.join(output_dir, f"{name}.h5"))):
+                continue
+            shards.append({
+                'detector': name,
+                'rawid': int(rawid),
+                'period': period,
+                'run': run,
+                'pht_files': file_dict['pht_files'],
+                'raw_files': file_dict.get('raw_files', []),
+                'par_file': file_dict.get('par_file'),
+            })
+    return shards
+
+
+def append_chunk(group, chunk):
+    """Append a chunk (field name -> array) to resizable datasets of an HDF5 group."""
+    for name, values in chunk.items():
+        if name not in group:
+            group.create_dataset(name, data=values, maxshape=(None,) + values.shape[1:], chunks=True)
+        else:
+            dataset = group[name]
+            start = dataset.shape[0]
+            dataset.resize(start + len(values), axis=0)
+            dataset[start:] = values
+
+
+def _shard_chunks(shard, fields, raw_fields, chunk_size):
+    """
+    Stream the pht rows of a shard in chunks, with the raw fields attached if requested.
+    pht and raw files are paired by timestamp and read pair by pair, so the rows of
+    every file are checked to match.
+    """
+    from itertools import zip_longest
+
+    rawid = shard['rawid']
+    if not raw_fields:
+        yield from iter_chunks(shard['pht_files'], rawid, 'pht', fields, chunk_size)
+        return
+
+    pairs = pair_files(shard['pht_files'], shard['raw_files'], 'raw')
+    if len(pairs) != len(shard['pht_files']):
+        raise ValueError(f"Not every pht file of {shard['period']}{shard['run']} has a raw file")
+    for pht_path, raw_path in pairs:
+        pht_chunks = iter_chunks([pht_path], rawid, 'pht', fields, chunk_size)
+        raw_chunks = iter_chunks([raw_path], rawid, 'raw', raw_fields, chunk_size)
+        for chunk, raw_chunk in zip_longest(pht_chunks, raw_chunks):
+            if (chunk is None or raw_chunk is None
+                    or len(next(iter(chunk.values()))) != len(next(iter(raw_chunk.values())))):
+                raise ValueError(f"raw and pht rows of ch{rawid} are not aligned in {pht_path} and {raw_path}")
+            chunk.update(raw_chunk)
+            yield chunk
+
+
+def _merge_shard(shard, fields, raw_fields, part_path, max_memory):
+    """Worker: stream one detector's rows of one run into a part file."""
+    import h5py
+    import numpy as np
+
+    rawid = shard['rawid']
+    # Split the memory budget between the pht and the raw fields
+    budget = max_memory // 2 if raw_fields else max_memory
+    chunk_size = rows_for_memory(shard['pht_files'], rawid, 'pht', fields, budget)
+    if raw_fields:
+        chunk_size = min(chunk_size, rows_for_memory(shard['raw_files'], rawid, 'raw', raw_fields, budget))
+
+    n_rows = 0
+    os.makedirs(os.path.dirname(part_path), exist_ok=True)
+    tmp_path = f"{part_path}.tmp"
+    with h5py.File(tmp_path, 'w') as out:
+        for chunk in _shard_chunks(shard, fields, raw_fields, chunk_size):
+            n = len(next(iter(chunk.values())))
+            chunk['channel_id'] = np.full(n, rawid, dtype=np.int64)
+            append_chunk(out, chunk)
+            n_rows += n
+    os.replace(tmp_path, part_path)
+    return n_rows
+
+
+def _finalize_detector(parts, out_path, max_memory):
+    """Worker: concatenate the part files of a detector into its output file,
+    copying chunks of at most max_memory bytes."""
+    import h5py
+    import numpy as np
+
+    tmp_path = f"{out_path}.tmp"
+    with h5py.File(tmp_path, 'w') as out:
+        run_keys = []
+        for run_key, part_path in parts:
+            with h5py.File(part_path, 'r') as part:
+                datasets = []
+                part.visititems(lambda name, item: datasets.append((name, item)) if isinstance(item, h5py.Dataset) else None)
+                if not datasets:
+                    continue
+                n_rows = len(datasets[0][1])
+                # Row size from the dataset types, plus the run_index column
+                row_bytes = sum(dataset.dtype.itemsize * int(np.prod(dataset.shape[1:])) for _, dataset in datasets)
+                chunk_size = max(1, int(max_memory // (row_bytes + np.dtype(np.int32).itemsize)))
+                for start in range(0, n_rows, chunk_size):
+                    stop = min(start + chunk_size, n_rows)
+                    chunk = {name: dataset[start:stop] for name, dataset in datasets}
+                    chunk['run_index'] = np.full(stop - start, len(run_keys), dtype=np.int32)
+                    append_chunk(out, chunk)
+                run_keys.append(run_key)
+        out.attrs['runs'] = run_keys
+    os.replace(tmp_path, out_path)
+    for _, part_path in parts:
+        os.remove(part_path)
+    return out_path
+
+
+def _default_fields(shards):
+    """Return the default merge fields of the first channel table found in the shards' pht files."""
+    import h5py
+
+    for shard in shards:
+        name = table_path(shard['rawid'], 'pht')
+        for path in shard['pht_files']:
+            with h5py.File(path, 'r') as f:
+                if name in f:
+                    return [field for field, _ in resolve_fields(f[name])]
+    return None
+
+
+def run_merge(loader=None, metadata=None, periods=None, detectors=None, fields=None, raw_fields=None,
+              output_dir=None, max_workers=None, max_worker_memory=MAX_WORKER_MEMORY):
+    """
+    Run the MERGE stage and write one HDF5 file per detector to output_dir/merged.
+
+    Parameters:
+    loader: LegendDataLoader (default: a new one).
+    metadata: MetadataLoader (default: a new one).
+    periods (list): Periods to merge (default: MERGE.periods_to_merge).
+    detectors (list): Optional detector names to restrict the merge to.
+    fields (list): pht fields to merge (default: MERGE.desired_fields found in the pht files).
+    raw_fields (list): Optional raw tier fields (e.g. ['waveform']) merged row by row.
+    output_dir (str): Output directory (default: output_dir/merged from GLOBAL_PARAM).
+    max_workers (int): Size of the process pool.
+    max_worker_memory (int): Bytes of field data a worker may hold at once.
+
+    Returns:
+    dict: Detector name -> path of its merged file. Runs are listed in the 'runs'
+          attribute and referenced row by row through the 'run_index' dataset.
+    """
+    if loader is None:
+        from legend200_data_loader.loader import LegendDataLoader
+        loader = LegendDataLoader()
+    if metadata is None:
+        from legend200_data_loader.metadata import MetadataLoader
+        metadata = MetadataLoader()
+    output_dir = output_dir or os.path.join(GLOBAL_PARAM['DIRS']['output_dir'], MERGE_SUBDIR)
+    parts_dir = os.path.join(output_dir, 'parts')
+
+    shards = plan_merge(loader, metadata, periods, detectors, output_dir)
+    if not shards:
+        logger.warning("Nothing to merge.")
+        return {}
+
+    if fields is None:
+        # Fix the columns once so that all shards write the same fields,
+        # taken from the first file that contains a channel to merge
+        fields = _default_fields(shards)
+        if fields is None:
+            logger.warning("None of the channels to merge is in the pht files.")
+            return {}
+    logger.info(f"Merging {len(fields)} fields for {len(shards)} detector runs.")
+
+    parts = {}
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        futures = {}
+        for shard in shards:
+            run_key = period_run_key(shard['period'], shard['run'])
+            part_path = os.path.join(parts_dir, shard['detector'], f"{run_key}.h5")
+            future = pool.submit(_merge_shard, shard, fields, raw_fields, part_path, max_worker_memory)
+            futures[future] = (shard['detector'], run_key, part_path)
+
+        for future, (detector, run_key, part_path) in futures.items():
+            try:
+                n_rows = future.result()
+            except Exception as e:
+                logger.error(f"Failed to merge {detector} in {run_key}: {e}")
+                continue
+            if n_rows:
+                parts.setdefault(detector, []).append((run_key, part_path))
+            else:
+                logger.warning(f"No rows for {detector} in {run_key}.")
+                os.remove(part_path)
+
+        finalize = {
+            detector: pool.submit(_finalize_detector, sorted(detector_parts),
+                                  os.path.join(output_dir, f"{detector}.h5"), max_worker_memory)
+            for detector, detector_parts in parts.items()
+        }
+        outputs = {}
+        for detector, future in finalize.items():
+            try:
+                outputs[detector] = future.result()
+            except Exception as e:
+                logger.error(f"Failed to write merged file for {detector}: {e}")
+
+    shutil.rmtree(parts_dir, ignore_errors=True)
+    logger.info(f"Merged {len(outputs)} detectors into {output_dir}")
+    return outputs
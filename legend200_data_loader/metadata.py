@@ -1,76 +1,347 @@
 # metadata.py
 import os
-from legendmeta import LegendMetadata
+import glob
+import bisect
+import pickle
+from collections import OrderedDict
+import numpy as np
+from legend200_data_loader.config import GLOBAL_PARAM
 from legend200_data_loader.logger import setup_logger
+from legend200_data_loader.utils import to_datetime, to_unix_time, git_commit_hash, channel_rawid
+from legend200_data_loader.function import build_detector_table, select_detectors, RAWID_LIST_TYPES
+
+# Metadata directories whose validity files decide when the channel map changes
+VALIDITY_DIRS = [
+    'hardware/configuration/channelmaps',
+    'datasets/statuses',
+    'dataprod/config',
+]
+
+# legend-metadata submodule, used when no other metadata path is configured
+METADATA_SUBMODULE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'legend-metadata')
+SNAPSHOT_FILE = 'legend_metadata_snapshot.pkl'
 
 class MetadataLoader:
-    def __init__(self, ssh_auth_sock=None):
+    def __init__(self, ssh_auth_sock=None, metadata_path=None, cache_size=8, use_snapshot=False, snapshot_path=None):
         if ssh_auth_sock:
             os.environ["SSH_AUTH_SOCK"] = ssh_auth_sock
         self.logger = setup_logger()
-        
+        self._lmeta = None
+
+        self.metadata_path = metadata_path or os.environ.get('LEGEND_METADATA')
+        if not self.metadata_path and os.path.isdir(METADATA_SUBMODULE) and os.listdir(METADATA_SUBMODULE):
+            self.metadata_path = METADATA_SUBMODULE
+        self.snapshot_path = snapshot_path or os.path.join(GLOBAL_PARAM['DIRS']['output_dir'], SNAPSHOT_FILE)
+        # Pre-parsed geds channel maps, one per validity interval
+        self.snapshot = None
+        # Per-detector usability/processable state changes, built lazily
+        self.timeline = None
+
+        # Validity interval start times (unix time), built lazily
+        self.validity_starts = None
+        # Bounded LRUs of channel maps, detector tables and channel indices, keyed by validity interval
+        self.cache_size = cache_size
+        self._channelmaps = OrderedDict()
+        self._tables = OrderedDict()
+        self._channel_indices = OrderedDict()
+
+        if use_snapshot and not self.load_snapshot():
+            self.save_snapshot()
+
+    @property
+    def lmeta(self):
+        """
+        LegendMetadata instance, initialized on first use so that a valid
+        snapshot avoids parsing the metadata repository altogether.
+        """
+        if self._lmeta is None:
+            try:
+                from legendmeta import LegendMetadata
+
+                # Explicitly set the path for LegendMetadata
+                self._lmeta = LegendMetadata(self.metadata_path)
+            except Exception as e:
+                self.logger.error(f"Failed to initialize LegendMetadata: {e}")
+        return self._lmeta
+
+    def metadata_commit(self):
+        """Return the commit hash of the metadata checkout (None if unknown)."""
+        path = self.metadata_path or str(self.lmeta.__path__)
+        return git_commit_hash(path)
+
+    def load_snapshot(self):
+        """
+        Load the channel map snapshot from snapshot_path. The snapshot is only
+        used if it was written for the currently checked out metadata commit.
+        Returns True if the snapshot was loaded.
+        """
+        if not os.path.isfile(self.snapshot_path):
+            return False
+        commit = self.metadata_commit()
         try:
-            # Explicitly set the path for LegendMetadata
-            self.lmeta = LegendMetadata()
+            with open(self.snapshot_path, 'rb') as snapshot_file:
+                snapshot = pickle.load(snapshot_file)
         except Exception as e:
-            self.logger.error(f"Failed to initialize LegendMetadata: {e}")
+            self.logger.error(f"Failed to load metadata snapshot: {self.snapshot_path}. Error: {e}")
+            return False
+
+        if commit is None or snapshot.get('commit') != commit:
+            self.logger.warning(f"Metadata snapshot {self.snapshot_path} is outdated, ignoring it.")
+            return False
+
+        self.snapshot = snapshot
+        self.validity_starts = snapshot['validity_starts']
+        self.timeline = None
+        self._channelmaps.clear()
+        self._tables.clear()
+        self._channel_indices.clear()
+        return True
 
-    def get_channel_id(self, detector_name):
+    def save_snapshot(self):
         """
-        Retrieve the channel ID for a given detector.
+        Parse the geds channel map of every validity interval and write them,
+        together with the validity index and the metadata commit, to snapshot_path.
+        Returns True if the snapshot was written.
         """
+        commit = self.metadata_commit()
+        if commit is None:
+            self.logger.error("Cannot write a metadata snapshot without a metadata commit hash.")
+            return False
+
+        self.snapshot = None
+        starts = self.build_validity_index()
+        self.logger.info(f"Building metadata snapshot for {len(starts)} validity intervals.")
+        channelmaps = []
+        for start in starts:
+            chmap = self.lmeta.channelmap(to_datetime(start))
+            channelmaps.append({
+                key: _to_dict(item) for key, item in chmap.items() if item.get('system') == 'geds'
+            })
+
+        snapshot = {'commit': commit, 'validity_starts': starts, 'channelmaps': channelmaps}
         try:
-            channel_id = self.lmeta.channelmap()[detector_name]['daq']['rawid']
-            self.logger.info(f"Channel ID for {detector_name}: {channel_id}")
-            return channel_id
-        except KeyError:
-            self.logger.error(f"Detector {detector_name} not found in metadata.")
-            return None
+            os.makedirs(os.path.dirname(os.path.abspath(self.snapshot_path)), exist_ok=True)
+            # Write to a temporary file first so concurrent jobs never read a partial snapshot
+            tmp_path = f"{self.snapshot_path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'wb') as snapshot_file:
+                pickle.dump(snapshot, snapshot_file, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self.snapshot_path)
+        except Exception as e:
+            self.logger.error(f"Failed to write metadata snapshot: {self.snapshot_path}. Error: {e}")
+            return False
+
+        self.snapshot = snapshot
+        self.logger.info(f"Metadata snapshot written to {self.snapshot_path}")
+        return True
 
-    def filter_metadata(self, detector_type):
+    def build_validity_index(self):
         """
-        Load Legend Metadata and select only valid_detector_types.
-        Also creates a list with all expected rawids of all detector types.
+        Collect the sorted start times of all validity intervals, i.e. every
+        valid_from entry of the validity files the channel map is built from.
         """
-        detectors = {}
-        icpc_detectors = []
-        ppc_detectors = []
-        bege_detectors = []
-
         try:
-            # Loop over legend metadata dictionary
-            for key, item in self.lmeta.channelmap().items():
-                # Skip non-geds detector systems
-                if not item['system'] == 'geds':
+            from dbetto.catalog import Catalog
+        except ImportError:  # older legendmeta versions ship their own catalog
+            from legendmeta.catalog import Catalog
+
+        starts = set()
+        for subdir in VALIDITY_DIRS:
+            for validity_file in glob.glob(os.path.join(self.lmeta.__path__, subdir, 'validity.*')):
+                catalog = Catalog.read_from(validity_file)
+                for entries in catalog.entries.values():
+                    starts.update(entry.valid_from for entry in entries)
+
+        self.validity_starts = sorted(starts)
+        return self.validity_starts
+
+    def validity_interval(self, timestamp=None):
+        """
+        Return the index of the validity interval containing timestamp
+        (-1 if it lies before the first interval).
+        """
+        if self.validity_starts is None:
+            self.build_validity_index()
+        return bisect.bisect_right(self.validity_starts, to_datetime(timestamp).timestamp()) - 1
+
+    def _cached(self, cache, key, build):
+        """Return cache[key], building it on a miss and evicting the least recently used entry."""
+        if key in cache:
+            cache.move_to_end(key)
+            return cache[key]
+
+        value = build()
+        cache[key] = value
+        if len(cache) > self.cache_size:
+            cache.popitem(last=False)
+        return value
+
+    def channelmap(self, timestamp=None):
+        """
+        Return the channel map valid at timestamp. Channel maps are cached per
+        validity interval, so all timestamps of an interval share one object.
+        With a loaded snapshot only the geds channels are available.
+        """
+        key = self.validity_interval(timestamp)
+        if self.snapshot is not None and key >= 0:
+            return self.snapshot['channelmaps'][key]
+        return self._cached(self._channelmaps, key, lambda: self.lmeta.channelmap(to_datetime(timestamp)))
+
+    def detector_table(self, timestamp=None):
+        """
+        Return the columnar geds detector table (see function.build_detector_table)
+        valid at timestamp, built once per validity interval.
+        """
+        key = self.validity_interval(timestamp)
+        return self._cached(self._tables, key, lambda: build_detector_table(self.channelmap(timestamp)))
+
+    def select_detectors(self, detector_type=None, usability=None, processable=None, timestamp=None):
+        """
+        Select rows of the detector table by type, usability and processable flag.
+        """
+        return select_detectors(self.detector_table(timestamp), detector_type, usability, processable)
+
+    def build_usability_timeline(self):
+        """
+        Precompute the usability and processable state of every geds detector
+        as state-change arrays over all validity intervals.
+
+        Returns:
+        dict: detector name -> {'times': unix start time of each state,
+              'usability': usability array, 'processable': processable array}
+        """
+        starts = self.build_validity_index() if self.validity_starts is None else self.validity_starts
+        states = {}
+        for i, start in enumerate(starts):
+            table = self.detector_table(start)
+            present = set(table['name'])
+            for name, usability, processable in zip(table['name'], table['usability'], table['processable']):
+                states.setdefault(name, {})[i] = (usability, bool(processable))
+            # Detectors missing from this interval are unknown until they reappear
+            for name in states.keys() - present:
+                states[name][i] = ('unknown', False)
+
+        timeline = {}
+        for name, by_interval in states.items():
+            times, usabilities, processables = [], [], []
+            for i in sorted(by_interval):
+                state = by_interval[i]
+                if usabilities and (usabilities[-1], processables[-1]) == state:
                     continue
+                times.append(starts[i])
+                usabilities.append(state[0])
+                processables.append(state[1])
+            timeline[name] = {
+                'times': np.array(times, dtype=np.float64),
+                'usability': np.array(usabilities, dtype=str),
+                'processable': np.array(processables, dtype=bool),
+            }
+
+        self.timeline = timeline
+        return timeline
+
+    def detector_status(self, detector_name, timestamp=None, field='usability'):
+        """
+        Return the usability ('on', 'ac', 'off') or processable flag of a detector
+        at timestamp ('unknown'/False before its first state or if it is unknown).
+        """
+        if self.timeline is None:
+            self.build_usability_timeline()
+        states = self.timeline.get(detector_name)
+        if states is not None:
+            i = bisect.bisect_right(states['times'], to_unix_time(timestamp)) - 1
+            if i >= 0:
+                return states[field][i].item()
+        return 'unknown' if field == 'usability' else False
+
+    def detector_status_array(self, detector_name, timestamps, field='usability'):
+        """
+        Vectorized detector_status: return the state of a detector for an array
+        of unix timestamps (e.g. the event timestamps of a file).
+        """
+        if self.timeline is None:
+            self.build_usability_timeline()
+        timestamps = np.asarray(timestamps, dtype=np.float64)
+        default = 'unknown' if field == 'usability' else False
+        states = self.timeline.get(detector_name)
+        if states is None:
+            return np.full(timestamps.shape, default)
+
+        index = np.searchsorted(states['times'], timestamps, side='right') - 1
+        values = np.append(states[field], default)
+        # Index -1 (before the first state) selects the appended default
+        return values[index]
 
-                detector_dict = {
-                    'rawid': item['daq']['rawid'],
-                    'type': item['type'],
-                    'manufacturer': item['production']['manufacturer'],
-                    'processable': item['analysis']['processable'],
-                    'lq': item['analysis']['psd']['status']['lq']
-                }
-                detectors[key] = detector_dict
-
-                # Create lists with rawids based on detector type
-                if item['type'] == 'icpc':
-                    icpc_detectors.append(item['daq']['rawid'])
-                elif item['type'] == 'ppc':
-                    ppc_detectors.append(item['daq']['rawid'])
-                elif item['type'] == 'bege':
-                    bege_detectors.append(item['daq']['rawid'])
-
-            # Fill lists into dictionary
-            detectors['rawid_lists'] = {
-                'ICPC': icpc_detectors,
-                'PPC': ppc_detectors,
-                'BEGe': bege_detectors
+    def channel_index(self, timestamp=None):
+        """
+        Return the bidirectional channel index valid at timestamp, built once
+        per validity interval: {'name_to_rawid': {...}, 'rawid_to_name': {...}}.
+        """
+        def build():
+            name_to_rawid = {
+                name: item['daq']['rawid'] for name, item in self.channelmap(timestamp).items()
+                if 'rawid' in item.get('daq', {})
             }
+            rawid_to_name = {rawid: name for name, rawid in name_to_rawid.items()}
+            return {'name_to_rawid': name_to_rawid, 'rawid_to_name': rawid_to_name}
 
-            # Return the filtered metadata for the requested detector type
-            return detectors['rawid_lists'].get(detector_type.upper(), [])
+        key = self.validity_interval(timestamp)
+        return self._cached(self._channel_indices, key, build)
+
+    def get_channel_id(self, detector_name, timestamp=None):
+        """
+        Retrieve the channel ID for a given detector.
+        """
+        channel_id = self.channel_index(timestamp)['name_to_rawid'].get(detector_name)
+        if channel_id is None:
+            self.logger.error(f"Detector {detector_name} not found in metadata.")
+            return None
+        self.logger.debug(f"Channel ID for {detector_name}: {channel_id}")
+        return channel_id
+
+    def get_detector_name(self, channel_id, timestamp=None):
+        """
+        Retrieve the detector name for a rawid (or an LH5 group name like 'ch1104000').
+        """
+        name = self.channel_index(timestamp)['rawid_to_name'].get(channel_rawid(channel_id))
+        if name is None:
+            self.logger.error(f"Channel {channel_id} not found in metadata.")
+        return name
+
+    def get_channel_ids(self, detector_names, timestamp=None):
+        """
+        Map a list or array of detector names to rawids in one call.
+        Unknown detectors are returned as -1.
+        """
+        name_to_rawid = self.channel_index(timestamp)['name_to_rawid']
+        return np.array([name_to_rawid.get(name, -1) for name in detector_names], dtype=np.int64)
+
+    def get_detector_names(self, channel_ids, timestamp=None):
+        """
+        Map a list or array of rawids (or 'ch<rawid>' group names) to detector
+        names in one call. Unknown channels are returned as None.
+        """
+        rawid_to_name = self.channel_index(timestamp)['rawid_to_name']
+        return np.array([rawid_to_name.get(channel_rawid(channel_id)) for channel_id in channel_ids], dtype=object)
+
+    def filter_metadata(self, detector_type, timestamp=None):
+        """
+        Load Legend Metadata and select only valid_detector_types.
+        Returns the list with all expected rawids of the requested detector type.
+        """
+        try:
+            if detector_type.lower() not in RAWID_LIST_TYPES:
+                return []
+            return self.select_detectors(detector_type, timestamp=timestamp)['rawid'].tolist()
 
         except Exception as e:
             self.logger.error(f"Failed to filter metadata for detector type {detector_type}: {e}")
             return None
+
+
+def _to_dict(item):
+    """Recursively convert an AttrsDict (or any mapping) into plain dicts for pickling."""
+    if isinstance(item, dict):
+        return {key: _to_dict(value) for key, value in item.items()}
+    if isinstance(item, list):
+        return [_to_dict(value) for value in item]
+    return item
@@ -0,0 +1,77 @@
+# par.py
+
+# Process-wide cache of parsed PAR (calibration parameter) JSON files.
+
+import os
+import json
+import threading
+from collections import OrderedDict
+from legend200_data_loader.logger import setup_logger
+from legend200_data_loader.utils import channel_key
+
+# Upper bound on the summed size of the cached PAR files
+MAX_CACHE_BYTES = 512 * 1024**2
+
+
+class ParCache:
+    """
+    LRU cache of parsed PAR files keyed by (path, mtime). A file is parsed once and
+    its per-channel entries are shared by all callers, so they must be treated as
+    read-only. A file that changes on disk is re-read on the next access.
+    """
+    def __init__(self, max_bytes=MAX_CACHE_BYTES):
+        self.logger = setup_logger()
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # path -> (mtime, size, parsed content)
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def get(self, path):
+        """Return the parsed content of a PAR file, reading it only if it is not cached or changed."""
+        stat = os.stat(path)
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and entry[0] == stat.st_mtime:
+                self._entries.move_to_end(path)
+                return entry[2]
+
+        with open(path, 'r') as par_file:
+            content = json.load(par_file)
+
+        with self._lock:
+            old = self._entries.pop(path, None)
+            if old is not None:
+                self._bytes -= old[1]
+            self._entries[path] = (stat.st_mtime, stat.st_size, content)
+            self._bytes += stat.st_size
+            # Evict least recently used files, but always keep the one just read
+            while self._bytes > self.max_bytes and len(self._entries) > 1:
+                _, (_, size, _) = self._entries.popitem(last=False)
+                self._bytes -= size
+        return content
+
+    def get_channel(self, path, channel, key=None):
+        """
+        Return the entry of one channel of a PAR file (None if it is missing).
+
+        Parameters:
+        path (str): Path to the PAR file.
+        channel (int or str): Channel rawid or 'ch<rawid>' key.
+        key (str): Optional sub-entry to return, e.g. 'pars' for the operations.
+        """
+        entry = self.get(path).get(channel_key(channel))
+        if entry is not None and key is not None:
+            return entry.get(key)
+        return entry
+
+
+# Shared by all loaders of the process
+PAR_CACHE = ParCache()
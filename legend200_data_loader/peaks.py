@@ -0,0 +1,215 @@
+# peaks.py
+
+# Peak selection for the PSD studies. Each channel's energy resolution is taken
+# from its PAR calibration results, and the hits within ±cut_value_sigmas sigma
+# of every configured calibration peak (GLOBAL_PARAM['peaks']) are indexed once per run.
+# The index is written to output_dir/peaks as sorted (file_index, row_in_file)
+# arrays, so later studies read only the peak subsets of the pht files.
+
+import os
+import json
+from legend200_data_loader.config import GLOBAL_PARAM
+from legend200_data_loader.logger import setup_logger
+from legend200_data_loader.utils import channel_key
+from legend200_data_loader.reader import iter_chunks, table_path
+
+logger = setup_logger()
+
+PEAK_SUBDIR = 'peaks'
+
+DEFAULT_ENERGY_FIELD = 'cuspEmax_ctc_cal'
+
+# FWHM = FWHM_TO_SIGMA * sigma for a Gaussian peak
+FWHM_TO_SIGMA = 2.3548
+
+
+def peak_fwhm(par_entry, energy, energy_field=DEFAULT_ENERGY_FIELD):
+    """
+    Return the FWHM (keV) of a channel at a given energy from its PAR entry.
+
+    The fitted width of the peak itself (results.ecal.<field>.pk_fits) is used when
+    present, otherwise the resolution curve FWHM = sqrt(a + b * E) (eres_linear).
+
+    Returns:
+    float: FWHM in keV, or None if the PAR entry has no resolution for the field.
+    """
+    ecal = (par_entry or {}).get('results', {}).get('ecal', {}).get(energy_field, {})
+
+    for peak, fit in ecal.get('pk_fits', {}).items():
+        try:
+            if abs(float(peak) - energy) < 0.5 and 'fwhm_in_kev' in fit:
+                fwhm = fit['fwhm_in_kev']
+                return float(fwhm[0] if isinstance(fwhm, (list, tuple)) else fwhm)
+        except (TypeError, ValueError):
+            continue
+
+    parameters = ecal.get('eres_linear', {}).get('parameters')
+    if parameters and 'a' in parameters and 'b' in parameters:
+        return (parameters['a'] + parameters['b'] * energy) ** 0.5
+    return None
+
+
+def peak_windows(par_entry, peaks=None, n_sigmas=None, energy_field=DEFAULT_ENERGY_FIELD):
+    """
+    Compute the ±n_sigmas windows around the calibration peaks for one channel.
+
+    Parameters:
+    par_entry (dict): The channel's PAR entry (LegendDataLoader.load_par_channel(..., key=None)).
+    peaks (dict): Peak name -> energy in keV (default: GLOBAL_PARAM['peaks']).
+    n_sigmas (float): Half window width in sigma (default: GLOBAL_PARAM['cut_value_sigmas']).
+
+    Returns:
+    dict: Peak name -> (low, high, sigma). Peaks without a resolution are left out.
+    """
+    peaks = peaks or GLOBAL_PARAM['peaks']
+    n_sigmas = n_sigmas or GLOBAL_PARAM['cut_value_sigmas']
+    windows = {}
+    for name, energy in peaks.items():
+        fwhm = peak_fwhm(par_entry, energy, energy_field)
+        if fwhm is None:
+            continue
+        sigma = fwhm / FWHM_TO_SIGMA
+        windows[name] = (energy - n_sigmas * sigma, energy + n_sigmas * sigma, sigma)
+    return windows
+
+
+def peak_index_path(period, run, output_dir=None):
+    output_dir = output_dir or os.path.join(GLOBAL_PARAM['DIRS']['output_dir'], PEAK_SUBDIR)
+    return os.path.join(output_dir, f"{period.strip('/')}_{run.strip('/')}.h5")
+
+
+def _source_state(files):
+    return [os.path.abspath(path) for path in files], [os.stat(path).st_mtime for path in files]
+
+
+def _selection_attrs(par_file, peaks, n_sigmas, energy_field):
+    """Return the attrs that, besides the pht files, determine the content of an index."""
+    return {
+        'par_file': os.path.abspath(par_file),
+        'par_mtime': os.stat(par_file).st_mtime,
+        'peaks': json.dumps(peaks, sort_keys=True),
+        'n_sigmas': float(n_sigmas),
+        'energy_field': energy_field,
+    }
+
+
+def build_peak_index(loader, period, run, channels, peaks=None, n_sigmas=None,
+                     energy_field=DEFAULT_ENERGY_FIELD, output_dir=None, rebuild=False, file_dict=None):
+    """
+    Index the hits inside the peak windows of every channel of a run.
+
+    Parameters:
+    loader: LegendDataLoader used to find the pht and PAR files and to read the PAR entries.
+    period (str), run (str): The run to index.
+    channels (list): Channel rawids.
+    peaks, n_sigmas: See peak_windows.
+    energy_field (str): Calibrated energy used for the selection.
+    output_dir (str): Index directory (default: output_dir/peaks).
+    rebuild (bool): Rebuild even if the index matches the current pht and PAR files
+        and selection settings.
+    file_dict (dict): The run's files if already listed (needs 'pht_files' and 'par_file');
+        the loader then does not list them again.
+
+    Returns:
+    str: Path of the run's index file, or None if the run cannot be indexed.
+    """
+    import h5py
+    import numpy as np
+
+    if not GLOBAL_PARAM['auto_peak_selection']:
+        logger.error("Manual peak selection is not implemented; set auto_peak_selection to True.")
+        return None
+
+    file_dict = file_dict if file_dict is not None else loader.load_files(period, run)
+    pht_files = file_dict.get('pht_files', [])
+    if not pht_files or 'par_file' not in file_dict:
+        logger.error(f"No pht or PAR files for {period}{run}.")
+        return None
+
+    peaks = peaks or GLOBAL_PARAM['peaks']
+    n_sigmas = n_sigmas or GLOBAL_PARAM['cut_value_sigmas']
+    path = peak_index_path(period, run, output_dir)
+    sources, mtimes = _source_state(pht_files)
+    selection = _selection_attrs(file_dict['par_file'], peaks, n_sigmas, energy_field)
+    if not rebuild and os.path.exists(path):
+        with h5py.File(path, 'r') as f:
+            if (list(f.attrs['source_files']) == sources and list(f.attrs['source_mtimes']) == mtimes
+                    and all(f.attrs.get(key) == value for key, value in selection.items())
+                    and all(channel_key(channel) in f for channel in channels)):
+                return path
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with h5py.File(tmp_path, 'w') as out:
+        out.attrs['source_files'] = sources
+        out.attrs['source_mtimes'] = mtimes
+        out.attrs.update(selection)
+        for channel in channels:
+            # Channels without a resolution get an empty group, so the index stays reusable
+            group = out.create_group(channel_key(channel))
+            windows = peak_windows(loader.load_par_channel(file_dict['par_file'], channel, key=None),
+                                   peaks, n_sigmas, energy_field)
+            if not windows:
+                logger.warning(f"No energy resolution for {channel_key(channel)} in {file_dict['par_file']}")
+                continue
+
+            selected = {name: [] for name in windows}
+            for chunk in iter_chunks(pht_files, channel, 'pht', [energy_field], with_index=True):
+                energies = chunk[energy_field]
+                for name, (low, high, _) in windows.items():
+                    inside = (energies >= low) & (energies <= high)
+                    selected[name].append((chunk['file_index'][inside], chunk['row_in_file'][inside]))
+
+            for name, (low, high, sigma) in windows.items():
+                parts = selected[name]
+                file_index = np.concatenate([part[0] for part in parts]) if parts else np.zeros(0, dtype=np.int64)
+                row_in_file = np.concatenate([part[1] for part in parts]) if parts else np.zeros(0, dtype=np.int64)
+                # Chunks arrive in file order, so the rows are already sorted
+                peak_group = group.create_group(name)
+                peak_group.create_dataset('file_index', data=file_index.astype(np.int32))
+                peak_group.create_dataset('row_in_file', data=row_in_file)
+                peak_group.attrs.update({'energy': (low + high) / 2, 'low': low, 'high': high, 'sigma': sigma})
+    os.replace(tmp_path, path)
+    logger.info(f"Indexed peaks of {len(channels)} channels for {period}{run} in {path}")
+    return path
+
+
+def load_peak_rows(index_path, channel, peak):
+    """
+    Return the (file_index, row_in_file) arrays of a channel's hits in a peak window,
+    or None if the channel or peak is not indexed.
+    """
+    import h5py
+
+    with h5py.File(index_path, 'r') as f:
+        name = f"{channel_key(channel)}/{peak}"
+        if name not in f:
+            return None
+        return f[name]['file_index'][:], f[name]['row_in_file'][:]
+
+
+def read_peak_events(index_path, channel, peak, fields):
+    """
+    Read the given pht fields of only the hits of a channel inside a peak window.
+
+    Returns:
+    dict: field name -> NumPy array (in pht file order), or None if not indexed.
+    """
+    import h5py
+    import numpy as np
+
+    with h5py.File(index_path, 'r') as f:
+        sources = list(f.attrs['source_files'])
+    rows = load_peak_rows(index_path, channel, peak)
+    if rows is None:
+        return None
+    file_index, row_in_file = rows
+
+    parts = {field: [] for field in fields}
+    for index in np.unique(file_index):
+        selected = row_in_file[file_index == index]
+        with h5py.File(sources[index], 'r') as f:
+            table = f[table_path(channel, 'pht')]
+            for field in fields:
+                parts[field].append(table[field][selected])
+    return {field: np.concatenate(values) if values else np.zeros(0) for field, values in parts.items()}
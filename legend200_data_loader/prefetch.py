@@ -0,0 +1,158 @@
+# prefetch.py
+
+# Run iterator that reads ahead: the files of all runs are listed up front in the
+# calling thread, and while the caller processes run N a background thread either
+# reads the requested channel tables of the following runs into a bounded buffer
+# or, without channels, pages their files into the OS cache. The memory of a run is
+# reserved from the dataset shapes before it is read. The time the caller spends
+# waiting for a run is reported as stall time.
+
+import time
+import queue
+import threading
+from legend200_data_loader.logger import setup_logger
+from legend200_data_loader.catalog import TIERS
+from legend200_data_loader.reader import read_table, table_nbytes
+
+# Runs read ahead of the one being processed
+DEFAULT_DEPTH = 1
+
+# Upper bound on the bytes of prefetched table data held in memory
+MAX_PREFETCH_BYTES = 2 * 1024**3
+
+# Block size used to page files into the OS cache
+WARM_BLOCK_SIZE = 8 * 1024**2
+
+_DONE = object()
+
+
+def warm_file(path, block_size=WARM_BLOCK_SIZE):
+    """Read a file block by block and discard the data, so that it is in the OS page cache."""
+    buffer = bytearray(block_size)
+    n_bytes = 0
+    with open(path, 'rb', buffering=0) as f:
+        while True:
+            n = f.readinto(buffer)
+            if not n:
+                return n_bytes
+            n_bytes += n
+
+
+class RunPrefetcher:
+    """
+    Iterate over (period, run) pairs, yielding (period, run, file_dict, tables) while
+    the next runs are read in a background thread.
+
+    tables maps (channel, file_index) to the columns read with reader.read_table, or
+    is None when no channels are requested (the files are then only paged in).
+    """
+    def __init__(self, loader, period_runs, channels=None, fields=None, tier='pht', depth=DEFAULT_DEPTH,
+                 max_bytes=MAX_PREFETCH_BYTES):
+        """
+        Parameters:
+        loader: LegendDataLoader used to list the files of each run.
+        period_runs (list): (period, run) pairs in processing order.
+        channels (list): Channel rawids whose tables are read ahead (default: none).
+        fields (list): Fields of the tables to read (see reader.resolve_fields).
+        tier (str): Tier to read or page in ('raw', 'pht', 'psp' or 'tcm').
+        depth (int): Number of runs read ahead of the one being processed.
+        max_bytes (int): Memory bound of the prefetched tables. A single run larger
+            than the bound is still read, but only when nothing else is buffered.
+        """
+        self.logger = setup_logger()
+        self.loader = loader
+        self.period_runs = list(period_runs)
+        self.channels = channels
+        self.fields = fields
+        self.tier = tier
+        self.depth = max(1, depth)
+        self.max_bytes = max_bytes
+
+        self.stall_time = 0.0  # Seconds the caller waited for a run
+        self.stalls = []  # Per-run wait times
+
+        self._queue = queue.Queue()
+        # One slot per run read ahead; a slot is freed when the caller takes the run
+        self._slots = threading.Semaphore(self.depth)
+        self._stop = threading.Event()
+        self._buffered = 0
+        self._condition = threading.Condition()
+        # (period, run) -> file_dict, listed in the calling thread: a catalog-backed
+        # loader's SQLite connection cannot be used from the background thread
+        self._file_dicts = {}
+
+    def _run_nbytes(self, files):
+        """Bytes of the tables of a run, estimated from the dataset shapes without reading them."""
+        if self.channels is None:
+            return 0
+        return sum(table_nbytes(path, channel, self.tier, self.fields) for path in files for channel in self.channels)
+
+    def _read_run(self, files):
+        if self.channels is None:
+            for path in files:
+                if self._stop.is_set():
+                    break
+                warm_file(path)
+            return None
+
+        tables = {}
+        for file_index, path in enumerate(files):
+            for channel in self.channels:
+                if self._stop.is_set():
+                    return tables
+                columns = read_table(path, channel, self.tier, self.fields)
+                if columns is not None:
+                    tables[(channel, file_index)] = columns
+        return tables
+
+    def _worker(self):
+        try:
+            for period, run in self.period_runs:
+                while not self._slots.acquire(timeout=0.1):
+                    if self._stop.is_set():
+                        return
+                if self._stop.is_set():
+                    return
+                file_dict = self._file_dicts.get((period, run), {})
+                files = file_dict.get(TIERS[self.tier][2], [])
+                n_bytes = self._run_nbytes(files)
+                with self._condition:
+                    # Reserve the memory before reading, waiting unless the buffer is empty
+                    self._condition.wait_for(lambda: self._stop.is_set() or self._buffered == 0
+                                             or self._buffered + n_bytes <= self.max_bytes)
+                    if self._stop.is_set():
+                        return
+                    self._buffered += n_bytes
+                self._queue.put((period, run, file_dict, self._read_run(files), n_bytes))
+        except Exception as e:
+            self._queue.put(e)
+        finally:
+            self._queue.put(_DONE)
+
+    def __iter__(self):
+        self._file_dicts = self.loader.load_files_many(self.period_runs)
+        thread = threading.Thread(target=self._worker, name='run-prefetch', daemon=True)
+        thread.start()
+        try:
+            while True:
+                start = time.perf_counter()
+                item = self._queue.get()
+                stall = time.perf_counter() - start
+                if item is _DONE:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                period, run, file_dict, tables, n_bytes = item
+                self._slots.release()
+                self.stalls.append(stall)
+                self.stall_time += stall
+                yield period, run, file_dict, tables
+                with self._condition:
+                    self._buffered -= n_bytes
+                    self._condition.notify_all()
+        finally:
+            self._stop.set()
+            with self._condition:
+                self._condition.notify_all()
+            thread.join()
+            self.logger.info(f"Prefetched {len(self.stalls)} runs, stalled {self.stall_time:.2f} s waiting for data.")
@@ -1,14 +1,231 @@
-import matplotlib.pyplot as plt
-import matplotlib.patches as patches
+# matplotlib is imported inside the plotting functions, so that importing this
+# module stays cheap for workers that never plot.
 
 import os
-import re
-from lgdo import lh5
 
-import matplotlib.pyplot as plt
-import matplotlib.patches as patches
+# Define color mapping for different detector types
+TYPE_COLORS = {
+    'icpc': 'blue',
+    'ppc': 'green',
+    'bege': 'red',
+    'coax': 'purple'
+}
 
-def plot_detector_positions(usable_detectors, legend_metadata, period=None, run=None, ac_detectors=None, off_detectors=None, save_path=None):
+# Define usability color overrides ('on' detectors use their type color)
+USABILITY_COLORS = {
+    'ac': 'lightgrey',  # Mark 'ac' detectors with light grey
+    'off': 'none'  # Mark 'off' detectors with no fill
+}
+
+FILL_ALPHA = 0.5
+
+
+def detector_geometry(legend_metadata, detectors=None, timestamp=None):
+    """
+    Build the geometry table of the detectors with a single channel map lookup.
+
+    Parameters:
+    - legend_metadata: A MetadataLoader (cached table per validity interval) or a LegendMetadata instance.
+    - detectors: Detector IDs to keep, in this order (default: all geds).
+    - timestamp: Time of the channel map (default: now).
+
+    Returns:
+    - DataFrame: One row per detector with the columns name, string, position, width, height and type.
+    """
+    from legend200_data_loader.function import build_detector_table
+    from legend200_data_loader.metadata import MetadataLoader
+    from legend200_data_loader.utils import to_datetime
+
+    if isinstance(legend_metadata, MetadataLoader):
+        table = legend_metadata.detector_table(timestamp)
+    else:
+        table = build_detector_table(legend_metadata.channelmap(to_datetime(timestamp)))
+
+    table = table.set_index('name', drop=False)
+    if detectors is not None:
+        detectors = list(dict.fromkeys(detectors))
+        missing = [detector_id for detector_id in detectors if detector_id not in table.index]
+        for detector_id in missing:
+            print(f"Metadata for detector {detector_id} not found.")
+        table = table.loc[[detector_id for detector_id in detectors if detector_id not in set(missing)]]
+
+    return table.assign(width=2 * table['radius'], type=table['type'].str.lower())[
+        ['name', 'string', 'position', 'width', 'height', 'type']].reset_index(drop=True)
+
+
+def detector_colors(geometry, usable_detectors=(), ac_detectors=(), off_detectors=()):
+    """
+    Compute the face and edge colors of every detector of a geometry table from its status.
+    Detectors in none of the lists are fully transparent.
+
+    Returns:
+    - tuple: (facecolors, edgecolors) as RGBA arrays with one row per detector.
+    """
+    import numpy as np
+    from matplotlib.colors import to_rgba_array
+
+    usable, ac, off = set(usable_detectors), set(ac_detectors), set(off_detectors)
+    names = geometry['name'].tolist()
+    is_on = np.array([name in usable for name in names], dtype=bool)
+    is_ac = np.array([name in ac for name in names], dtype=bool) & ~is_on
+    is_off = np.array([name in off for name in names], dtype=bool) & ~is_on & ~is_ac
+
+    facecolors = np.zeros((len(names), 4))
+    if is_on.any():
+        types = geometry['type'].to_numpy()[is_on]
+        facecolors[is_on] = to_rgba_array([TYPE_COLORS.get(detector_type, 'gray') for detector_type in types],
+                                          alpha=FILL_ALPHA)
+    facecolors[is_ac] = to_rgba_array(USABILITY_COLORS['ac'], alpha=FILL_ALPHA)
+    # 'off' detectors keep a transparent face and only show their edge
+
+    edgecolors = np.zeros((len(names), 4))
+    edgecolors[is_on | is_ac | is_off] = to_rgba_array('black')
+    return facecolors, edgecolors
+
+
+def draw_detector_map(ax, geometry, usable_detectors=(), ac_detectors=(), off_detectors=(), labels=True):
+    """
+    Draw the detectors of a geometry table as one PatchCollection on an axis.
+
+    Returns:
+    - tuple: (collection, texts) for in-place updates of colors and label visibility.
+    """
+    import numpy as np
+    import matplotlib.patches as patches
+    from matplotlib.collections import PatchCollection
+
+    # Determine scaling factors to fit within the plot (0-12 for x-axis, 15-0 for y-axis)
+    max_width = geometry['width'].max() if len(geometry) else 0
+    max_height = geometry['height'].max() if len(geometry) else 0
+    x_scale_factor = 0.8 / max_width if max_width > 0 else 1
+    y_scale_factor = 0.8 / max_height if max_height > 0 else 1
+    # Use the smaller scale factor to keep proportions and avoid overlap
+    scale_factor = min(x_scale_factor, y_scale_factor)
+
+    strings = geometry['string'].to_numpy(dtype=float)
+    positions = geometry['position'].to_numpy(dtype=float)
+    widths = geometry['width'].to_numpy(dtype=float) * scale_factor
+    heights = geometry['height'].to_numpy(dtype=float) * scale_factor
+
+    # Rectangles aligned at the bottom of their position
+    rectangles = [patches.Rectangle((x, y), w, h)
+                  for x, y, w, h in zip(strings - widths / 2, positions, widths, heights)]
+    facecolors, edgecolors = detector_colors(geometry, usable_detectors, ac_detectors, off_detectors)
+    collection = PatchCollection(rectangles, match_original=False)
+    collection.set_facecolor(facecolors)
+    collection.set_edgecolor(edgecolors)
+    ax.add_collection(collection)
+
+    texts = []
+    if labels:
+        # Annotate with detector ID just below the rectangle's bottom edge
+        visible = np.asarray(edgecolors[:, 3] > 0)
+        for x, y, name, show in zip(strings, positions, geometry['name'], visible):
+            texts.append(ax.text(x, y - 0.1, name, fontsize=10, ha='center', va='top', color='black', visible=show))
+    return collection, texts
+
+
+def map_title(period=None, run=None):
+    title = 'Detector Positions'
+    if period or run:
+        title += f" (Period: {period or 'N/A'}, Run: {run or 'N/A'})"
+    return title
+
+
+def decorate_detector_map(ax, period=None, run=None, show_ac=True, show_off=True):
+    """Set the title, axis ranges, ticks and legend of a detector map."""
+    import matplotlib.patches as patches
+
+    # Plot settings
+    ax.set_title(map_title(period, run), fontsize=16)
+    ax.set_xlabel('String', fontsize=14)
+    ax.set_ylabel('Position', fontsize=14)
+    ax.set_xlim(0, 12)  # Set X-axis from 0 to 12
+    ax.set_ylim(15, 0)  # Set Y-axis from 15 to 0 (inverted)
+    ax.grid(True)
+
+    # Set axis ticks to show values at each step
+    ax.set_xticks(range(0, 13, 1))  # X-axis ticks from 0 to 12 in steps of 1
+    ax.set_yticks(range(0, 16, 1))  # Y-axis ticks from 0 to 15 in steps of 1
+
+    # Add legend
+    legend_handles = []
+    for dtype, color in TYPE_COLORS.items():
+        legend_handles.append(patches.Patch(color=color, label=dtype.upper(), alpha=FILL_ALPHA))
+
+    # Add 'AC' and 'OFF' to legend only if there are corresponding detectors
+    if show_ac:
+        legend_handles.append(patches.Patch(color=USABILITY_COLORS['ac'], label='AC', alpha=FILL_ALPHA))
+    if show_off:
+        legend_handles.append(patches.Patch(color='black', label='OFF', alpha=1, fill=False))  # Edge-only for 'off'
+
+    ax.legend(handles=legend_handles, title='Detector Types and Usability')
+
+
+class DetectorMapWidget:
+    """
+    Persistent detector map for interactive use. The figure, its PatchCollection and
+    the labels are created once per metadata validity interval; changing the run
+    within an interval or the on/ac/off visibility only updates colors in place.
+    """
+    def __init__(self, metadata_loader, figsize=(14, 12)):
+        """
+        Parameters:
+        - metadata_loader: MetadataLoader providing the detector table and validity intervals.
+        - figsize: Size of the figure.
+        """
+        self.metadata = metadata_loader
+        self.figsize = figsize
+        self.fig = None
+        self.ax = None
+        self.collection = None
+        self.texts = []
+        self.geometry = None
+        self.usability = None
+        self.interval = None
+        self.n_builds = 0  # Number of times the figure was (re)built
+
+    def _build(self, timestamp):
+        import matplotlib.pyplot as plt
+
+        table = self.metadata.detector_table(timestamp)
+        self.geometry = detector_geometry(self.metadata, timestamp=timestamp)
+        self.usability = dict(zip(table['name'], table['usability']))
+        if self.fig is None:
+            self.fig, self.ax = plt.subplots(figsize=self.figsize)
+        else:
+            self.ax.clear()
+        self.collection, self.texts = draw_detector_map(self.ax, self.geometry)
+        decorate_detector_map(self.ax)
+        self.interval = self.metadata.validity_interval(timestamp)
+        self.n_builds += 1
+
+    def update(self, timestamp, show_on=True, show_ac=True, show_off=False, period=None, run=None):
+        """
+        Show the detector statuses at timestamp, filtered by the on/ac/off flags.
+        The figure is only rebuilt when timestamp falls into another validity interval.
+
+        Returns:
+        - Figure: The (persistent) figure.
+        """
+        if self.fig is None or self.metadata.validity_interval(timestamp) != self.interval:
+            self._build(timestamp)
+
+        shown = {'on': show_on, 'ac': show_ac, 'off': show_off}
+        selected = {status: [name for name, usability in self.usability.items() if usability == status and visible]
+                    for status, visible in shown.items()}
+        facecolors, edgecolors = detector_colors(self.geometry, selected['on'], selected['ac'], selected['off'])
+        self.collection.set_facecolor(facecolors)
+        self.collection.set_edgecolor(edgecolors)
+        for text, visible in zip(self.texts, edgecolors[:, 3] > 0):
+            text.set_visible(bool(visible))
+        self.ax.set_title(map_title(period, run), fontsize=16)
+        self.fig.canvas.draw_idle()
+        return self.fig
+
+
+def plot_detector_positions(usable_detectors, legend_metadata, period=None, run=None, ac_detectors=None, off_detectors=None,
+                            save_path=None, show=True, timestamp=None, geometry=None, dpi=300):
     """
     Plot the detector positions as rectangles on a 2D plot using string (X-axis) and position (Y-axis),
     scaled to represent the detector's width (2 * radius) and height (height_in_mm). Detectors are color-coded
@@ -16,31 +233,23 @@ def plot_detector_positions(usable_detectors, legend_metadata, period=None, run=
 
     Parameters:
     - usable_detectors: List of detector IDs marked as 'on'.
-    - legend_metadata: An instance of LegendMetadata to retrieve positions and geometry.
+    - legend_metadata: A MetadataLoader or LegendMetadata instance to retrieve positions and geometry.
     - period: The data period being plotted (optional).
     - run: The data run being plotted (optional).
     - ac_detectors: List of detector IDs marked as 'ac' (optional).
     - off_detectors: List of detector IDs marked as 'off' (optional).
+    - save_path: Path to save the figure to (optional).
+    - show: Call plt.show(); with show=False the figure is only saved (batch use) and then closed.
+    - timestamp: Time of the channel map (default: now).
+    - geometry: Precomputed detector_geometry table, to skip the metadata lookup.
+    - dpi: Resolution of the saved figure.
 
     Returns:
-    - None: Displays a plot of detector positions.
+    - tuple: (figure, axis, collection) of the plot, or None on error.
     """
-    try:
-        # Define color mapping for different detector types
-        type_colors = {
-            'icpc': 'blue',
-            'ppc': 'green',
-            'bege': 'red',
-            'coax': 'purple'
-        }
-
-        # Define usability color overrides
-        usability_colors = {
-            'on': None,  # Use default type color
-            'ac': 'lightgrey',  # Mark 'ac' detectors with light grey
-            'off': 'none'  # Mark 'off' detectors with no fill
-        }
+    import matplotlib.pyplot as plt
 
+    try:
         # Ensure all inputs are lists or empty lists
         usable_detectors = list(usable_detectors) if usable_detectors else []
         ac_detectors = list(ac_detectors) if ac_detectors else []
@@ -48,130 +257,33 @@ def plot_detector_positions(usable_detectors, legend_metadata, period=None, run=
 
         # Combine all detector IDs for plotting
         all_detectors = usable_detectors + ac_detectors + off_detectors
-
-        # Determine the maximum width and height among all detectors
-        max_width = 0
-        max_height = 0
-
-        # Collect geometry information for scaling calculations
-        detector_geometries = []
-
-        for detector_id in all_detectors:
-            try:
-                detector_info = legend_metadata.channelmap().get(detector_id, None)
-                if detector_info:
-                    geometry = detector_info.get('geometry', {})
-                    height = geometry.get('height_in_mm', 0)
-                    radius = geometry.get('radius_in_mm', 0)
-                    width = 2 * radius
-
-                    # Store for later use
-                    detector_geometries.append((
-                        detector_info['location']['string'],
-                        detector_info['location']['position'],
-                        width,
-                        height,
-                        detector_info.get('type', '').lower(),
-                        detector_id
-                    ))
-
-                    # Update max dimensions for scaling
-                    if width > max_width:
-                        max_width = width
-                    if height > max_height:
-                        max_height = height
-                else:
-                    print(f"Metadata for detector {detector_id} not found.")
-                    continue
-
-            except KeyError:
-                print(f"Error retrieving data for detector {detector_id}.")
-                continue
-
-        # Determine scaling factors to fit within the plot (0-12 for x-axis, 15-0 for y-axis)
-        x_scale_factor = 0.8 / max_width if max_width > 0 else 1
-        y_scale_factor = 0.8 / max_height if max_height > 0 else 1
-
-        # Use the smaller scale factor to keep proportions and avoid overlap
-        scale_factor = min(x_scale_factor, y_scale_factor)
+        if geometry is None:
+            geometry = detector_geometry(legend_metadata, all_detectors, timestamp)
+        else:
+            geometry = geometry[geometry['name'].isin(set(all_detectors))]
 
         # Set up the plot
-        plt.figure(figsize=(14, 12))
-        ax = plt.gca()
-
-        # Draw the rectangles
-        for string, y_position, width, height, detector_type, detector_id in detector_geometries:
-            # Apply scaling
-            scaled_width = width * scale_factor
-            scaled_height = height * scale_factor
-
-            # Determine usability and corresponding color
-            if detector_id in usable_detectors:
-                color = type_colors.get(detector_type, 'gray')
-                facecolor = color  # Use default color for usable detectors
-            elif detector_id in ac_detectors:
-                color = usability_colors['ac']  # Light grey for 'ac' detectors
-                facecolor = color
-            elif detector_id in off_detectors:
-                color = usability_colors['off']  # No fill for 'off' detectors
-                facecolor = color
-            else:
-                color = 'gray'  # Default color for any unhandled cases
-                facecolor = color
-
-            # Create a rectangle patch aligned at the bottom of the y_position
-            rect = patches.Rectangle(
-                (string - scaled_width / 2, y_position),  # Bottom-left corner aligned with y_position
-                scaled_width, scaled_height,
-                edgecolor='black',
-                facecolor=facecolor,
-                alpha=0.5 if facecolor != 'none' else 1  # Apply transparency only if there is a fill
-            )
-            ax.add_patch(rect)
-
-            # Annotate with detector ID just below the rectangle's bottom edge
-            plt.text(string, y_position - 0.1, detector_id, fontsize=10, ha='center', va='top', color='black')
-
-        # Plot settings
-        title = 'Detector Positions'
-        if period or run:
-            title += f" (Period: {period or 'N/A'}, Run: {run or 'N/A'})"
-        plt.title(title, fontsize=16)
-        plt.xlabel('String', fontsize=14)
-        plt.ylabel('Position', fontsize=14)
-        plt.xlim(0, 12)  # Set X-axis from 0 to 12
-        plt.ylim(15, 0)  # Set Y-axis from 15 to 0 (inverted)
-        plt.grid(True)
-
-        # Set axis ticks to show values at each step
-        ax.set_xticks(range(0, 13, 1))  # X-axis ticks from 0 to 12 in steps of 1
-        ax.set_yticks(range(0, 16, 1))  # Y-axis ticks from 0 to 15 in steps of 1
-
-        # Add legend
-        legend_handles = []
-        for dtype, color in type_colors.items():
-            legend_handles.append(patches.Patch(color=color, label=dtype.upper(), alpha=0.5))
-        
-        # Add 'AC' and 'OFF' to legend only if there are corresponding detectors
-        if ac_detectors:
-            legend_handles.append(patches.Patch(color=usability_colors['ac'], label='AC', alpha=0.5))
-        if off_detectors:
-            legend_handles.append(patches.Patch(color='black', label='OFF', alpha=1, fill=False))  # Edge-only for 'off'
-
-        plt.legend(handles=legend_handles, title='Detector Types and Usability')
-        
+        fig, ax = plt.subplots(figsize=(14, 12))
+        collection, _ = draw_detector_map(ax, geometry, usable_detectors, ac_detectors, off_detectors)
+
+        decorate_detector_map(ax, period, run, bool(ac_detectors), bool(off_detectors))
+
         if save_path:
-            os.makedirs(os.path.dirname(save_path), exist_ok=True)
-            plt.savefig(save_path, dpi=300)
+            os.makedirs(os.path.dirname(save_path) or '.', exist_ok=True)
+            fig.savefig(save_path, dpi=dpi)
             print(f"Plot saved to {save_path}")
 
-        plt.show()
+        if show:
+            plt.show()
+        else:
+            plt.close(fig)
+        return fig, ax, collection
 
     except Exception as e:
         print(f"Error plotting detector positions with geometry: {e}")
+        return None
 
 
-import os
 import pickle
 
 
@@ -241,6 +353,9 @@ def plot_detector_positions_with_data(data_files, legend_metadata, period=None,
     Returns:
     - None: Shows a plot of detector positions.
     """
+    import matplotlib.pyplot as plt
+    import matplotlib.patches as patches
+
     # Load data from pickle files
     all_detector_info = []
     for file_path in data_files:
@@ -0,0 +1,162 @@
+# psd.py
+
+# Survival fractions of the PSD cuts in the calibration peaks. For every detector,
+# run and peak the hits in the peak window (see peaks.py) are encoded as one integer
+# per hit whose bits are the pass flags of the cuts; a single bincount over these
+# codes then gives the survivors of every cut and cut combination at once. Runs
+# are processed in parallel in a process pool.
+
+from concurrent.futures import ProcessPoolExecutor
+from itertools import combinations
+from legend200_data_loader.config import GLOBAL_PARAM
+from legend200_data_loader.logger import setup_logger
+from legend200_data_loader.peaks import build_peak_index, read_peak_events, DEFAULT_ENERGY_FIELD
+from legend200_data_loader.reader import table_path
+
+logger = setup_logger()
+
+# Boolean pass flags of the pht tier
+PSD_CUTS = ['AoE_High_Side_Cut', 'AoE_Low_Cut', 'AoE_Double_Sided_Cut', 'LQ_Cut', 'bl_pileup_cut', 'tail_pileup_cut']
+
+TABLE_COLUMNS = ['detector', 'rawid', 'period', 'run', 'peak', 'cut', 'n_events', 'n_survived',
+                 'survival_fraction', 'survival_error']
+
+
+def cut_combinations(cuts, max_order=None):
+    """Return all combinations (tuples) of the cuts up to max_order cuts (default: all)."""
+    max_order = max_order or len(cuts)
+    return [combo for order in range(1, max_order + 1) for combo in combinations(cuts, order)]
+
+
+def cut_code_counts(events, cuts):
+    """
+    Count the hits per pass pattern: bit i of a hit's code is set if it passes cuts[i].
+
+    Returns:
+    numpy.ndarray: Counts of length 2**len(cuts). Counts of several chunks can be summed.
+    """
+    import numpy as np
+
+    n = len(events[cuts[0]]) if cuts else 0
+    codes = np.zeros(n, dtype=np.int64)
+    for bit, cut in enumerate(cuts):
+        codes |= events[cut].astype(bool).astype(np.int64) << bit
+    return np.bincount(codes, minlength=2**len(cuts))
+
+
+def survival_fractions(counts, cuts, combos):
+    """
+    Compute survival fractions with binomial errors from cut_code_counts.
+
+    Returns:
+    list: (cut name, n_events, n_survived, fraction, error) per combination; combined
+          cuts are named like 'AoE_Low_Cut & LQ_Cut'.
+    """
+    import numpy as np
+
+    codes = np.arange(len(counts))
+    n_events = int(counts.sum())
+    rows = []
+    for combo in combos:
+        mask = sum(1 << cuts.index(cut) for cut in combo)
+        n_survived = int(counts[(codes & mask) == mask].sum())
+        fraction = n_survived / n_events if n_events else np.nan
+        error = np.sqrt(fraction * (1 - fraction) / n_events) if n_events else np.nan
+        rows.append((' & '.join(combo), n_events, n_survived, fraction, error))
+    return rows
+
+
+def _available_cuts(pht_files, detectors, cuts):
+    """Return rawid -> the cuts (in the given order) present in the pht tables of all files."""
+    import h5py
+
+    available = {rawid: set(cuts) for _, rawid in detectors}
+    for path in pht_files:
+        with h5py.File(path, 'r') as f:
+            for rawid, present in available.items():
+                table = f.get(table_path(rawid, 'pht'))
+                present.intersection_update(table.keys() if table is not None else ())
+    return {rawid: [cut for cut in cuts if cut in present] for rawid, present in available.items()}
+
+
+def _survival_run(period, run, file_dict, detectors, cuts, max_order, peaks, n_sigmas, energy_field):
+    """
+    Worker: index the peaks of one run and compute the survival fractions of its detectors.
+    The run's files are listed by the caller, so the worker neither scans the file
+    system nor opens the file catalog.
+    """
+    from legend200_data_loader.loader import LegendDataLoader
+
+    # Without a catalog the loader only reads the PAR entries here
+    index_path = build_peak_index(LegendDataLoader(), period, run, [rawid for _, rawid in detectors], peaks,
+                                  n_sigmas, energy_field, file_dict=file_dict)
+    if index_path is None:
+        return []
+
+    available_cuts = _available_cuts(file_dict['pht_files'], detectors, cuts)
+    rows = []
+    for name, rawid in detectors:
+        available = available_cuts[rawid]
+        if not available:
+            logger.warning(f"None of the cuts {cuts} in all pht files of {name} for {period}{run}")
+            continue
+        combos = cut_combinations(available, max_order)
+        for peak in peaks or GLOBAL_PARAM['peaks']:
+            events = read_peak_events(index_path, rawid, peak, available)
+            if events is None:
+                logger.warning(f"Peak {peak} of {name} not in the peak index of {period}{run}, skipped")
+                continue
+            counts = cut_code_counts(events, available)
+            for row in survival_fractions(counts, available, combos):
+                rows.append((name, rawid, period, run, peak) + row)
+    return rows
+
+
+def run_survival_fractions(loader=None, metadata=None, periods=None, detectors=None, cuts=PSD_CUTS, max_order=None,
+                           peaks=None, n_sigmas=None, energy_field=DEFAULT_ENERGY_FIELD, max_workers=None):
+    """
+    Compute the PSD cut survival fractions per detector, run and calibration peak.
+
+    Parameters:
+    loader: LegendDataLoader (default: a new one).
+    metadata: MetadataLoader (default: a new one).
+    periods (list): Periods to process (default: MERGE.periods_to_merge).
+    detectors (list): Optional detector names to restrict to.
+    cuts (list): Boolean cut fields; those missing from any pht file of a run are skipped.
+    max_order (int): Largest number of cuts combined (default: all cuts).
+    peaks (dict), n_sigmas (float): Peak windows, see peaks.peak_windows.
+    energy_field (str): Calibrated energy used to select the peak events.
+    max_workers (int): Size of the process pool (one task per run).
+
+    Returns:
+    pandas.DataFrame: One row per detector, run, peak and cut combination with the
+        columns in TABLE_COLUMNS.
+    """
+    import pandas as pd
+    from legend200_data_loader.merge import plan_merge
+
+    if loader is None:
+        from legend200_data_loader.loader import LegendDataLoader
+        loader = LegendDataLoader()
+    if metadata is None:
+        from legend200_data_loader.metadata import MetadataLoader
+        metadata = MetadataLoader()
+
+    # Same run and detector selection as the MERGE stage
+    runs, file_dicts = {}, {}
+    for shard in plan_merge(loader, metadata, periods, detectors):
+        runs.setdefault((shard['period'], shard['run']), []).append((shard['detector'], shard['rawid']))
+        file_dicts[(shard['period'], shard['run'])] = {key: shard[key] for key in ['pht_files', 'par_file'] if shard[key]}
+
+    rows = []
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        futures = {pool.submit(_survival_run, period, run, file_dicts[(period, run)], run_detectors, list(cuts),
+                               max_order, peaks, n_sigmas, energy_field): (period, run)
+                   for (period, run), run_detectors in runs.items()}
+        for future, (period, run) in futures.items():
+            try:
+                rows.extend(future.result())
+            except Exception as e:
+                logger.error(f"Failed to compute survival fractions for {period}{run}: {e}")
+
+    return pd.DataFrame(rows, columns=TABLE_COLUMNS)
@@ -0,0 +1,173 @@
+# reader.py
+
+# Streaming access to the per-channel tables of LH5 tier files. Only the requested
+# columns are read, in fixed-size row chunks, so memory stays bounded by the chunk
+# size no matter how large a run is.
+
+from legend200_data_loader.config import GLOBAL_PARAM
+from legend200_data_loader.logger import setup_logger
+from legend200_data_loader.utils import channel_key
+
+logger = setup_logger()
+
+# Name of the per-channel table inside the files of each tier
+TIER_GROUPS = {
+    'raw': 'raw',
+    'pht': 'hit',
+    'psp': 'dsp',
+}
+
+DEFAULT_CHUNK_SIZE = 100000
+
+
+def table_path(channel, tier):
+    """Return the LH5 path of a channel's table in a tier file, e.g. 'ch1104000/hit'."""
+    return f"{channel_key(channel)}/{TIER_GROUPS[tier]}"
+
+
+def resolve_fields(table, fields=None):
+    """
+    Expand the requested fields of an LH5 table into its row-aligned datasets.
+
+    Parameters:
+    table (h5py.Group): The channel table.
+    fields (list): Field names; struct fields like 'waveform' expand to 'waveform/values',
+        'waveform/t0', ... If None, MERGE.desired_fields present in the table are used.
+
+    Returns:
+    list: (name, h5py.Dataset) pairs.
+    """
+    import h5py
+
+    if fields is None:
+        fields = [field for field in GLOBAL_PARAM['MERGE']['desired_fields'] if field in table]
+
+    datasets = []
+    n_rows = None
+    for field in fields:
+        if field not in table:
+            raise KeyError(f"Field {field} not found in {table.file.filename}:{table.name}")
+        obj = table[field]
+        if isinstance(obj, h5py.Dataset):
+            items = [(field, obj)]
+        else:
+            items = []
+            obj.visititems(lambda name, item: items.append((f"{field}/{name}", item))
+                           if isinstance(item, h5py.Dataset) else None)
+        for name, dataset in items:
+            if dataset.shape == ():
+                continue
+            n_rows = len(dataset) if n_rows is None else n_rows
+            if len(dataset) != n_rows:
+                # Flattened (vector of vectors) data is not row aligned
+                logger.warning(f"Skipping {name} in {table.name}: not aligned with the table rows.")
+                continue
+            datasets.append((name, dataset))
+    return datasets
+
+
+def read_table(path, channel, tier='pht', fields=None):
+    """
+    Read the requested fields of a channel's table from a single file.
+
+    Returns:
+    dict: field name -> NumPy array, or None if the channel is not in the file.
+    """
+    import h5py
+
+    with h5py.File(path, 'r') as f:
+        name = table_path(channel, tier)
+        if name not in f:
+            return None
+        return {name: dataset[:] for name, dataset in resolve_fields(f[name], fields)}
+
+
+def table_nbytes(path, channel, tier='pht', fields=None):
+    """
+    Return the bytes read_table would allocate for a channel's table, from the
+    dataset shapes and types only (0 if the channel is not in the file).
+    """
+    import h5py
+
+    with h5py.File(path, 'r') as f:
+        name = table_path(channel, tier)
+        if name not in f:
+            return 0
+        return sum(dataset.size * dataset.dtype.itemsize for _, dataset in resolve_fields(f[name], fields))
+
+
+def rows_for_memory(files, channel, tier, fields, max_bytes):
+    """
+    Return the number of rows of a channel's table whose requested fields fit
+    into max_bytes, estimated from the dataset types of the first file.
+    """
+    import h5py
+    import numpy as np
+
+    for path in files:
+        with h5py.File(path, 'r') as f:
+            name = table_path(channel, tier)
+            if name not in f:
+                continue
+            row_bytes = sum(dataset.dtype.itemsize * int(np.prod(dataset.shape[1:]))
+                            for _, dataset in resolve_fields(f[name], fields))
+            return max(1, int(max_bytes // max(row_bytes, 1)))
+    return DEFAULT_CHUNK_SIZE
+
+
+def _concatenate(parts):
+    import numpy as np
+
+    if len(parts) == 1:
+        return parts[0]
+    return {name: np.concatenate([part[name] for part in parts]) for name in parts[0]}
+
+
+def iter_chunks(files, channel, tier='pht', fields=None, chunk_size=DEFAULT_CHUNK_SIZE, with_index=False):
+    """
+    Stream a channel's table across several LH5 files in chunks of chunk_size rows
+    (only the last chunk may be shorter). Only the requested fields are read.
+
+    Parameters:
+    files (list): Paths of the tier files, e.g. file_dict['pht_files'].
+    channel (int or str): Channel rawid or 'ch<rawid>' key.
+    tier (str): 'raw', 'pht' or 'psp' (selects the table group, see TIER_GROUPS).
+    fields (list): Fields to read (see resolve_fields).
+    chunk_size (int): Number of rows per chunk.
+    with_index (bool): Also return 'file_index' and 'row_in_file' arrays per chunk.
+
+    Yields:
+    dict: field name -> NumPy array of the chunk's rows.
+    """
+    import h5py
+    import numpy as np
+
+    parts, n_buffered = [], 0
+    for file_index, path in enumerate(files):
+        with h5py.File(path, 'r') as f:
+            name = table_path(channel, tier)
+            if name not in f:
+                logger.warning(f"Channel table {name} not found in {path}")
+                continue
+            datasets = resolve_fields(f[name], fields)
+            if fields is None:
+                # Keep the columns of the first file for the following files
+                fields = list(dict.fromkeys(name.split('/')[0] for name, _ in datasets))
+            n_rows = len(datasets[0][1]) if datasets else 0
+
+            start = 0
+            while start < n_rows:
+                stop = min(start + chunk_size - n_buffered, n_rows)
+                part = {name: dataset[start:stop] for name, dataset in datasets}
+                if with_index:
+                    part['file_index'] = np.full(stop - start, file_index, dtype=np.int64)
+                    part['row_in_file'] = np.arange(start, stop, dtype=np.int64)
+                parts.append(part)
+                n_buffered += stop - start
+                start = stop
+                if n_buffered == chunk_size:
+                    yield _concatenate(parts)
+                    parts, n_buffered = [], 0
+
+    if n_buffered:
+        yield _concatenate(parts)
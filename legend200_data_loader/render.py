@@ -0,0 +1,171 @@
+# render.py
+
+# Batch rendering of the array-status detector maps of many runs for run reviews.
+# The geometry and usability of each run are resolved in the main process (one
+# cached detector table per metadata validity interval); the maps are drawn with
+# the Agg backend in a process pool. Runs whose detector snapshot (positions and
+# usability) equals one already rendered reuse that image, so the images carry no
+# period or run in their title; maps_index.csv lists the image of every run.
+
+import os
+import csv
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
+from legend200_data_loader.config import GLOBAL_PARAM
+from legend200_data_loader.logger import setup_logger
+from legend200_data_loader.catalog import parse_file_timestamp
+
+logger = setup_logger()
+
+RENDER_SUBDIR = 'maps'
+INDEX_FILE = 'maps_index.csv'
+
+MAP_STATUSES = ('on', 'ac', 'off')
+
+
+def snapshot_key(table, statuses=MAP_STATUSES, dpi=None):
+    """
+    Hash of the detector positions and usability of a detector table, together with
+    the statuses shown and the resolution of the image.
+    """
+    rows = sorted(zip(table['name'], table['string'].tolist(), table['position'].tolist(), table['usability']))
+    return hashlib.sha1(f"{rows}{sorted(statuses)}{dpi}".encode()).hexdigest()[:16]
+
+
+def plan_maps(loader, metadata, period_runs=None, statuses=MAP_STATUSES, dpi=None):
+    """
+    Resolve the detector snapshot of every run. statuses and dpi enter the snapshot
+    key, see snapshot_key.
+
+    Returns:
+    list: Task dicts with the keys period, run, timestamp, key, geometry and the
+          detector lists 'on', 'ac' and 'off' (empty for statuses not shown).
+    """
+    from legend200_data_loader.preprocessing import detector_geometry
+
+    tasks = []
+    for (period, run), file_dict in sorted(loader.load_files_many(period_runs).items()):
+        files = file_dict.get('raw_files') or file_dict.get('pht_files') or []
+        timestamp = parse_file_timestamp(files[0])[0] if files else None
+        if timestamp is None:
+            logger.error(f"No timestamped files for {period}{run}; skipping its map.")
+            continue
+        table = metadata.detector_table(timestamp)
+        task = {
+            'period': period,
+            'run': run,
+            'timestamp': timestamp,
+            'key': snapshot_key(table, statuses, dpi),
+            'geometry': detector_geometry(metadata, timestamp=timestamp),
+        }
+        for status in MAP_STATUSES:
+            task[status] = table['name'][table['usability'] == status].tolist() if status in statuses else []
+        tasks.append(task)
+    return tasks
+
+
+def _render_map(task, path, dpi):
+    """Worker: draw one detector map with the Agg backend and save it to path."""
+    import matplotlib
+    matplotlib.use('Agg')
+    from legend200_data_loader.preprocessing import plot_detector_positions
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp.png"
+    # The image may be shared by several runs, so the title names none of them
+    result = plot_detector_positions(task['on'], None, ac_detectors=task['ac'],
+                                     off_detectors=task['off'], save_path=tmp_path, show=False,
+                                     geometry=task['geometry'], dpi=dpi)
+    if result is None:
+        raise RuntimeError(f"Failed to render the map of {task['period']}{task['run']}")
+    os.replace(tmp_path, path)
+    return path
+
+
+def _write_pdf(pages, pdf_path):
+    """Assemble rendered PNG pages into one multipage PDF."""
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    from matplotlib.backends.backend_pdf import PdfPages
+
+    tmp_path = f"{pdf_path}.tmp"
+    with PdfPages(tmp_path) as pdf:
+        for png_path in pages:
+            image = plt.imread(png_path)
+            fig = plt.figure(figsize=(image.shape[1] / 100, image.shape[0] / 100), dpi=100)
+            fig.figimage(image)
+            pdf.savefig(fig)
+            plt.close(fig)
+    os.replace(tmp_path, pdf_path)
+    return pdf_path
+
+
+def render_maps(loader=None, metadata=None, period_runs=None, output_dir=None, output_format='png', dpi=150,
+                statuses=MAP_STATUSES, max_workers=None):
+    """
+    Render the detector maps of many runs.
+
+    Parameters:
+    loader: LegendDataLoader (default: a new one).
+    metadata: MetadataLoader (default: a new one).
+    period_runs (list): (period, run) pairs (default: all runs of GLOBAL_PARAM['DIRS']['PERIODS']).
+    output_dir (str): Output directory (default: output_dir/maps).
+    output_format (str): 'png' for one image per distinct snapshot, or 'pdf' for a
+        single detector_maps.pdf with one page per distinct snapshot.
+    dpi (int): Resolution of the images.
+    statuses (tuple): Usability states drawn on the maps.
+    max_workers (int): Size of the process pool.
+
+    Returns:
+    dict: (period, run) -> image path ('png') or (pdf path, page number) ('pdf'). The
+          same mapping is written to maps_index.csv in output_dir.
+    """
+    if output_format not in ('png', 'pdf'):
+        raise ValueError(f"Unknown output format {output_format}; use 'png' or 'pdf'.")
+    if loader is None:
+        from legend200_data_loader.loader import LegendDataLoader
+        loader = LegendDataLoader()
+    if metadata is None:
+        from legend200_data_loader.metadata import MetadataLoader
+        metadata = MetadataLoader()
+    output_dir = output_dir or os.path.join(GLOBAL_PARAM['DIRS']['output_dir'], RENDER_SUBDIR)
+    image_dir = os.path.join(output_dir, 'images')
+
+    tasks = plan_maps(loader, metadata, period_runs, statuses, dpi)
+
+    # One image per distinct snapshot; images of earlier batches are reused
+    first_task = {}
+    for task in tasks:
+        first_task.setdefault(task['key'], task)
+    images = {key: os.path.join(image_dir, f"map_{key}.png") for key in first_task}
+    todo = {key: task for key, task in first_task.items() if not os.path.exists(images[key])}
+    logger.info(f"{len(tasks)} runs, {len(first_task)} distinct detector maps, {len(todo)} to render.")
+
+    failed = set()
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        futures = {key: pool.submit(_render_map, task, images[key], dpi) for key, task in todo.items()}
+        for key, future in futures.items():
+            try:
+                future.result()
+            except Exception as e:
+                logger.error(f"Failed to render map {key}: {e}")
+                failed.add(key)
+
+    keys = [key for key in first_task if key not in failed]
+    if output_format == 'pdf':
+        pdf_path = _write_pdf([images[key] for key in keys], os.path.join(output_dir, 'detector_maps.pdf'))
+        outputs = {(task['period'], task['run']): (pdf_path, keys.index(task['key']) + 1)
+                   for task in tasks if task['key'] not in failed}
+    else:
+        outputs = {(task['period'], task['run']): images[task['key']] for task in tasks if task['key'] not in failed}
+
+    os.makedirs(output_dir, exist_ok=True)
+    with open(os.path.join(output_dir, INDEX_FILE), 'w', newline='') as index_file:
+        writer = csv.writer(index_file)
+        writer.writerow(['period', 'run', 'timestamp', 'snapshot', 'image'])
+        for task in tasks:
+            if task['key'] not in failed:
+                writer.writerow([task['period'].strip('/'), task['run'], task['timestamp'], task['key'],
+                                 outputs[(task['period'], task['run'])]])
+    return outputs
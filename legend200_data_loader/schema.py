@@ -0,0 +1,130 @@
+# schema.py
+
+# Schema fingerprints of LH5 files: a hash of the group/dataset/dtype layout of a
+# file, computed from the HDF5 metadata only. Fingerprints are stored in the file
+# catalog by path and mtime, so checking that all files of a period share one
+# layout only opens the files that are new or changed.
+
+import os
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
+from legend200_data_loader.logger import setup_logger
+from legend200_data_loader.catalog import FileCatalog, TIERS
+
+logger = setup_logger()
+
+
+def file_layout(path):
+    """
+    Describe the layout of an LH5 file, one line per object, without reading data.
+    Datasets are described by dtype and per-row shape, so the number of rows does
+    not change the layout.
+    """
+    import h5py
+
+    lines = []
+
+    def visit(name, obj):
+        datatype = obj.attrs.get('datatype', '')
+        datatype = datatype.decode() if isinstance(datatype, bytes) else datatype
+        if isinstance(obj, h5py.Dataset):
+            lines.append(f"{name} dataset {obj.dtype.str} {obj.shape[1:]} {datatype}")
+        else:
+            lines.append(f"{name} group {datatype}")
+
+    with h5py.File(path, 'r') as f:
+        f.visititems(visit)
+    return '\n'.join(sorted(lines))
+
+
+def layout_fingerprint(layout):
+    return hashlib.sha1(layout.encode()).hexdigest()
+
+
+def _fingerprint(path):
+    """Worker: return (path, mtime, fingerprint, layout), or the error message as layout."""
+    mtime = os.stat(path).st_mtime
+    try:
+        layout = file_layout(path)
+    except Exception as e:
+        return path, mtime, None, str(e)
+    return path, mtime, layout_fingerprint(layout), layout
+
+
+def fingerprint_files(paths, catalog=None, max_workers=None):
+    """
+    Return the schema fingerprints of many files. Fingerprints stored in the catalog
+    for the same mtime are reused; the others are computed in a process pool and
+    stored.
+
+    Returns:
+    dict: path -> fingerprint (None for files that cannot be read).
+    """
+    paths = list(paths)
+    stored = catalog.get_fingerprints(paths) if catalog is not None else {}
+    fingerprints, todo = {}, []
+    for path in paths:
+        entry = stored.get(path)
+        if entry is not None and entry[0] == os.stat(path).st_mtime:
+            fingerprints[path] = entry[1]
+        else:
+            todo.append(path)
+
+    rows, layouts = [], {}
+    if todo:
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            chunksize = max(1, len(todo) // (4 * (max_workers or os.cpu_count() or 1)))
+            for path, mtime, fingerprint, layout in pool.map(_fingerprint, todo, chunksize=chunksize):
+                fingerprints[path] = fingerprint
+                if fingerprint is None:
+                    logger.error(f"Failed to read the layout of {path}: {layout}")
+                    continue
+                rows.append((path, mtime, fingerprint))
+                layouts[fingerprint] = layout
+    if catalog is not None and rows:
+        catalog.store_fingerprints(rows, layouts)
+    logger.info(f"Fingerprinted {len(paths)} files ({len(todo)} read).")
+    return fingerprints
+
+
+def check_schema(loader, period, tier='pht', runs=None, max_workers=None):
+    """
+    Group the files of a tier in a period by schema fingerprint.
+
+    Parameters:
+    loader: LegendDataLoader; its catalog is used if open, otherwise the default catalog file.
+    period (str): Period to check, e.g. 'p03/'.
+    tier (str): Tier to check.
+    runs (list): Optional runs to restrict the check to.
+
+    Returns:
+    dict: fingerprint -> sorted list of paths. More than one key means the layout
+          changes within the period; see layout_diff.
+    """
+    catalog = loader.catalog if loader.catalog is not None else FileCatalog()
+    runs = runs if runs is not None else loader.get_runs(period)
+    paths = [path for file_dict in loader.load_files_many([(period, run) for run in runs]).values()
+             for path in file_dict.get(TIERS[tier][2], [])]
+
+    groups = {}
+    for path, fingerprint in fingerprint_files(paths, catalog, max_workers).items():
+        groups.setdefault(fingerprint, []).append(path)
+    groups = {fingerprint: sorted(paths) for fingerprint, paths in groups.items()}
+    if len(groups) > 1:
+        logger.warning(f"{len(groups)} different {tier} layouts in {period}: "
+                       + ', '.join(f"{fingerprint} ({len(paths)} files)" for fingerprint, paths in groups.items()))
+    if catalog is not loader.catalog:
+        catalog.close()
+    return groups
+
+
+def layout_diff(catalog, fingerprint_a, fingerprint_b):
+    """
+    Compare two stored layouts.
+
+    Returns:
+    dict: 'removed' (objects only in a) and 'added' (objects only in b) layout lines.
+    """
+    lines_a = set((catalog.get_layout(fingerprint_a) or '').splitlines())
+    lines_b = set((catalog.get_layout(fingerprint_b) or '').splitlines())
+    return {'removed': sorted(lines_a - lines_b), 'added': sorted(lines_b - lines_a)}
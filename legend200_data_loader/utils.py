@@ -2,6 +2,8 @@
 # Helper functions
 
 import os
+import subprocess
+from datetime import datetime, timezone
 from legend200_data_loader.logger import setup_logger
 
 logger = setup_logger()
@@ -52,3 +54,70 @@ def list_files(directory, extension=".h5", log_files=True):
     except Exception as e:
         logger.error(f"Error listing files in directory {directory}: {e}")
         return []
+
+def to_datetime(timestamp=None):
+    """
+    Convert a timestamp to a timezone-aware UTC datetime.
+
+    Parameters:
+    timestamp (str, datetime, float or None): A 'YYYYMMDDTHHMMSSZ' string, a datetime,
+        a unix time or None (meaning now).
+
+    Returns:
+    datetime: The corresponding UTC datetime.
+    """
+    if timestamp is None:
+        return datetime.now(timezone.utc)
+    if isinstance(timestamp, datetime):
+        if timestamp.tzinfo is None:
+            return timestamp.replace(tzinfo=timezone.utc)
+        return timestamp
+    if isinstance(timestamp, str):
+        return datetime.strptime(timestamp, "%Y%m%dT%H%M%SZ").replace(tzinfo=timezone.utc)
+    return datetime.fromtimestamp(float(timestamp), tz=timezone.utc)
+
+def to_unix_time(timestamp=None):
+    """
+    Convert a timestamp (see to_datetime) to unix time in seconds.
+    """
+    return to_datetime(timestamp).timestamp()
+
+def git_commit_hash(path):
+    """
+    Return the commit hash checked out in a git repository (or submodule).
+
+    Parameters:
+    path (str): Path to the repository.
+
+    Returns:
+    str: The commit hash, or None if path is not a git checkout.
+    """
+    try:
+        result = subprocess.run(['git', '-C', path, 'rev-parse', 'HEAD'],
+                                stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True, check=True)
+        return result.stdout.strip()
+    except (OSError, subprocess.CalledProcessError) as e:
+        logger.warning(f"Could not determine git commit of {path}: {e}")
+        return None
+
+def channel_key(channel):
+    """
+    Return the 'ch<rawid>' key used for a channel in LH5 and PAR files.
+
+    Parameters:
+    channel (int or str): Channel rawid or 'ch<rawid>' key.
+    """
+    if isinstance(channel, str) and channel.startswith('ch'):
+        return channel
+    return f"ch{int(channel)}"
+
+def channel_rawid(channel):
+    """
+    Return the integer rawid of a channel.
+
+    Parameters:
+    channel (int or str): Channel rawid or 'ch<rawid>' key.
+    """
+    if isinstance(channel, str):
+        return int(channel[2:] if channel.startswith('ch') else channel)
+    return int(channel)
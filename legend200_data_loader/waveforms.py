@@ -0,0 +1,161 @@
+# waveforms.py
+
+# Random access to single waveforms of the raw tier without reading their
+# neighbours. Contiguous, uncompressed waveform datasets are memory-mapped at their
+# offset in the HDF5 file, so a waveform is a zero-copy view and only the pages
+# touched are read. Chunked or compressed datasets fall back to direct reads of
+# the selected rows, which only touch the chunks that contain them.
+
+import bisect
+from legend200_data_loader.logger import setup_logger
+from legend200_data_loader.reader import table_path
+
+logger = setup_logger()
+
+DEFAULT_WAVEFORM_FIELD = 'waveform'
+
+
+class WaveformReader:
+    """
+    Waveforms of one channel in one raw tier file, indexable like an array:
+    reader[i] returns waveform i and reader.take(indices) a 2D array of several.
+    """
+    def __init__(self, path, channel, field=DEFAULT_WAVEFORM_FIELD):
+        import h5py
+        import numpy as np
+
+        self.logger = setup_logger()
+        self.path = path
+        self._file = h5py.File(path, 'r')
+        name = f"{table_path(channel, 'raw')}/{field}/values"
+        if name not in self._file:
+            self._file.close()
+            raise KeyError(f"No {field} values for channel {channel} in {path}")
+        self._dataset = self._file[name]
+        if self._dataset.ndim != 2:
+            self._file.close()
+            raise ValueError(f"{path}:{name} is not a fixed-length waveform array (encoded waveforms are not supported)")
+
+        self.shape = self._dataset.shape
+        self.dtype = self._dataset.dtype
+        # Sampling information, small enough to read at once
+        group = self._file[f"{table_path(channel, 'raw')}/{field}"]
+        self.t0 = group['t0'][:] if 't0' in group else None
+        self.dt = group['dt'][:] if 'dt' in group else None
+
+        self._memmap = None
+        offset = self._dataset.id.get_offset()
+        if self._dataset.chunks is None and self._dataset.compression is None and offset is not None:
+            self._memmap = np.memmap(path, dtype=self.dtype, mode='r', offset=offset, shape=self.shape)
+        else:
+            self.logger.debug(f"{path}:{name} is chunked or compressed; reading rows directly.")
+
+    @property
+    def zero_copy(self):
+        """True if waveforms are returned as views of a memory map."""
+        return self._memmap is not None
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __getitem__(self, i):
+        import numpy as np
+
+        if self._memmap is not None:
+            return self._memmap[i]
+        if not -len(self) <= i < len(self):
+            raise IndexError(f"Waveform {i} out of range for {len(self)} waveforms")
+        out = np.empty(self.shape[1], dtype=self.dtype)
+        self._dataset.read_direct(out, np.s_[i % len(self)])
+        return out
+
+    def take(self, indices):
+        """Return the waveforms at the given indices as a 2D array (in the given order)."""
+        import numpy as np
+
+        indices = np.asarray(indices, dtype=np.int64)
+        if self._memmap is not None:
+            return self._memmap[indices]
+        # h5py needs increasing unique indices for point selections
+        unique, inverse = np.unique(indices, return_inverse=True)
+        return self._dataset[unique][inverse]
+
+    def close(self):
+        self._memmap = None
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class RunWaveforms:
+    """
+    Waveforms of one channel over all raw tier files of a run, indexed by the row
+    number in the concatenated files (the order of iter_chunks). Files are opened
+    on first access.
+    """
+    def __init__(self, files, channel, field=DEFAULT_WAVEFORM_FIELD):
+        import h5py
+
+        self.logger = setup_logger()
+        self.files = list(files)
+        self.channel = channel
+        self.field = field
+        self._readers = {}
+        # Row offset of each file, from the dataset shapes only
+        self._starts = [0]
+        for path in self.files:
+            with h5py.File(path, 'r') as f:
+                name = f"{table_path(channel, 'raw')}/{field}/values"
+                n_rows = f[name].shape[0] if name in f else 0
+            self._starts.append(self._starts[-1] + n_rows)
+
+    def __len__(self):
+        return self._starts[-1]
+
+    def locate(self, i):
+        """Return (file_index, row_in_file) of row i of the run."""
+        if not 0 <= i < len(self):
+            raise IndexError(f"Waveform {i} out of range for {len(self)} waveforms")
+        file_index = bisect.bisect_right(self._starts, i) - 1
+        return file_index, i - self._starts[file_index]
+
+    def reader(self, file_index):
+        if file_index not in self._readers:
+            self._readers[file_index] = WaveformReader(self.files[file_index], self.channel, self.field)
+        return self._readers[file_index]
+
+    def __getitem__(self, i):
+        file_index, row = self.locate(i)
+        return self.reader(file_index)[row]
+
+    def take(self, indices):
+        """Return the waveforms at the given run rows as a 2D array (in the given order)."""
+        import numpy as np
+
+        indices = np.asarray(indices, dtype=np.int64)
+        if (indices < 0).any() or (indices >= len(self)).any():
+            raise IndexError(f"Waveform indices out of range for {len(self)} waveforms")
+        file_indices = np.searchsorted(self._starts, indices, side='right') - 1
+        out = None
+        for file_index in np.unique(file_indices):
+            selected = file_indices == file_index
+            waveforms = self.reader(int(file_index)).take(indices[selected] - self._starts[file_index])
+            if out is None:
+                out = np.empty((len(indices),) + waveforms.shape[1:], dtype=waveforms.dtype)
+            out[selected] = waveforms
+        return out if out is not None else np.empty((0, 0))
+
+    def close(self):
+        for reader in self._readers.values():
+            reader.close()
+        self._readers.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -9,12 +9,14 @@ setup(
     packages=find_packages(),
     install_requires=[
         "awkward",
+        "numpy",
         "matplotlib",
         "legendmeta",
         "lgdo",
         "h5py",
         "pandas",
         "ipywidgets",
+        "ipympl",
     ],
     python_requires=">=3.6",
 )
@@ -0,0 +1,101 @@
+# tests/fake_data.py
+# Builds a minimal prod-blind style directory tree for the loader and catalog tests.
+import os
+from unittest import mock
+
+from legend200_data_loader.config import GLOBAL_PARAM
+
+SUBDIRS = {
+    'raw': 'ref-raw/generated/tier/raw/',
+    'pht': 'ref-v2.0.0/generated/tier/pht/',
+    'tcm': 'ref-v2.0.0/generated/tier/tcm/',
+    'psp': 'ref-v2.0.0/generated/tier/psp/',
+    'par': 'ref-v2.0.0/generated/par/pht/',
+}
+
+# period -> run -> start timestamps of the run's files
+RUNS = {
+    'p03': {
+        'r000': ['20230311T235840Z', '20230312T004425Z'],
+        'r001': ['20230318T001516Z'],
+    },
+    'p08': {
+        'r005': ['20231120T120000Z', '20231120T130000Z', '20231120T140000Z'],
+    },
+}
+
+
+def file_name(tier, period, run, timestamp):
+    return f"l200-{period}-{run}-cal-{timestamp}-tier_{tier}.lh5"
+
+
+def write_file(path, content=b''):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(content)
+
+
+def write_lh5(path, tables):
+    """Write {'ch1104000/hit': {'field': array, 'struct': {'values': array}}} as an LH5-like HDF5 file."""
+    import h5py
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    def write_group(group, columns):
+        for name, value in columns.items():
+            if isinstance(value, dict):
+                write_group(group.create_group(name), value)
+            else:
+                group.create_dataset(name, data=value)
+
+    with h5py.File(path, 'w') as f:
+        for table, columns in tables.items():
+            write_group(f.require_group(table), columns)
+
+
+def write_tcm(path, events):
+    """Write a tcm file from a list of events, each a list of (rawid, row_in_table) pairs."""
+    import numpy as np
+
+    cumulative_length = np.cumsum([len(event) for event in events])
+    write_lh5(path, {'hardware_tcm_1': {
+        'table_key': {
+            'flattened_data': np.array([key for event in events for key, _ in event], dtype=np.int64),
+            'cumulative_length': cumulative_length,
+        },
+        'row_in_table': {
+            'flattened_data': np.array([row for event in events for _, row in event], dtype=np.int64),
+            'cumulative_length': cumulative_length,
+        },
+    }})
+
+
+def tier_path(root, tier, period, run, timestamp):
+    return os.path.join(root, SUBDIRS[tier], 'cal', period, run, file_name(tier, period, run, timestamp))
+
+
+def build_fake_data(root, runs=RUNS):
+    """Write empty tier files for all runs below root and return root."""
+    for period, period_runs in runs.items():
+        for run, timestamps in period_runs.items():
+            for tier in ['raw', 'pht', 'tcm', 'psp']:
+                for timestamp in timestamps:
+                    write_file(tier_path(root, tier, period, run, timestamp))
+            par_name = f"l200-{period}-{run}-cal-{timestamps[0]}-par_pht.json"
+            write_file(os.path.join(root, SUBDIRS['par'], 'cal', period, run, par_name), b'{}')
+    return root
+
+
+def patch_dirs(root, output_dir, periods=('p03/', 'p08/')):
+    """Return a mock.patch.dict pointing GLOBAL_PARAM['DIRS'] at the fake tree."""
+    return mock.patch.dict(GLOBAL_PARAM['DIRS'], {
+        'LEGEND_DATA_DIR': root,
+        'TYPE': 'cal/',
+        'RAW_SUBDIR': SUBDIRS['raw'],
+        'PHT_SUBDIR': SUBDIRS['pht'],
+        'TCM_SUBDIR': SUBDIRS['tcm'],
+        'PSP_SUBDIR': SUBDIRS['psp'],
+        'PAR_SUBDIR': SUBDIRS['par'],
+        'PERIODS': list(periods),
+        'output_dir': output_dir,
+    })
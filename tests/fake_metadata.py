@@ -0,0 +1,87 @@
+# tests/fake_metadata.py
+# Builds a minimal legend-metadata tree on disk for the metadata tests.
+import os
+import json
+
+# Channel map changes once, statuses change twice
+CHANNELMAP_STARTS = ['20230101T000000Z', '20230301T000000Z']
+STATUS_STARTS = ['20230101T000000Z', '20230201T000000Z', '20230401T000000Z']
+
+DETECTORS = {
+    # name: (rawid, type, manufacturer, string, position, radius, height)
+    'V01': (1104000, 'icpc', 'Ortec', 1, 1, 38.0, 80.0),
+    'V02': (1104001, 'icpc', 'Ortec', 1, 2, 36.0, 75.0),
+    'B01': (1104002, 'bege', 'Mirion', 2, 1, 37.0, 30.0),
+    'P01': (1104003, 'ppc', 'Mirion', 2, 2, 30.0, 50.0),
+    'C01': (1104004, 'coax', 'Mirion', 3, 1, 40.0, 70.0),
+}
+
+# Usability of every detector in each status interval
+USABILITY = [
+    {'V01': 'on', 'V02': 'on', 'B01': 'on', 'P01': 'ac', 'C01': 'off'},
+    {'V01': 'on', 'V02': 'ac', 'B01': 'on', 'P01': 'ac', 'C01': 'off'},
+    {'V01': 'off', 'V02': 'ac', 'B01': 'on', 'P01': 'on', 'C01': 'off'},
+]
+
+
+def _write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(data, f)
+
+
+def _validity(path, entries):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        for valid_from, apply in entries:
+            f.write(json.dumps({'valid_from': valid_from, 'category': 'all', 'apply': [apply]}) + '\n')
+
+
+def build_fake_metadata(root):
+    """Write the fake metadata tree below root and return root."""
+    chmap_dir = os.path.join(root, 'hardware', 'configuration', 'channelmaps')
+    diode_dir = os.path.join(root, 'hardware', 'detectors', 'germanium', 'diodes')
+    status_dir = os.path.join(root, 'datasets', 'statuses')
+
+    validity = []
+    for i, start in enumerate(CHANNELMAP_STARTS):
+        chmap = {}
+        for name, (rawid, _, _, string, position, _, _) in DETECTORS.items():
+            # The second channel map moves V02 to string 4
+            if i == 1 and name == 'V02':
+                string, position = 4, 1
+            chmap[name] = {
+                'name': name,
+                'system': 'geds',
+                'daq': {'rawid': rawid},
+                'location': {'string': string, 'position': position},
+            }
+        chmap['S01'] = {'name': 'S01', 'system': 'spms', 'daq': {'rawid': 1052803}}
+        _write(os.path.join(chmap_dir, f'chmap-{i}.json'), chmap)
+        validity.append((start, f'chmap-{i}.json'))
+    _validity(os.path.join(chmap_dir, 'validity.jsonl'), validity)
+
+    for name, (_, det_type, manufacturer, _, _, radius, height) in DETECTORS.items():
+        _write(os.path.join(diode_dir, f'{name}.json'), {
+            'name': name,
+            'type': det_type,
+            'production': {'manufacturer': manufacturer},
+            'geometry': {'radius_in_mm': radius, 'height_in_mm': height},
+        })
+    _write(os.path.join(root, 'hardware', 'detectors', 'lar', 'sipms', 'S01.json'), {'name': 'S01'})
+
+    validity = []
+    for i, start in enumerate(STATUS_STARTS):
+        statuses = {
+            name: {
+                'usability': usability,
+                'processable': usability != 'off',
+                'psd': {'status': {'lq': 'valid' if name != 'P01' else 'missing'}},
+            }
+            for name, usability in USABILITY[i].items()
+        }
+        _write(os.path.join(status_dir, f'statuses-{i}.json'), statuses)
+        validity.append((start, f'statuses-{i}.json'))
+    _validity(os.path.join(status_dir, 'validity.jsonl'), validity)
+
+    return root
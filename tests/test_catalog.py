@@ -0,0 +1,93 @@
+# tests/test_catalog.py
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from legend200_data_loader.loader import LegendDataLoader
+from legend200_data_loader.catalog import RunIndex
+from legend200_data_loader.utils import to_unix_time
+from fake_data import SUBDIRS, build_fake_data, file_name, patch_dirs, write_file
+
+
+class TestFileCatalog(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.data_dir = build_fake_data(os.path.join(self.tmpdir.name, 'data'))
+        self.output_dir = os.path.join(self.tmpdir.name, 'output')
+        dirs = patch_dirs(self.data_dir, self.output_dir)
+        dirs.start()
+        self.addCleanup(dirs.stop)
+
+    def test_catalog_matches_filesystem(self):
+        plain = LegendDataLoader()
+        indexed = LegendDataLoader(use_catalog=True)
+        self.addCleanup(indexed.catalog.close)
+        self.assertTrue(os.path.isfile(indexed.catalog.db_path))
+
+        for period in ['p03/', 'p08/']:
+            self.assertEqual(indexed.get_runs(period), plain.get_runs(period))
+            for run in plain.get_runs(period):
+                self.assertEqual(indexed.load_files(period, run), plain.load_files(period, run))
+
+    def test_load_files_many(self):
+        plain = LegendDataLoader()
+        file_dicts = plain.load_files_many(max_workers=4)
+        self.assertEqual(sorted(file_dicts), [('p03/', 'r000'), ('p03/', 'r001'), ('p08/', 'r005')])
+        for (period, run), file_dict in file_dicts.items():
+            self.assertEqual(file_dict, plain.load_files(period, run))
+
+    def test_run_index(self):
+        timestamps = [to_unix_time(t) for t in
+                      ['20230101T000000Z', '20230312T000000Z', '20230312T010000Z', '20231120T133000Z']]
+        for use_catalog in [False, True]:
+            loader = LegendDataLoader(use_catalog=use_catalog)
+            if use_catalog:
+                self.addCleanup(loader.catalog.close)
+            index = loader.build_run_index()
+            self.assertEqual(len(index), 6)
+            self.assertEqual(index.run_start('p03/', 'r001'), to_unix_time('20230318T001516Z'))
+
+            found = index.lookup(timestamps)
+            self.assertEqual(found['period'].tolist(), [None, 'p03', 'p03', 'p08'])
+            self.assertEqual(found['run'].tolist(), [None, 'r000', 'r000', 'r005'])
+            np.testing.assert_array_equal(found['file_index'], [-1, 0, 1, 1])
+
+    def test_empty_run_index(self):
+        found = RunIndex({}).lookup([1.0, 2.0])
+        np.testing.assert_array_equal(found['run_index'], [-1, -1])
+        np.testing.assert_array_equal(found['file_index'], [-1, -1])
+        self.assertEqual(found['period'].tolist(), [None, None])
+        self.assertEqual(found['run'].tolist(), [None, None])
+
+    def test_file_info(self):
+        loader = LegendDataLoader(use_catalog=True)
+        self.addCleanup(loader.catalog.close)
+        rows = loader.catalog.get_file_info('p03/', 'r000', 'raw')
+        self.assertEqual([row['timestamp'] for row in rows], ['20230311T235840Z', '20230312T004425Z'])
+        self.assertEqual(rows[0]['size'], 0)
+        self.assertLess(rows[0]['start_time'], rows[1]['start_time'])
+
+    def test_incremental_refresh(self):
+        loader = LegendDataLoader(use_catalog=True)
+        self.addCleanup(loader.catalog.close)
+        self.assertEqual(loader.refresh_catalog(), {'added': [], 'removed': []})
+
+        raw_dir = os.path.join(self.data_dir, SUBDIRS['raw'], 'cal', 'p03')
+        old_file = os.path.join(raw_dir, 'r000', file_name('raw', 'p03', 'r000', '20230311T235840Z'))
+        new_file = os.path.join(raw_dir, 'r002', file_name('raw', 'p03', 'r002', '20230325T000000Z'))
+        os.remove(old_file)
+        write_file(new_file)
+        # Make sure the directory mtimes change even on coarse-grained filesystems
+        for path in [raw_dir, os.path.join(raw_dir, 'r000')]:
+            os.utime(path, (0, os.stat(path).st_mtime + 10))
+
+        self.assertEqual(loader.refresh_catalog(), {'added': [new_file], 'removed': [old_file]})
+        self.assertEqual(loader.get_runs('p03/'), ['r000', 'r001', 'r002'])
+        self.assertEqual(loader.catalog.get_files('p03/', 'r002', 'raw'), [new_file])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,81 @@
+# tests/test_histograms.py
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+
+from legend200_data_loader.config import GLOBAL_PARAM
+from legend200_data_loader.loader import LegendDataLoader
+from legend200_data_loader.metadata import MetadataLoader
+from legend200_data_loader.histograms import HistogramCube, fill_cube, fill_histogram
+from fake_data import build_fake_data, patch_dirs, tier_path, write_lh5, RUNS
+from fake_metadata import build_fake_metadata
+
+BINNING = (0.0, 10.0, 1.0)
+
+
+class TestHistograms(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.data_dir = build_fake_data(os.path.join(self.tmpdir.name, 'data'))
+        for patcher in [
+            patch_dirs(self.data_dir, os.path.join(self.tmpdir.name, 'output')),
+            mock.patch.dict(os.environ, {'METADATA_NO_GIT_REPO': '1'}),
+            mock.patch.dict(GLOBAL_PARAM, {'inactive_detectors': ['V02', 'B01'], 'exclude_period_run': []}),
+            mock.patch.dict(GLOBAL_PARAM['MERGE'], {'periods_to_merge': ['p03/']}),
+        ]:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.metadata = MetadataLoader(metadata_path=build_fake_metadata(os.path.join(self.tmpdir.name, 'meta')))
+
+    def write_run(self, run, energies):
+        for timestamp in RUNS['p03'][run]:
+            write_lh5(tier_path(self.data_dir, 'pht', 'p03', run, timestamp), {
+                'ch1104000/hit': {'cuspEmax_ctc_cal': np.asarray(energies, dtype=np.float64),
+                                  'zacEmax_cal': np.asarray(energies, dtype=np.float64) + 1},
+            })
+
+    def test_fill_histogram(self):
+        counts = fill_histogram(np.array([0.5, 1.2, 1.9, 9.99, 10.0, -1, np.nan]), BINNING)
+        counts = fill_histogram(np.array([1.5]), BINNING, counts)
+        np.testing.assert_array_equal(counts, [1, 3, 0, 0, 0, 0, 0, 0, 0, 1])
+
+    def test_incremental_cube(self):
+        self.write_run('r000', [1.5, 2.5, 2.7])
+        self.write_run('r001', [3.5])
+        with mock.patch.dict(GLOBAL_PARAM, {'exclude_period_run': ['p03_r001']}):
+            cube = fill_cube(LegendDataLoader(), self.metadata, binning=BINNING, max_workers=2)
+        self.assertEqual(cube.contents(), {('V01', 'p03_r000')})
+
+        # Only the new run is filled on the next call
+        cube = fill_cube(LegendDataLoader(), self.metadata, binning=BINNING, max_workers=2)
+        self.assertEqual(cube.contents(), {('V01', 'p03_r000'), ('V01', 'p03_r001')})
+        counts, edges = cube.spectrum('V01', 'cuspEmax_ctc_cal')
+        # r000 has two files with the same energies
+        np.testing.assert_array_equal(counts, [0, 2, 4, 1, 0, 0, 0, 0, 0, 0])
+        self.assertEqual(len(edges), 11)
+        counts, _ = cube.spectrum('V01', 'zacEmax_cal', runs=['p03_r001'])
+        self.assertEqual(counts[4], 1)
+
+        with self.assertRaises(ValueError):
+            HistogramCube(cube.path, binning=(0.0, 10.0, 2.0)).contents()
+
+    def test_channel_and_field_missing_from_files(self):
+        first, second = [tier_path(self.data_dir, 'pht', 'p03', 'r000', timestamp) for timestamp in RUNS['p03']['r000']]
+        # V01 is only in the second file, which lacks zacEmax_cal
+        write_lh5(first, {'ch1104004/hit': {'cuspEmax_ctc_cal': np.zeros(2)}})
+        write_lh5(second, {'ch1104000/hit': {'cuspEmax_ctc_cal': np.array([1.5, 2.5])}})
+        self.write_run('r001', [3.5])
+        cube = fill_cube(LegendDataLoader(), self.metadata, binning=BINNING, max_workers=2)
+        self.assertEqual(cube.contents(), {('V01', 'p03_r000'), ('V01', 'p03_r001')})
+        counts, _ = cube.spectrum('V01', 'cuspEmax_ctc_cal', runs=['p03_r000'])
+        np.testing.assert_array_equal(counts[:4], [0, 1, 1, 0])
+        counts, _ = cube.spectrum('V01', 'zacEmax_cal', runs=['p03_r001'])
+        self.assertEqual(counts[4], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+# tests/test_import_time.py
+import os
+import subprocess
+import sys
+import unittest
+
+# Cumulative import time budget per top-level module, in microseconds
+IMPORT_BUDGET_US = {
+    'legend200_data_loader.config': 50000,
+    'legend200_data_loader.logger': 50000,
+    'legend200_data_loader.utils': 50000,
+    'legend200_data_loader.loader': 50000,
+    'legend200_data_loader.catalog': 50000,
+    'legend200_data_loader.par': 50000,
+    'legend200_data_loader.reader': 50000,
+    'legend200_data_loader.merge': 50000,
+    'legend200_data_loader.join': 50000,
+    'legend200_data_loader.masks': 50000,
+    'legend200_data_loader.peaks': 50000,
+    'legend200_data_loader.psd': 50000,
+    'legend200_data_loader.histograms': 50000,
+    'legend200_data_loader.prefetch': 50000,
+    'legend200_data_loader.waveforms': 50000,
+    'legend200_data_loader.schema': 50000,
+    'legend200_data_loader.render': 50000,
+    'legend200_data_loader.inspection': 50000,
+    'legend200_data_loader.preprocessing': 50000,
+    'legend200_data_loader.function': 250000,  # numpy
+    'legend200_data_loader.metadata': 250000,  # numpy
+}
+
+# Packages that must only be imported on first use
+LAZY_PACKAGES = ['h5py', 'legendmeta', 'lgdo', 'dbetto', 'matplotlib', 'pandas']
+# Modules that must not even import numpy
+NUMPY_FREE_MODULES = ['legend200_data_loader.loader', 'legend200_data_loader.catalog', 'legend200_data_loader.reader']
+
+REPO_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+
+def import_times(module):
+    """Run `python -X importtime -c 'import module'` and return {module: cumulative us}."""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        capture_output=True, text=True, cwd=REPO_DIR, check=True,
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        times[name.strip()] = int(cumulative)
+    return times
+
+
+class TestImportTime(unittest.TestCase):
+    def test_import_budget(self):
+        for module, budget in IMPORT_BUDGET_US.items():
+            with self.subTest(module=module):
+                times = import_times(module)
+                lazy = [name for name in times if name.split('.')[0] in LAZY_PACKAGES]
+                self.assertEqual(lazy, [], f"{module} eagerly imports {lazy}")
+                if module in NUMPY_FREE_MODULES:
+                    self.assertNotIn('numpy', times)
+                self.assertLess(times[module], budget)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,53 @@
+# tests/test_inspection.py
+import os
+import tempfile
+import unittest
+
+import h5py
+import numpy as np
+
+from legend200_data_loader.loader import LegendDataLoader
+from legend200_data_loader.inspection import describe_file, inspect_period
+from fake_data import build_fake_data, patch_dirs, tier_path, write_lh5, RUNS
+
+
+class TestStructuralInspector(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.data_dir = build_fake_data(os.path.join(self.tmpdir.name, 'data'))
+        dirs = patch_dirs(self.data_dir, os.path.join(self.tmpdir.name, 'output'))
+        dirs.start()
+        self.addCleanup(dirs.stop)
+
+        for run, timestamps in RUNS['p03'].items():
+            for timestamp in timestamps:
+                path = tier_path(self.data_dir, 'raw', 'p03', run, timestamp)
+                write_lh5(path, {'ch1104000/raw': {'timestamp': np.zeros(5)}})
+                with h5py.File(path, 'a') as f:
+                    f['ch1104000/raw'].attrs['datatype'] = 'table{timestamp,waveform}'
+                    values = f.create_dataset('ch1104000/raw/waveform/values', data=np.zeros((5, 100), dtype=np.uint16),
+                                              chunks=(5, 100), compression='gzip')
+                    values.attrs['datatype'] = 'array_of_equalsized_arrays<1,1>{real}'
+
+    def test_describe_file(self):
+        path = tier_path(self.data_dir, 'raw', 'p03', 'r000', RUNS['p03']['r000'][0])
+        rows = {row['name']: row for row in describe_file(path)}
+        self.assertEqual(sorted(rows), ['ch1104000/raw/timestamp', 'ch1104000/raw/waveform/values'])
+        values = rows['ch1104000/raw/waveform/values']
+        self.assertEqual(values['shape'], (5, 100))
+        self.assertEqual(values['compression'], 'gzip')
+        self.assertEqual(values['logical_bytes'], 1000)
+        self.assertLess(values['stored_bytes'], values['logical_bytes'])
+        self.assertEqual(values['datatype'], 'array_of_equalsized_arrays<1,1>{real}')
+        self.assertEqual(rows['ch1104000/raw/timestamp']['group_datatype'], 'table{timestamp,waveform}')
+
+    def test_inspect_period(self):
+        summary = inspect_period(LegendDataLoader(), 'p03/', max_workers=2)
+        self.assertEqual(len(summary), 6)
+        self.assertEqual(sorted(summary['run'].unique()), ['r000', 'r001'])
+        self.assertEqual(set(summary['period']), {'p03/'})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+# tests/test_join.py
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from legend200_data_loader.loader import LegendDataLoader
+from legend200_data_loader.join import read_tcm, join_tcm
+from fake_data import build_fake_data, patch_dirs, tier_path, write_lh5, write_tcm, RUNS
+
+GED_A, GED_B, PULSER = 1104000, 1104001, 1027201
+
+# Events of the first file: (rawid, row_in_table)
+EVENTS = [
+    [(GED_A, 0)],
+    [(GED_A, 1), (GED_B, 0)],
+    [(PULSER, 0), (GED_A, 2), (GED_B, 1)],
+    [(GED_B, 2)],
+]
+
+
+class TestTcmJoin(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.data_dir = build_fake_data(os.path.join(self.tmpdir.name, 'data'))
+        dirs = patch_dirs(self.data_dir, os.path.join(self.tmpdir.name, 'output'))
+        dirs.start()
+        self.addCleanup(dirs.stop)
+
+        first, second = RUNS['p03']['r000']
+        self.tcm_path = tier_path(self.data_dir, 'tcm', 'p03', 'r000', first)
+        write_tcm(self.tcm_path, EVENTS)
+        write_lh5(tier_path(self.data_dir, 'pht', 'p03', 'r000', first), {
+            'ch1104000/hit': {'cuspEmax_ctc_cal': np.array([10., 20., 30.])},
+            'ch1104001/hit': {'cuspEmax_ctc_cal': np.array([40., 50., 60.])},
+        })
+        write_tcm(tier_path(self.data_dir, 'tcm', 'p03', 'r000', second), [[(GED_A, 0)]])
+        write_lh5(tier_path(self.data_dir, 'pht', 'p03', 'r000', second), {
+            'ch1104000/hit': {'cuspEmax_ctc_cal': np.array([70.])},
+        })
+
+    def test_join_tcm(self):
+        tcm = read_tcm(self.tcm_path)
+        joined = join_tcm(tcm, GED_A, 3, pulser_channel=PULSER, geds_channels=[GED_A, GED_B], with_channels=True)
+        np.testing.assert_array_equal(joined['event_index'], [0, 1, 2])
+        np.testing.assert_array_equal(joined['multiplicity'], [1, 2, 2])
+        np.testing.assert_array_equal(joined['is_pulser'], [False, False, True])
+        np.testing.assert_array_equal(joined['coincident_offsets'], [0, 1, 3, 6])
+        np.testing.assert_array_equal(joined['coincident_channels'],
+                                      [GED_A, GED_A, GED_B, PULSER, GED_A, GED_B])
+
+    def test_hits_missing_from_tcm(self):
+        joined = join_tcm(read_tcm(self.tcm_path), GED_B, 4, with_channels=True)
+        np.testing.assert_array_equal(joined['event_index'], [1, 2, 3, -1])
+        np.testing.assert_array_equal(joined['multiplicity'], [2, 3, 1, 0])
+        np.testing.assert_array_equal(np.diff(joined['coincident_offsets']), [2, 3, 1, 0])
+
+    def test_iter_joined(self):
+        loader = LegendDataLoader()
+        results = list(loader.iter_joined('p03/', 'r000', [GED_A, GED_B], fields=['cuspEmax_ctc_cal'],
+                                          pulser_channel=PULSER))
+        self.assertEqual([(channel, file_index) for channel, file_index, _ in results],
+                         [(GED_A, 0), (GED_B, 0), (GED_A, 1)])
+        _, _, columns = results[1]
+        np.testing.assert_array_equal(columns['cuspEmax_ctc_cal'], [40., 50., 60.])
+        np.testing.assert_array_equal(columns['is_pulser'], [False, True, False])
+
+        # 'ch<rawid>' keys are accepted like rawids
+        keyed = list(loader.iter_joined('p03/', 'r000', [f'ch{GED_B}'], fields=['cuspEmax_ctc_cal'],
+                                        pulser_channel=f'ch{PULSER}'))
+        self.assertEqual(len(keyed), 1)
+        for name in ['event_index', 'multiplicity', 'is_pulser']:
+            np.testing.assert_array_equal(keyed[0][2][name], columns[name])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+# tests/test_masks.py
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from legend200_data_loader.loader import LegendDataLoader
+from legend200_data_loader.masks import MaskCache
+from fake_data import build_fake_data, patch_dirs, tier_path, write_lh5, write_tcm, RUNS
+
+GED, PULSER, BASELINE = 1104000, 1027201, 1027200
+AUX = {'pulser': PULSER, 'baseline': BASELINE}
+
+
+class TestMaskCache(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.data_dir = build_fake_data(os.path.join(self.tmpdir.name, 'data'))
+        self.output_dir = os.path.join(self.tmpdir.name, 'output')
+        dirs = patch_dirs(self.data_dir, self.output_dir)
+        dirs.start()
+        self.addCleanup(dirs.stop)
+
+        # 20 hits of GED; every 3rd is a pulser event and hit 7 a baseline event
+        events = []
+        for row in range(20):
+            event = [(GED, row)]
+            if row % 3 == 0:
+                event.append((PULSER, row // 3))
+            if row == 7:
+                event.append((BASELINE, 0))
+            events.append(event)
+        self.tcm_paths = [tier_path(self.data_dir, 'tcm', 'p03', 'r000', timestamp)
+                          for timestamp in RUNS['p03']['r000']]
+        write_tcm(self.tcm_paths[0], events)
+        write_tcm(self.tcm_paths[1], [[(GED, 0)]])
+        # The pht tables end with hits the tcm does not reference
+        self.pht_paths = [tier_path(self.data_dir, 'pht', 'p03', 'r000', timestamp)
+                          for timestamp in RUNS['p03']['r000']]
+        for path, n_hits in zip(self.pht_paths, [24, 3]):
+            write_lh5(path, {f'ch{GED}/hit': {'cuspEmax_ctc_cal': np.zeros(n_hits)}})
+
+    def test_masks_and_slices(self):
+        cache = MaskCache(AUX)
+        masks = cache.get(self.tcm_paths[0], GED)
+        np.testing.assert_array_equal(masks['pulser'], np.arange(20) % 3 == 0)
+        np.testing.assert_array_equal(np.flatnonzero(masks['baseline']), [7])
+
+        part = cache.get(self.tcm_paths[0], GED, start=5, stop=13)
+        np.testing.assert_array_equal(part['pulser'], masks['pulser'][5:13])
+        np.testing.assert_array_equal(part['baseline'], masks['baseline'][5:13])
+        self.assertTrue(cache.path(self.tcm_paths[0]).startswith(os.path.join(self.output_dir, 'masks')))
+
+    def test_cache_invalidation(self):
+        cache = MaskCache(AUX)
+        cache_path = cache.build(self.tcm_paths[0])
+        built = os.stat(cache_path).st_mtime_ns
+        self.assertEqual(cache.build(self.tcm_paths[0]), cache_path)
+        self.assertEqual(os.stat(cache_path).st_mtime_ns, built)
+
+        write_tcm(self.tcm_paths[0], [[(GED, 0), (PULSER, 0)]])
+        os.utime(self.tcm_paths[0], (0, 12345))
+        np.testing.assert_array_equal(cache.get(self.tcm_paths[0], GED)['pulser'], [True])
+
+    def test_masks_sized_to_table(self):
+        cache = MaskCache(AUX)
+        masks = cache.get(self.tcm_paths[0], GED, pht_path=self.pht_paths[0])
+        self.assertEqual(len(masks['pulser']), 24)
+        np.testing.assert_array_equal(masks['pulser'][:20], np.arange(20) % 3 == 0)
+        self.assertFalse(masks['pulser'][20:].any())
+        np.testing.assert_array_equal(cache.get(self.tcm_paths[0], GED, start=18, stop=30,
+                                                pht_path=self.pht_paths[0])['pulser'],
+                                      [True, False, False, False, False, False])
+
+    def test_loader_masks(self):
+        masks = LegendDataLoader().load_event_masks('p03/', 'r000', GED, AUX, stop=4)
+        self.assertEqual(len(masks), 2)
+        np.testing.assert_array_equal(masks[0]['pulser'], [True, False, False, True])
+        np.testing.assert_array_equal(masks[1]['pulser'], [False, False, False])
+        self.assertIsNone(LegendDataLoader().load_event_masks('p03/', 'r000', 1104001, AUX)[0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,110 @@
+# tests/test_merge.py
+import os
+import tempfile
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+import h5py
+import numpy as np
+
+from legend200_data_loader.config import GLOBAL_PARAM
+from legend200_data_loader.loader import LegendDataLoader
+from legend200_data_loader.metadata import MetadataLoader
+from legend200_data_loader.merge import run_merge
+from fake_data import build_fake_data, patch_dirs, tier_path, write_lh5, RUNS
+from fake_metadata import build_fake_metadata
+
+
+class TestMerge(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.data_dir = build_fake_data(os.path.join(self.tmpdir.name, 'data'))
+        self.output_dir = os.path.join(self.tmpdir.name, 'output')
+        for patcher in [
+            patch_dirs(self.data_dir, self.output_dir),
+            mock.patch.dict(os.environ, {'METADATA_NO_GIT_REPO': '1'}),
+            mock.patch.dict(GLOBAL_PARAM, {'inactive_detectors': ['V02'], 'exclude_period_run': ['p03_r001']}),
+            mock.patch.dict(GLOBAL_PARAM['MERGE'], {'periods_to_merge': ['p03/']}),
+        ]:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        for run, timestamps in RUNS['p03'].items():
+            for i, timestamp in enumerate(timestamps):
+                tables = {}
+                for rawid in [1104000, 1104001, 1104002, 1104004]:
+                    energy = np.arange(4) + 10 * i + rawid % 10
+                    tables[f'ch{rawid}/hit'] = {'cuspEmax_ctc_cal': energy.astype(np.float64), 'is_surface': energy > 11}
+                write_lh5(tier_path(self.data_dir, 'pht', 'p03', run, timestamp), tables)
+
+        self.metadata = MetadataLoader(metadata_path=build_fake_metadata(os.path.join(self.tmpdir.name, 'meta')))
+
+    def test_merge(self):
+        outputs = run_merge(LegendDataLoader(), self.metadata, max_workers=2, max_worker_memory=16 * 3)
+        # V02 is inactive, C01 is a coax and r001 is excluded
+        self.assertEqual(sorted(outputs), ['B01', 'V01'])
+        with h5py.File(outputs['B01'], 'r') as f:
+            self.assertEqual(list(f.attrs['runs']), ['p03_r000'])
+            np.testing.assert_array_equal(f['cuspEmax_ctc_cal'][:], [2, 3, 4, 5, 12, 13, 14, 15])
+            np.testing.assert_array_equal(f['channel_id'][:], [1104002] * 8)
+            np.testing.assert_array_equal(f['run_index'][:], [0] * 8)
+        self.assertFalse(os.path.exists(os.path.join(self.output_dir, 'merged', 'parts')))
+
+    def test_channel_missing_from_first_file(self):
+        # B01 and V01 are only in the second file of p03/r000
+        first = tier_path(self.data_dir, 'pht', 'p03', 'r000', RUNS['p03']['r000'][0])
+        write_lh5(first, {'ch1104004/hit': {'cuspEmax_ctc_cal': np.zeros(2), 'is_surface': np.zeros(2, dtype=bool)}})
+        with mock.patch('legend200_data_loader.merge._finalize_detector') as finalize:
+            finalize.side_effect = lambda parts, out_path, max_memory: out_path
+            with mock.patch('legend200_data_loader.merge.ProcessPoolExecutor', ThreadPoolExecutor):
+                outputs = run_merge(LegendDataLoader(), self.metadata, max_workers=2, max_worker_memory=64)
+        self.assertEqual(sorted(outputs), ['B01', 'V01'])
+        self.assertEqual({call.args[2] for call in finalize.call_args_list}, {64})
+
+    def test_raw_fields(self):
+        # An extra raw file without pht counterpart comes first in the run
+        raw_files = {timestamp: 20 + 10 * i for i, timestamp in enumerate(RUNS['p03']['r000'])}
+        raw_files['20230311T000000Z'] = 100
+        for timestamp, offset in raw_files.items():
+            write_lh5(tier_path(self.data_dir, 'raw', 'p03', 'r000', timestamp), {
+                f'ch{rawid}/raw': {'waveform': {'t0': np.arange(4) + offset}} for rawid in [1104000, 1104002]
+            })
+        # 2 rows per chunk
+        outputs = run_merge(LegendDataLoader(), self.metadata, raw_fields=['waveform'], max_workers=2,
+                            max_worker_memory=2 * 2 * (8 + 1 + 8))
+        with h5py.File(outputs['B01'], 'r') as f:
+            np.testing.assert_array_equal(f['cuspEmax_ctc_cal'][:], [2, 3, 4, 5, 12, 13, 14, 15])
+            np.testing.assert_array_equal(f['waveform/t0'][:], [20, 21, 22, 23, 30, 31, 32, 33])
+
+        # Raw rows that do not match the pht rows of a file fail the shard
+        write_lh5(tier_path(self.data_dir, 'raw', 'p03', 'r000', RUNS['p03']['r000'][1]), {
+            f'ch{rawid}/raw': {'waveform': {'t0': np.arange(5)}} for rawid in [1104000, 1104002]
+        })
+        with mock.patch.dict(GLOBAL_PARAM['MERGE'], {'replace_files': True}):
+            self.assertEqual(run_merge(LegendDataLoader(), self.metadata, raw_fields=['waveform'], max_workers=2,
+                                       max_worker_memory=2 * 2 * (8 + 1 + 8)), {})
+
+    def test_finalize_memory_bound(self):
+        from legend200_data_loader import merge
+
+        chunks = []
+
+        def record(group, chunk):
+            if 'run_index' in chunk:
+                chunks.append(sum(values.nbytes for values in chunk.values()))
+            return append_chunk(group, chunk)
+
+        append_chunk = merge.append_chunk
+        with mock.patch('legend200_data_loader.merge.append_chunk', side_effect=record), \
+                mock.patch('legend200_data_loader.merge.ProcessPoolExecutor', ThreadPoolExecutor):
+            outputs = run_merge(LegendDataLoader(), self.metadata, max_workers=2, max_worker_memory=16 * 3)
+        # Rows of 8 + 1 + 8 bytes plus the 4 byte run_index: two rows per finalize chunk
+        self.assertTrue(chunks)
+        self.assertLessEqual(max(chunks), 16 * 3)
+        with h5py.File(outputs['V01'], 'r') as f:
+            np.testing.assert_array_equal(f['cuspEmax_ctc_cal'][:], [0, 1, 2, 3, 10, 11, 12, 13])
+
+if __name__ == '__main__':
+    unittest.main()
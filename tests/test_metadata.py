@@ -0,0 +1,105 @@
+# tests/test_metadata.py
+import os
+import subprocess
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+
+from legend200_data_loader.metadata import MetadataLoader
+from legend200_data_loader.function import filter_metadata
+from legend200_data_loader.utils import to_unix_time
+from fake_metadata import build_fake_metadata
+
+
+class TestMetadataLoader(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        env = mock.patch.dict(os.environ, {'METADATA_NO_GIT_REPO': '1'})
+        env.start()
+        self.addCleanup(env.stop)
+        self.metadata_path = build_fake_metadata(os.path.join(self.tmpdir.name, 'legend-metadata'))
+        self.snapshot_path = os.path.join(self.tmpdir.name, 'snapshot.pkl')
+        self.meta = MetadataLoader(metadata_path=self.metadata_path, cache_size=2, snapshot_path=self.snapshot_path)
+
+    def commit_metadata(self):
+        git = ['git', '-C', self.metadata_path, '-c', 'user.name=test', '-c', 'user.email=test@test']
+        subprocess.run(git + ['init', '-q'], check=True)
+        subprocess.run(git + ['add', '.'], check=True)
+        subprocess.run(git + ['commit', '-q', '--allow-empty', '-m', 'metadata'], check=True)
+
+    def test_validity_index(self):
+        self.assertEqual(len(self.meta.build_validity_index()), 4)
+        self.assertEqual(self.meta.validity_interval('20221231T000000Z'), -1)
+        self.assertEqual(self.meta.validity_interval('20230115T000000Z'), 0)
+        self.assertEqual(self.meta.validity_interval('20230301T000000Z'), 2)
+
+    def test_channelmap_shared_within_interval(self):
+        first = self.meta.channelmap('20230102T000000Z')
+        self.assertIs(self.meta.channelmap('20230130T120000Z'), first)
+        self.assertIsNot(self.meta.channelmap('20230202T000000Z'), first)
+        self.assertEqual(first['V02']['analysis']['usability'], 'on')
+
+    def test_channelmap_cache_is_bounded(self):
+        for timestamp in ['20230102T000000Z', '20230202T000000Z', '20230302T000000Z']:
+            self.meta.channelmap(timestamp)
+        self.assertEqual(list(self.meta._channelmaps), [1, 2])
+
+    def test_detector_table(self):
+        table = self.meta.detector_table('20230102T000000Z')
+        self.assertIs(self.meta.detector_table('20230120T000000Z'), table)
+        self.assertEqual(list(table['name']), ['V01', 'V02', 'B01', 'P01', 'C01'])
+        self.assertEqual(table['string'].tolist(), [1, 1, 2, 2, 3])
+
+        selected = self.meta.select_detectors(usability=['on', 'ac'], processable=True, timestamp='20230102T000000Z')
+        self.assertEqual(list(selected['name']), ['V01', 'V02', 'B01', 'P01'])
+
+    def test_filter_metadata(self):
+        self.assertEqual(self.meta.filter_metadata('ICPC', '20230102T000000Z'), [1104000, 1104001])
+        self.assertEqual(self.meta.filter_metadata('bege', '20230102T000000Z'), [1104002])
+        self.assertEqual(self.meta.filter_metadata('coax', '20230102T000000Z'), [])
+
+        detectors = filter_metadata(self.meta.lmeta)
+        self.assertEqual(detectors['V01']['manufacturer'], 'Ortec')
+        self.assertEqual(detectors['rawid_lists']['PPC'], [1104003])
+        self.assertNotIn('C01', detectors['rawid_lists']['ICPC'])
+
+    def test_usability_timeline(self):
+        timeline = self.meta.build_usability_timeline()
+        # V02 goes on -> ac once, the channel map change alone is not a state change
+        self.assertEqual(timeline['V02']['usability'].tolist(), ['on', 'ac'])
+        self.assertEqual(self.meta.detector_status('V01', '20230415T000000Z'), 'off')
+        self.assertFalse(self.meta.detector_status('V01', '20230415T000000Z', field='processable'))
+        self.assertEqual(self.meta.detector_status('V01', '20221201T000000Z'), 'unknown')
+
+        timestamps = [to_unix_time(t) for t in ['20221201T000000Z', '20230115T000000Z', '20230215T000000Z', '20230415T000000Z']]
+        np.testing.assert_array_equal(self.meta.detector_status_array('V01', timestamps), ['unknown', 'on', 'on', 'off'])
+        np.testing.assert_array_equal(self.meta.detector_status_array('P01', timestamps, field='processable'),
+                                      [False, True, True, True])
+
+    def test_channel_index(self):
+        self.assertEqual(self.meta.get_channel_id('B01'), 1104002)
+        self.assertIsNone(self.meta.get_channel_id('X99'))
+        self.assertEqual(self.meta.get_detector_name('ch1104003'), 'P01')
+        np.testing.assert_array_equal(self.meta.get_channel_ids(['V01', 'S01', 'X99']), [1104000, 1052803, -1])
+        self.assertEqual(self.meta.get_detector_names(np.array([1104004, 1104000])).tolist(), ['C01', 'V01'])
+
+    def test_snapshot(self):
+        self.commit_metadata()
+        self.assertTrue(self.meta.save_snapshot())
+
+        fresh = MetadataLoader(metadata_path=self.metadata_path, use_snapshot=True, snapshot_path=self.snapshot_path)
+        self.assertIsNotNone(fresh.snapshot)
+        self.assertIsNone(fresh._lmeta)
+        self.assertEqual(fresh.channelmap('20230315T000000Z')['V02']['location']['string'], 4)
+        self.assertNotIn('S01', fresh.channelmap('20230315T000000Z'))
+
+        # A new metadata commit invalidates the snapshot
+        self.commit_metadata()
+        self.assertFalse(MetadataLoader(metadata_path=self.metadata_path, snapshot_path=self.snapshot_path).load_snapshot())
+
+
+if __name__ == '__main__':
+    unittest.main()
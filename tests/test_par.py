@@ -0,0 +1,47 @@
+# tests/test_par.py
+import os
+import json
+import tempfile
+import unittest
+
+from legend200_data_loader.par import ParCache
+
+
+def write_par(path, offset):
+    with open(path, 'w') as f:
+        json.dump({
+            'ch1104000': {'pars': {'operations': {'cuspEmax_ctc_cal': {'parameters': {'a': 0.1, 'b': offset}}}}},
+            'ch1104001': {'pars': {'operations': {}}, 'results': {}},
+        }, f)
+
+
+class TestParCache(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.path = os.path.join(self.tmpdir.name, 'par_pht.json')
+        write_par(self.path, 1.0)
+
+    def test_shared_and_invalidated_by_mtime(self):
+        cache = ParCache()
+        pars = cache.get_channel(self.path, 1104000, 'pars')
+        self.assertIs(cache.get_channel(self.path, 'ch1104000', 'pars'), pars)
+        self.assertIsNone(cache.get_channel(self.path, 1104999))
+
+        write_par(self.path, 2.0)
+        os.utime(self.path, (0, os.stat(self.path).st_mtime + 10))
+        pars = cache.get_channel(self.path, 1104000, 'pars')
+        self.assertEqual(pars['operations']['cuspEmax_ctc_cal']['parameters']['b'], 2.0)
+        self.assertEqual(len(cache), 1)
+
+    def test_memory_bound(self):
+        other = os.path.join(self.tmpdir.name, 'other_par_pht.json')
+        write_par(other, 3.0)
+        cache = ParCache(max_bytes=os.path.getsize(self.path) + 1)
+        cache.get(self.path)
+        cache.get(other)
+        self.assertEqual(list(cache._entries), [other])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,89 @@
+# tests/test_peaks.py
+import os
+import json
+import tempfile
+import unittest
+
+import numpy as np
+
+from legend200_data_loader.loader import LegendDataLoader
+from legend200_data_loader.peaks import build_peak_index, load_peak_rows, read_peak_events, peak_windows
+from fake_data import build_fake_data, patch_dirs, tier_path, write_lh5, SUBDIRS, RUNS
+
+PEAKS = {'DEP_Tl': 1592.53, 'FEP_Tl': 2614.553}
+# FWHM of 2.3548 keV at every energy, i.e. sigma = 1 keV
+PAR = {
+    'ch1104000': {'pars': {}, 'results': {'ecal': {'cuspEmax_ctc_cal': {
+        'eres_linear': {'parameters': {'a': 2.3548**2, 'b': 0.0}},
+    }}}},
+    'ch1104001': {'pars': {}, 'results': {}},
+}
+
+
+class TestPeakIndex(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.data_dir = build_fake_data(os.path.join(self.tmpdir.name, 'data'))
+        dirs = patch_dirs(self.data_dir, os.path.join(self.tmpdir.name, 'output'))
+        dirs.start()
+        self.addCleanup(dirs.stop)
+
+        first, second = RUNS['p03']['r000']
+        par_path = os.path.join(self.data_dir, SUBDIRS['par'], 'cal', 'p03', 'r000',
+                                f"l200-p03-r000-cal-{first}-par_pht.json")
+        with open(par_path, 'w') as f:
+            json.dump(PAR, f)
+        self.energies = [np.array([100., 1591., 1596., 2614., 500.]), np.array([2611., 1592.5, 3000.])]
+        for timestamp, energies in zip([first, second], self.energies):
+            write_lh5(tier_path(self.data_dir, 'pht', 'p03', 'r000', timestamp), {
+                'ch1104000/hit': {'cuspEmax_ctc_cal': energies, 'AoE_Low_Cut': energies > 1000},
+            })
+
+    def test_windows(self):
+        windows = peak_windows(PAR['ch1104000'], PEAKS, n_sigmas=3)
+        low, high, sigma = windows['FEP_Tl']
+        self.assertAlmostEqual(sigma, 1.0)
+        self.assertAlmostEqual(low, 2611.553)
+        self.assertEqual(peak_windows(PAR['ch1104001'], PEAKS), {})
+
+    def test_index_and_read(self):
+        loader = LegendDataLoader()
+        path = build_peak_index(loader, 'p03/', 'r000', [1104000, 1104001], peaks=PEAKS, n_sigmas=3)
+        file_index, row_in_file = load_peak_rows(path, 1104000, 'DEP_Tl')
+        np.testing.assert_array_equal(file_index, [0, 1])
+        np.testing.assert_array_equal(row_in_file, [1, 1])
+        events = read_peak_events(path, 1104000, 'FEP_Tl', ['cuspEmax_ctc_cal', 'AoE_Low_Cut'])
+        np.testing.assert_array_equal(events['cuspEmax_ctc_cal'], [2614.])
+        self.assertIsNone(load_peak_rows(path, 1104001, 'DEP_Tl'))
+
+        # A second build with unchanged pht files reuses the index
+        mtime = os.stat(path).st_mtime_ns
+        self.assertEqual(build_peak_index(loader, 'p03/', 'r000', [1104000], peaks=PEAKS, n_sigmas=3), path)
+        self.assertEqual(os.stat(path).st_mtime_ns, mtime)
+
+    def test_index_rebuilt_on_settings(self):
+        loader = LegendDataLoader()
+        path = build_peak_index(loader, 'p03/', 'r000', [1104000], peaks=PEAKS, n_sigmas=4)
+        np.testing.assert_array_equal(load_peak_rows(path, 1104000, 'FEP_Tl')[1], [3, 0])
+
+        # A narrower window drops the hit at 2611 keV
+        build_peak_index(loader, 'p03/', 'r000', [1104000], peaks=PEAKS, n_sigmas=3)
+        np.testing.assert_array_equal(load_peak_rows(path, 1104000, 'FEP_Tl')[1], [3])
+
+        build_peak_index(loader, 'p03/', 'r000', [1104000], peaks={'DEP_Tl': PEAKS['DEP_Tl']}, n_sigmas=3)
+        self.assertIsNone(load_peak_rows(path, 1104000, 'FEP_Tl'))
+
+        # A new PAR file with a wider resolution
+        par = json.loads(json.dumps(PAR))
+        par['ch1104000']['results']['ecal']['cuspEmax_ctc_cal']['eres_linear']['parameters']['a'] *= 4
+        par_path = loader.load_files('p03/', 'r000')['par_file']
+        with open(par_path, 'w') as f:
+            json.dump(par, f)
+        os.utime(par_path, (0, os.stat(par_path).st_mtime + 10))
+        build_peak_index(loader, 'p03/', 'r000', [1104000], peaks=PEAKS, n_sigmas=3)
+        np.testing.assert_array_equal(load_peak_rows(path, 1104000, 'FEP_Tl')[1], [3, 0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+# tests/test_prefetch.py
+import os
+import tempfile
+import threading
+import time
+from unittest import mock
+import unittest
+
+import numpy as np
+
+from legend200_data_loader.loader import LegendDataLoader
+from legend200_data_loader.reader import read_table
+from fake_data import build_fake_data, patch_dirs, tier_path, write_lh5, RUNS
+
+
+class TestRunPrefetcher(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.data_dir = build_fake_data(os.path.join(self.tmpdir.name, 'data'))
+        dirs = patch_dirs(self.data_dir, os.path.join(self.tmpdir.name, 'output'))
+        dirs.start()
+        self.addCleanup(dirs.stop)
+        for period, runs in RUNS.items():
+            for run, timestamps in runs.items():
+                for timestamp in timestamps:
+                    write_lh5(tier_path(self.data_dir, 'pht', period, run, timestamp), {
+                        'ch1104000/hit': {'cuspEmax_ctc_cal': np.arange(1000, dtype=np.float64)},
+                    })
+
+    def test_tables_in_order(self):
+        loader = LegendDataLoader()
+        runs = loader.iter_runs(channels=[1104000], fields=['cuspEmax_ctc_cal'])
+        seen = []
+        for period, run, file_dict, tables in runs:
+            seen.append((period, run))
+            self.assertEqual(len(tables), len(file_dict['pht_files']))
+            np.testing.assert_array_equal(tables[(1104000, 0)]['cuspEmax_ctc_cal'], np.arange(1000))
+        self.assertEqual(seen, [('p03/', 'r000'), ('p03/', 'r001'), ('p08/', 'r005')])
+        self.assertEqual(len(runs.stalls), 3)
+        self.assertGreaterEqual(runs.stall_time, 0)
+
+    def test_catalog_loader(self):
+        loader = LegendDataLoader(use_catalog=True)
+        self.addCleanup(loader.catalog.close)
+        seen = [(period, run, len(tables)) for period, run, file_dict, tables
+                in loader.iter_runs(channels=[1104000], fields=['cuspEmax_ctc_cal'], depth=2)]
+        self.assertEqual(seen, [('p03/', 'r000', 2), ('p03/', 'r001', 1), ('p08/', 'r005', 3)])
+
+    def test_memory_bound(self):
+        # The runs hold 2, 1 and 3 files of 8000 bytes; the last one must wait for an empty buffer
+        max_bytes = 25000
+        lock = threading.Lock()
+        held = {'bytes': 0, 'peak': 0}
+
+        def counting_read(*args, **kwargs):
+            columns = read_table(*args, **kwargs)
+            with lock:
+                held['bytes'] += sum(values.nbytes for values in columns.values())
+                held['peak'] = max(held['peak'], held['bytes'])
+            return columns
+
+        with mock.patch('legend200_data_loader.prefetch.read_table', side_effect=counting_read):
+            runs = LegendDataLoader().iter_runs(channels=[1104000], fields=['cuspEmax_ctc_cal'], depth=3,
+                                                max_bytes=max_bytes)
+            for period, run, file_dict, tables in runs:
+                # Give the background thread time to read ahead
+                time.sleep(0.05)
+                with lock:
+                    held['bytes'] -= sum(values.nbytes for table in tables.values() for values in table.values())
+        self.assertEqual(held['peak'], 24000)
+        self.assertLessEqual(held['peak'], max_bytes)
+
+    def test_depth_and_early_exit(self):
+        loader = LegendDataLoader()
+        runs = loader.iter_runs([('p03/', 'r000'), ('p03/', 'r001'), ('p08/', 'r005')], depth=1)
+        iterator = iter(runs)
+        period, run, file_dict, tables = next(iterator)
+        self.assertIsNone(tables)
+        # Stop after the first run: the background thread must end
+        iterator.close()
+        self.assertEqual([thread for thread in threading.enumerate() if thread.name == 'run-prefetch'], [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+# tests/test_preprocessing.py
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import matplotlib
+matplotlib.use('Agg')
+import numpy as np
+
+from legend200_data_loader.metadata import MetadataLoader
+from legend200_data_loader.preprocessing import (
+    detector_geometry, detector_colors, plot_detector_positions, DetectorMapWidget
+)
+from fake_metadata import build_fake_metadata
+
+TIMESTAMP = '20230315T000000Z'
+
+
+class TestDetectorMap(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        env = mock.patch.dict(os.environ, {'METADATA_NO_GIT_REPO': '1'})
+        env.start()
+        self.addCleanup(env.stop)
+        self.metadata = MetadataLoader(metadata_path=build_fake_metadata(os.path.join(self.tmpdir.name, 'meta')))
+
+    def test_geometry_single_channelmap(self):
+        lmeta = mock.Mock(wraps=self.metadata.lmeta)
+        geometry = detector_geometry(lmeta, ['B01', 'V01', 'XXX'], TIMESTAMP)
+        self.assertEqual(lmeta.channelmap.call_count, 1)
+        self.assertEqual(geometry['name'].tolist(), ['B01', 'V01'])
+        self.assertEqual(list(geometry.columns), ['name', 'string', 'position', 'width', 'height', 'type'])
+        self.assertEqual(geometry['type'].tolist(), ['bege', 'icpc'])
+
+    def test_colors(self):
+        geometry = detector_geometry(self.metadata, timestamp=TIMESTAMP)
+        facecolors, edgecolors = detector_colors(geometry, usable_detectors=['V01'], ac_detectors={'B01'},
+                                                 off_detectors=['P01'])
+        names = geometry['name'].tolist()
+        np.testing.assert_allclose(facecolors[names.index('V01')], [0, 0, 1, 0.5])
+        self.assertEqual(facecolors[names.index('B01')][3], 0.5)
+        self.assertEqual(facecolors[names.index('P01')][3], 0)
+        self.assertEqual(edgecolors[names.index('P01')][3], 1)
+        self.assertEqual(edgecolors[names.index('C01')][3], 0)
+
+    def test_batch_mode(self):
+        save_path = os.path.join(self.tmpdir.name, 'maps', 'p03_r000.png')
+        with mock.patch('matplotlib.pyplot.show') as show:
+            fig, ax, collection = plot_detector_positions(['V01', 'V02'], self.metadata, 'p03/', 'r000',
+                                                          ac_detectors=['B01'], save_path=save_path, show=False,
+                                                          timestamp=TIMESTAMP)
+        show.assert_not_called()
+        self.assertTrue(os.path.exists(save_path))
+        self.assertEqual(len(collection.get_paths()), 3)
+        self.assertEqual(len(ax.patches), 0)
+
+    def test_widget_updates_in_place(self):
+        widget = DetectorMapWidget(self.metadata)
+        fig = widget.update(TIMESTAMP, show_on=True, show_ac=True, show_off=False, period='p03/', run='r000')
+        collection = widget.collection
+        visible = [text.get_text() for text in widget.texts if text.get_visible()]
+
+        # Toggling flags or moving within the validity interval keeps the artists
+        widget.update(TIMESTAMP, show_on=False, show_ac=True, show_off=True)
+        widget.update('20230320T000000Z')
+        self.assertIs(widget.collection, collection)
+        self.assertIs(widget.fig, fig)
+        self.assertEqual(widget.n_builds, 1)
+        self.assertEqual([text.get_text() for text in widget.texts if text.get_visible()], visible)
+
+        widget.update('20230405T000000Z')
+        self.assertEqual(widget.n_builds, 2)
+        self.assertIsNot(widget.collection, collection)
+        self.assertIs(widget.fig, fig)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+# tests/test_psd.py
+import os
+import json
+import tempfile
+import unittest
+from unittest import mock
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from legend200_data_loader.config import GLOBAL_PARAM
+from legend200_data_loader.loader import LegendDataLoader
+from legend200_data_loader.metadata import MetadataLoader
+from legend200_data_loader.psd import cut_code_counts, survival_fractions, cut_combinations, run_survival_fractions
+from fake_data import build_fake_data, patch_dirs, tier_path, write_lh5, SUBDIRS, RUNS
+from fake_metadata import build_fake_metadata
+
+PEAKS = {'DEP_Tl': 1592.53, 'FEP_Tl': 2614.553}
+
+
+class TestSurvivalFractions(unittest.TestCase):
+    def test_combinations(self):
+        events = {'A': np.array([1, 1, 0, 1], dtype=bool), 'B': np.array([1, 0, 0, 1], dtype=bool)}
+        counts = cut_code_counts(events, ['A', 'B'])
+        rows = survival_fractions(counts, ['A', 'B'], cut_combinations(['A', 'B']))
+        self.assertEqual([row[:3] for row in rows], [('A', 4, 3), ('B', 4, 2), ('A & B', 4, 2)])
+        self.assertAlmostEqual(rows[0][3], 0.75)
+        self.assertAlmostEqual(rows[0][4], np.sqrt(0.75 * 0.25 / 4))
+
+
+class TestSurvivalEngine(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.data_dir = build_fake_data(os.path.join(self.tmpdir.name, 'data'))
+        for patcher in [
+            patch_dirs(self.data_dir, os.path.join(self.tmpdir.name, 'output')),
+            mock.patch.dict(os.environ, {'METADATA_NO_GIT_REPO': '1'}),
+            mock.patch.dict(GLOBAL_PARAM, {'inactive_detectors': ['V02'], 'exclude_period_run': ['p03_r001']}),
+            mock.patch.dict(GLOBAL_PARAM['MERGE'], {'periods_to_merge': ['p03/']}),
+        ]:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        timestamps = RUNS['p03']['r000']
+        par = {f'ch{rawid}': {'results': {'ecal': {'cuspEmax_ctc_cal': {'eres_linear': {'parameters': {'a': 5.5, 'b': 0}}}}}}
+               for rawid in [1104000, 1104002]}
+        with open(os.path.join(self.data_dir, SUBDIRS['par'], 'cal', 'p03', 'r000',
+                               f"l200-p03-r000-cal-{timestamps[0]}-par_pht.json"), 'w') as f:
+            json.dump(par, f)
+        for timestamp in timestamps:
+            tables = {}
+            for rawid in [1104000, 1104001, 1104002]:
+                tables[f'ch{rawid}/hit'] = {
+                    'cuspEmax_ctc_cal': np.array([1592.5, 1592.0, 2614.5, 2000.0]),
+                    'AoE_Low_Cut': np.array([True, False, True, True]),
+                    'LQ_Cut': np.array([True, True, False, False]),
+                }
+            write_lh5(tier_path(self.data_dir, 'pht', 'p03', 'r000', timestamp), tables)
+        self.metadata = MetadataLoader(metadata_path=build_fake_metadata(os.path.join(self.tmpdir.name, 'meta')))
+
+    def test_table(self):
+        table = run_survival_fractions(LegendDataLoader(), self.metadata, peaks=PEAKS, max_workers=2)
+        self.assertEqual(sorted(table['detector'].unique()), ['B01', 'V01'])
+        self.assertEqual(sorted(table['cut'].unique()), ['AoE_Low_Cut', 'AoE_Low_Cut & LQ_Cut', 'LQ_Cut'])
+        row = table[(table['detector'] == 'V01') & (table['peak'] == 'DEP_Tl') & (table['cut'] == 'AoE_Low_Cut')].iloc[0]
+        self.assertEqual((row['n_events'], row['n_survived']), (4, 2))
+        self.assertAlmostEqual(row['survival_fraction'], 0.5)
+        row = table[(table['detector'] == 'B01') & (table['peak'] == 'FEP_Tl') & (table['cut'] == 'LQ_Cut')].iloc[0]
+        self.assertEqual((row['n_events'], row['n_survived']), (2, 0))
+
+    def test_cut_missing_from_one_file(self):
+        path = tier_path(self.data_dir, 'pht', 'p03', 'r000', RUNS['p03']['r000'][1])
+        energies = np.array([1592.5, 1592.0, 2614.5, 2000.0])
+        write_lh5(path, {f'ch{rawid}/hit': {'cuspEmax_ctc_cal': energies, 'AoE_Low_Cut': np.ones(4, dtype=bool)}
+                         for rawid in [1104000, 1104002]})
+        table = run_survival_fractions(LegendDataLoader(), self.metadata, peaks=PEAKS, max_workers=1)
+        self.assertEqual(sorted(table['cut'].unique()), ['AoE_Low_Cut'])
+
+    def test_workers_use_caller_files(self):
+        loader = LegendDataLoader(use_catalog=True, catalog_path=os.path.join(self.tmpdir.name, 'files.db'))
+        self.addCleanup(loader.catalog.close)
+        created = []
+
+        def new_loader(*args, **kwargs):
+            created.append((args, kwargs))
+            return LegendDataLoader(*args, **kwargs)
+
+        with mock.patch('legend200_data_loader.psd.ProcessPoolExecutor', ThreadPoolExecutor), \
+                mock.patch('legend200_data_loader.loader.LegendDataLoader', side_effect=new_loader):
+            table = run_survival_fractions(loader, self.metadata, peaks=PEAKS)
+        # The worker's loader has no catalog to refresh
+        self.assertEqual(created, [((), {})])
+        self.assertEqual(sorted(table['detector'].unique()), ['B01', 'V01'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,53 @@
+# tests/test_reader.py
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from legend200_data_loader.loader import LegendDataLoader
+from fake_data import build_fake_data, patch_dirs, tier_path, write_lh5, RUNS
+
+
+class TestChunkedReader(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.data_dir = build_fake_data(os.path.join(self.tmpdir.name, 'data'))
+        dirs = patch_dirs(self.data_dir, os.path.join(self.tmpdir.name, 'output'))
+        dirs.start()
+        self.addCleanup(dirs.stop)
+
+        # Two pht files of 7 and 5 rows for run p03/r000
+        offset = 0
+        for timestamp, n_rows in zip(RUNS['p03']['r000'], [7, 5]):
+            rows = np.arange(offset, offset + n_rows)
+            write_lh5(tier_path(self.data_dir, 'pht', 'p03', 'r000', timestamp), {
+                'ch1104000/hit': {
+                    'cuspEmax_ctc_cal': rows * 1.5,
+                    'timestamp': rows.astype(np.float64),
+                    'AoE_Low_Cut': rows % 2 == 0,
+                    'not_desired': rows,
+                },
+            })
+            offset += n_rows
+
+    def test_fixed_size_chunks_across_files(self):
+        loader = LegendDataLoader()
+        chunks = [chunk for _, chunk in loader.iter_tier('p03/', 'r000', 'pht', 1104000,
+                                                         fields=['cuspEmax_ctc_cal'], chunk_size=5, with_index=True)]
+        self.assertEqual([len(chunk['cuspEmax_ctc_cal']) for chunk in chunks], [5, 5, 2])
+        np.testing.assert_array_equal(np.concatenate([chunk['cuspEmax_ctc_cal'] for chunk in chunks]),
+                                      np.arange(12) * 1.5)
+        np.testing.assert_array_equal(chunks[1]['file_index'], [0, 0, 1, 1, 1])
+        np.testing.assert_array_equal(chunks[1]['row_in_file'], [5, 6, 0, 1, 2])
+
+    def test_default_fields(self):
+        loader = LegendDataLoader()
+        (_, chunk), = loader.iter_tier('p03/', 'r000', 'pht', 'ch1104000')
+        self.assertEqual(list(chunk), ['timestamp', 'cuspEmax_ctc_cal', 'AoE_Low_Cut'])
+        self.assertEqual(len(chunk['timestamp']), 12)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,75 @@
+# tests/test_render.py
+import os
+import csv
+import tempfile
+import unittest
+from unittest import mock
+from concurrent.futures import ThreadPoolExecutor
+
+from legend200_data_loader.loader import LegendDataLoader
+from legend200_data_loader.metadata import MetadataLoader
+from legend200_data_loader.render import render_maps, plan_maps
+from legend200_data_loader.preprocessing import plot_detector_positions
+from fake_data import build_fake_data, patch_dirs
+from fake_metadata import build_fake_metadata
+
+PERIOD_RUNS = [('p03/', 'r000'), ('p03/', 'r001'), ('p08/', 'r005')]
+
+
+class TestBatchRender(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.data_dir = build_fake_data(os.path.join(self.tmpdir.name, 'data'))
+        self.output_dir = os.path.join(self.tmpdir.name, 'output')
+        for patcher in [
+            patch_dirs(self.data_dir, self.output_dir),
+            mock.patch.dict(os.environ, {'METADATA_NO_GIT_REPO': '1'}),
+        ]:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.metadata = MetadataLoader(metadata_path=build_fake_metadata(os.path.join(self.tmpdir.name, 'meta')))
+
+    def test_png_reuse(self):
+        outputs = render_maps(LegendDataLoader(), self.metadata, PERIOD_RUNS, dpi=20, max_workers=2)
+        # Both p03 runs share one snapshot, p08 has other statuses
+        self.assertEqual(outputs[('p03/', 'r000')], outputs[('p03/', 'r001')])
+        self.assertNotEqual(outputs[('p03/', 'r000')], outputs[('p08/', 'r005')])
+        self.assertTrue(all(os.path.exists(path) for path in outputs.values()))
+        with open(os.path.join(self.output_dir, 'maps', 'maps_index.csv')) as f:
+            self.assertEqual([row['run'] for row in csv.DictReader(f)], ['r000', 'r001', 'r005'])
+
+        # Existing images are not rendered again
+        with mock.patch('legend200_data_loader.render._render_map') as render:
+            self.assertEqual(render_maps(LegendDataLoader(), self.metadata, PERIOD_RUNS, dpi=20), outputs)
+        render.assert_not_called()
+
+    def test_keys_and_titles(self):
+        keys = [task['key'] for task in plan_maps(LegendDataLoader(), self.metadata, PERIOD_RUNS, dpi=20)]
+        self.assertNotIn(keys[0], [task['key'] for task in plan_maps(LegendDataLoader(), self.metadata, PERIOD_RUNS, dpi=30)])
+        self.assertNotIn(keys[0], [task['key'] for task in plan_maps(LegendDataLoader(), self.metadata, PERIOD_RUNS,
+                                                                   statuses=('on',), dpi=20)])
+
+        with mock.patch('legend200_data_loader.render.ProcessPoolExecutor', ThreadPoolExecutor), \
+                mock.patch('legend200_data_loader.preprocessing.plot_detector_positions',
+                           wraps=plot_detector_positions) as plot:
+            outputs = render_maps(LegendDataLoader(), self.metadata, PERIOD_RUNS, dpi=20, max_workers=1)
+        self.assertEqual(sorted(os.path.basename(path)[4:-4] for path in set(outputs.values())), sorted(set(keys)))
+        # The shared images name no period or run
+        self.assertEqual(plot.call_count, 2)
+        for call in plot.call_args_list:
+            self.assertEqual(len(call.args), 2)
+            self.assertIsNone(call.kwargs.get('period'))
+            self.assertIsNone(call.kwargs.get('run'))
+
+    def test_pdf(self):
+        outputs = render_maps(LegendDataLoader(), self.metadata, PERIOD_RUNS, output_format='pdf', dpi=20)
+        pdf_path, page = outputs[('p08/', 'r005')]
+        self.assertEqual(page, 2)
+        self.assertEqual(outputs[('p03/', 'r001')][1], 1)
+        with open(pdf_path, 'rb') as f:
+            self.assertTrue(f.read(5).startswith(b'%PDF'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,48 @@
+# tests/test_schema.py
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+
+from legend200_data_loader.loader import LegendDataLoader
+from legend200_data_loader.schema import check_schema, layout_diff
+from fake_data import build_fake_data, patch_dirs, tier_path, write_lh5, RUNS
+
+
+class TestSchemaFingerprints(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.data_dir = build_fake_data(os.path.join(self.tmpdir.name, 'data'))
+        dirs = patch_dirs(self.data_dir, os.path.join(self.tmpdir.name, 'output'))
+        dirs.start()
+        self.addCleanup(dirs.stop)
+
+        for run, timestamps in RUNS['p03'].items():
+            for i, timestamp in enumerate(timestamps):
+                columns = {'cuspEmax_ctc_cal': np.zeros(3 + i), 'AoE_Low_Cut': np.ones(3 + i, dtype=bool)}
+                if run == 'r001':
+                    columns['LQ_Cut'] = np.ones(3, dtype=bool)
+                write_lh5(tier_path(self.data_dir, 'pht', 'p03', run, timestamp), {'ch1104000/hit': columns})
+
+    def test_groups_and_reuse(self):
+        loader = LegendDataLoader(use_catalog=True)
+        groups = check_schema(loader, 'p03/', max_workers=2)
+        self.assertEqual(sorted(len(paths) for paths in groups.values()), [1, 2])
+
+        old, new = sorted(groups, key=lambda fingerprint: len(groups[fingerprint]), reverse=True)
+        diff = layout_diff(loader.catalog, old, new)
+        self.assertEqual(diff['removed'], [])
+        self.assertEqual(len(diff['added']), 1)
+        self.assertTrue(diff['added'][0].startswith('ch1104000/hit/LQ_Cut dataset'))
+
+        # Unchanged files are not opened again
+        with mock.patch('legend200_data_loader.schema.ProcessPoolExecutor') as pool:
+            self.assertEqual(check_schema(loader, 'p03/'), groups)
+        pool.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
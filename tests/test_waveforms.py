@@ -0,0 +1,60 @@
+# tests/test_waveforms.py
+import os
+import tempfile
+import unittest
+
+import h5py
+import numpy as np
+
+from legend200_data_loader.loader import LegendDataLoader
+from legend200_data_loader.waveforms import WaveformReader
+from fake_data import build_fake_data, patch_dirs, tier_path, write_lh5, RUNS
+
+
+def waveforms(start, n_rows, n_samples=16):
+    return (np.arange(start, start + n_rows)[:, None] * 100 + np.arange(n_samples)).astype(np.uint16)
+
+
+class TestWaveforms(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.data_dir = build_fake_data(os.path.join(self.tmpdir.name, 'data'))
+        dirs = patch_dirs(self.data_dir, os.path.join(self.tmpdir.name, 'output'))
+        dirs.start()
+        self.addCleanup(dirs.stop)
+
+        first, second = RUNS['p03']['r000']
+        # Contiguous in the first file, chunked and compressed in the second
+        self.contiguous = tier_path(self.data_dir, 'raw', 'p03', 'r000', first)
+        write_lh5(self.contiguous, {'ch1104000/raw': {'waveform': {
+            'values': waveforms(0, 6), 't0': np.zeros(6), 'dt': np.full(6, 16.0)}}})
+        self.chunked = tier_path(self.data_dir, 'raw', 'p03', 'r000', second)
+        with h5py.File(self.chunked, 'w') as f:
+            f.create_dataset('ch1104000/raw/waveform/values', data=waveforms(6, 4), chunks=(2, 16), compression='gzip')
+
+    def test_zero_copy_and_direct_reads(self):
+        with WaveformReader(self.contiguous, 1104000) as reader:
+            self.assertTrue(reader.zero_copy)
+            self.assertIsInstance(reader[3], np.memmap)
+            np.testing.assert_array_equal(reader[3], waveforms(3, 1)[0])
+            np.testing.assert_array_equal(reader.dt, np.full(6, 16.0))
+        with WaveformReader(self.chunked, 'ch1104000') as reader:
+            self.assertFalse(reader.zero_copy)
+            np.testing.assert_array_equal(reader[-1], waveforms(9, 1)[0])
+            np.testing.assert_array_equal(reader.take([2, 0, 2]), waveforms(6, 3)[[2, 0, 2]])
+        with self.assertRaises(KeyError):
+            WaveformReader(self.contiguous, 1104001)
+
+    def test_run_access(self):
+        with LegendDataLoader().open_waveforms('p03/', 'r000', 1104000) as run_waveforms:
+            self.assertEqual(len(run_waveforms), 10)
+            self.assertEqual(run_waveforms.locate(7), (1, 1))
+            np.testing.assert_array_equal(run_waveforms[7], waveforms(7, 1)[0])
+            np.testing.assert_array_equal(run_waveforms.take([8, 1, 5, 6]), waveforms(0, 10)[[8, 1, 5, 6]])
+            with self.assertRaises(IndexError):
+                run_waveforms[10]
+
+
+if __name__ == '__main__':
+    unittest.main()